@@ -2,7 +2,6 @@
 import traceback
 from typing import Optional
 
-import httpx
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Cookie
 import uuid
 
@@ -15,6 +14,8 @@ from sqlmodel import select
 from starlette.requests import Request as StarletteRequest # Alias for type hinting
 
 from app.core.config import settings
+from app.core.http_clients import get_http_client
+from app.core.youtube import build_youtube_client
 from app.core.database import SessionDep, get_db # Import get_db if SessionDep isn't sufficient everywhere
 from app.core.security import get_password_hash
 from app.models.user import User
@@ -207,13 +208,8 @@ def get_user_youtube_client(credentials: Credentials = Depends(get_google_creden
     # The manual expiry check was done in get_google_credentials_from_token
 
     try:
-        # Build the YouTube Data API client (v3)
-        youtube = build(
-            "youtube",
-            "v3",
-            credentials=credentials,
-            cache_discovery=False # Disable discovery caching with dynamic credentials
-        )
+        # Build the YouTube Data API client (v3) from the discovery document parsed at startup
+        youtube = build_youtube_client(credentials=credentials)
         logger.info("YouTube client built successfully with user credentials.")
         return youtube
     except Exception as e:
@@ -340,10 +336,9 @@ async def auth(request: Request, session: SessionDep):
         try:
              user_info_endpoint = "https://www.googleapis.com/oauth2/v3/userinfo"
              headers = {"Authorization": f'Bearer {token_data["access_token"]}'}
-             async with httpx.AsyncClient() as client:
-                 google_response = await client.get(user_info_endpoint, headers=headers)
-                 google_response.raise_for_status() # Raise exception for non-2xx status
-                 user_info = google_response.json()
+             google_response = await get_http_client().get(user_info_endpoint, headers=headers)
+             google_response.raise_for_status() # Raise exception for non-2xx status
+             user_info = google_response.json()
              logger.info(f"Fetched userinfo: {user_info}")
         except Exception as e:
              logger.error(f"Error fetching userinfo from Google: {e}", exc_info=True)
@@ -488,14 +483,13 @@ async def logout(request: Request):
     if google_token_to_revoke:
         logger.info("Attempting to revoke Google access token...")
         try:
-            async with httpx.AsyncClient() as client:
-                 revoke_url = "https://oauth2.googleapis.com/revoke"
-                 response = await client.post(revoke_url, params={'token': google_token_to_revoke})
-                 if response.status_code == 200:
-                     logger.info("Google token revoked successfully.")
-                 else:
-                     # Log failure, but don't block logout
-                     logger.warning(f"Failed to revoke Google token: {response.status_code} - {response.text}")
+            revoke_url = "https://oauth2.googleapis.com/revoke"
+            response = await get_http_client().post(revoke_url, params={'token': google_token_to_revoke})
+            if response.status_code == 200:
+                logger.info("Google token revoked successfully.")
+            else:
+                # Log failure, but don't block logout
+                logger.warning(f"Failed to revoke Google token: {response.status_code} - {response.text}")
         except Exception as e:
             # Log error, but don't block logout
             logger.error(f"Error during Google token revocation request: {e}", exc_info=True)
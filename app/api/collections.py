@@ -1,15 +1,22 @@
 # app/api/collections.py
 import json
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import redis.asyncio as redis
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from sqlmodel import Session, select
 
 from app.core.database import get_db
+from app.core.list_versions import COLLECTIONS_LIST, bump_list_version, get_list_etag, etag_matches
+from app.core.pagination import paginate_by_added_at
+from app.core.redis_client import get_optional_redis_client
 from app.models.user import User
 from app.models.collection import Collection
-from app.schemas.collection import CollectionList, CollectionRead, CollectionCreate
-from app.api.auth import get_current_user  # Используем нашу зависимость
+from app.schemas.collection import CollectionList, CollectionRead, CollectionCreate, CollectionItems
+from app.services.video_metadata import extract_video_id, get_items_for_video_ids
+from app.api.auth import get_current_user, get_user_youtube_client_via_cookie  # Используем нашу зависимость
 
 
 router = APIRouter()
@@ -20,6 +27,7 @@ async def create_collection(
     videos_urls: List[str],
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """Создаёт новую коллекцию."""
     collection = db.exec(
@@ -36,19 +44,41 @@ async def create_collection(
     db.add(collection)
     db.commit()
     db.refresh(collection)
+    await bump_list_version(redis_client, COLLECTIONS_LIST, current_user.id)
     return CollectionRead.from_db(collection)
 
 
 @router.get("/", response_model=CollectionList)
-async def get_collections(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Возвращает список коллекций пользователя."""
-    db_collections = db.exec(select(Collection).where(Collection.user_id == current_user.id)).all()
+async def get_collections(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Количество коллекций на странице; без limit - все коллекции"),
+    cursor: Optional[str] = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
+):
+    """
+    Возвращает страницу коллекций пользователя (новые сначала).
+    Без limit - весь список одной страницей, как до появления пагинации (next_cursor всегда null).
+    При совпадении If-None-Match отвечает 304, не обращаясь к БД.
+    """
+    etag = await get_list_etag(redis_client, COLLECTIONS_LIST, current_user.id, limit, cursor)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    db_collections, next_cursor = paginate_by_added_at(
+        db, select(Collection).where(Collection.user_id == current_user.id),
+        Collection, limit, cursor,
+    )
     collections = [
         CollectionRead.from_db(collection)
         for collection in db_collections
     ]
 
-    return CollectionList(collections=collections)
+    if etag:
+        response.headers["ETag"] = etag
+    return CollectionList(collections=collections, next_cursor=next_cursor)
 
 @router.get("/{collection_id}", response_model=CollectionRead)
 async def get_collection(current_user: User = Depends(get_current_user), db: Session = Depends(get_db), collection_id: int = None):
@@ -69,11 +99,57 @@ async def get_collection(current_user: User = Depends(get_current_user), db: Ses
 
     return CollectionRead.from_db(collection)
 
+@router.get("/{collection_id}/items", response_model=CollectionItems)
+async def get_collection_items(
+    collection_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    youtube: build = Depends(get_user_youtube_client_via_cookie),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
+):
+    """
+    Возвращает видео коллекции как полные Item (как в /search/videos) за один запрос.
+    Метаданные видео и каналов берутся из общего кэша, недостающие запрашиваются
+    параллельно пачками по 50 ID (1 unit за пачку).
+    """
+    collection = db.exec(
+        select(Collection)
+        .where(Collection.user_id == current_user.id)
+        .where(Collection.id == collection_id)
+    ).first()
+
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    urls = json.loads(collection.videos_urls)
+    video_ids = {url: extract_video_id(url) for url in urls}
+
+    try:
+        items, _ = await get_items_for_video_ids(youtube, [vid for vid in video_ids.values() if vid], redis_client)
+    except HttpError as e:
+        if e.status_code == 403 and 'quotaExceeded' in str(e):
+            raise HTTPException(status_code=429, detail="YouTube API quota exceeded for user.")
+        if e.status_code in (401, 403):
+            raise HTTPException(status_code=401, detail="YouTube API authorization error. Please re-login.")
+        raise HTTPException(status_code=502, detail=f"YouTube API error: {e.status_code}")
+
+    found_ids = {item.video_id for item in items}
+    unresolved_urls = [url for url, video_id in video_ids.items() if video_id not in found_ids]
+
+    return CollectionItems(
+        id=collection.id,
+        collection_title=collection.collection_title,
+        item_count=len(items),
+        items=items,
+        unresolved_urls=unresolved_urls,
+    )
+
 @router.delete("/{collection_id}", status_code=204)
 async def delete_collection(
     collection_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """Удаляет коллекцию у пользователя."""
 
@@ -92,6 +168,7 @@ async def delete_collection(
 
     db.delete(collection)
     db.commit()
+    await bump_list_version(redis_client, COLLECTIONS_LIST, current_user.id)
     return {"message": "Collection deleted"}
 
 @router.put("/edit/{collection_id}", response_model=CollectionRead, status_code=201)
@@ -102,6 +179,7 @@ async def edit_collection(
     collection_title: str | None = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """Добавляет видео в коллекцию пользователя."""
     collection = db.exec(
@@ -129,4 +207,5 @@ async def edit_collection(
     db.add(collection)
     db.commit()
     db.refresh(collection)
+    await bump_list_version(redis_client, COLLECTIONS_LIST, current_user.id)
     return CollectionRead.from_db(collection)
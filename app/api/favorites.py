@@ -1,20 +1,38 @@
 # app/api/favorites.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
+from sqlalchemy.orm import joinedload
 from sqlmodel import Session, select
-from typing import List
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
 import re
 import datetime
 import traceback # Для отладки
+import uuid
 
-from app.core.database import get_db, SessionDep # Используем SessionDep
+import redis.asyncio as redis
+from pydantic import BaseModel, Field
+
+from app.core.database import DIALECT_INSERTS, engine, get_db, SessionDep # Используем SessionDep
+from app.core.jobs import JobContext, job_handler
 from app.models.user import User
 from app.models.favorite import FavoriteChannel
-from app.schemas.favorite import FavoriteChannelCreate, FavoriteChannelRead, FavoriteChannelList
+from app.models.channel import Channel
+from app.schemas.favorite import FavoriteChannelCreate, FavoriteChannelRead, FavoriteChannelList, FavoritesFeedItem, FavoritesFeedResponse, FavoritesSearchItem, FavoritesSearchResponse
+from app.core.pagination import encode_cursor, decode_cursor, paginate_by_added_at
+from app.core.list_versions import FAVORITES_LIST, bump_list_version, get_list_etag, etag_matches
+from app.core.redis_client import get_optional_redis_client
+from app.core.youtube_client_manager import ApiKeysExhaustedError, api_key_manager
+from app.services.favorites_search import search_uploads
+from app.services.channels import channel_loader
+from app.services.uploads import get_channel_uploads, get_uploads_for_channels
+from app.services.channel_stats_refresher import record_channel_views
 from app.api.auth import get_current_user, get_user_youtube_client_via_cookie # Импортируем обе зависимости
 # Импортируем функции ядра для вызова с клиентом
 from app.core.youtube import get_channel_info as core_get_channel_info
-from app.core.youtube import get_total_videos_on_channel as core_get_total_videos
+from app.core.upstream_scheduler import Priority, set_upstream_priority
 # Импортируем тип клиента YouTube
 from googleapiclient.discovery import build
 
@@ -49,6 +67,123 @@ def extract_channel_id(url: str) -> str | None:
             return potential_id_or_name # Возвращаем только стандартные ID
     return None
 
+async def fetch_channel(youtube: Optional[build], channel_id: str, redis_client: Optional[redis.Redis]) -> Optional[Channel]:
+    """
+    Получает данные нового канала из API (channels.list + последнее видео). None, если канал не найден.
+    youtube=None - запросы идут ключами пула с переключением при исчерпании квоты;
+    если ключей не осталось, ApiKeysExhaustedError пробрасывается.
+    """
+    print(f"Fetching channel info from YouTube API for: {channel_id}")
+    if youtube is None:
+        channel_info_dict = await channel_loader.load(channel_id)
+    else:
+        channel_info_dict = await core_get_channel_info(youtube, channel_id)
+    if not channel_info_dict:
+      # Эта ошибка обрабатывается внутри core_get_channel_info, но проверим еще раз
+      print(f"Failed to get channel info for {channel_id} from API.")
+      return None
+
+    # Количество видео уже есть в statistics ответа channels.list
+    video_count = channel_info_dict.get('videoCount', 0)
+
+    # Дата последнего видео - из плейлиста загрузок (1 unit, общий кэш), а не search.list (100 units)
+    uploads = await get_channel_uploads(youtube, channel_id, redis_client)
+    if uploads:
+        last_published_at = datetime.datetime.fromisoformat(uploads[0]['published_at'].replace('Z', '+00:00'))
+    else:
+        print(f"No videos found on channel {channel_id} to determine last published date.")
+        # Устанавливаем текущую дату или None, в зависимости от требований
+        last_published_at = datetime.datetime.now(datetime.timezone.utc) # Или None
+
+    return Channel(
+        channel_id=channel_id,
+        title=channel_info_dict.get('channel_title', 'Unknown Title'),
+        thumbnail=channel_info_dict.get('channel_thumbnail', ''),
+        subscribers=channel_info_dict.get('channel_subscribers', 0),
+        video_count=video_count,
+        last_published_at=last_published_at, # Используем полученную дату
+        channel_url=channel_info_dict.get('channel_url', f'https://www.youtube.com/channel/{channel_id}'),
+    )
+
+
+def _insert_channel(db: Session, channel: Channel) -> None:
+    """
+    Добавляет общую строку канала в транзакцию сессии.
+    Тот же новый канал может одновременно добавлять другой пользователь: INSERT ... ON CONFLICT DO NOTHING
+    вместо ошибки первичного ключа при commit (уже вставленная строка остается как есть).
+    """
+    insert = DIALECT_INSERTS.get(engine.dialect.name)
+    if insert is None:
+        db.add(channel)
+        return
+    db.execute(insert(Channel).values(**channel.model_dump()).on_conflict_do_nothing(index_elements=['channel_id']))
+
+
+async def prepare_favorite_channel(
+    db: Session, user: User, url: str, youtube: Optional[build], redis_client: Optional[redis.Redis],
+) -> Tuple[Optional[FavoriteChannel], Optional[Dict]]:
+    """
+    Готовит добавление канала по URL в избранное пользователя (без commit).
+    Возвращает (FavoriteChannel, None), (None, описание ошибки) или (None, None), если канал уже в избранном.
+    youtube=None - ключи пула (см. fetch_channel); ApiKeysExhaustedError пробрасывается, а не записывается ошибкой URL.
+    """
+    channel_id = extract_channel_id(url)
+    if not channel_id:
+        print(f"Skipping invalid URL: {url}")
+        return None, {"url": url, "error": "Invalid or unsupported channel URL format. Only URLs with /channel/UC... IDs are currently supported."}
+
+    print(f"Processing channel ID: {channel_id} for user {user.email}")
+
+    # Проверяем, есть ли уже такой канал у этого пользователя
+    existing_channel = db.exec(
+        select(FavoriteChannel)
+        .where(FavoriteChannel.user_id == user.id)
+        .where(FavoriteChannel.channel_id == channel_id)
+    ).first()
+    if existing_channel:
+        print(f"Channel {channel_id} already in favorites for user {user.email}. Skipping.")
+        # Можно добавить его в ответ, если нужно вернуть все запрошенные (даже существующие)
+        # added_channels_db.append(existing_channel)
+        return None, None
+
+    try:
+        # Данные канала общие для всех пользователей: API вызывается только для нового канала
+        channel = db.get(Channel, channel_id)
+        if channel is None:
+            channel = await fetch_channel(youtube, channel_id, redis_client)
+            if channel is None:
+                return None, {"url": url, "channel_id": channel_id, "error": "Channel not found or API error."}
+            _insert_channel(db, channel)
+        else:
+            print(f"Channel {channel_id} is already known. Reusing its shared row.")
+
+        favorite_channel = FavoriteChannel(
+            user_id=user.id,
+            channel_id=channel_id,
+            # added_at устанавливается по умолчанию в модели
+        )
+        db.add(favorite_channel)
+        print(f"Prepared channel {channel_id} for adding to DB.")
+        return favorite_channel, None
+
+    except ApiKeysExhaustedError:
+        # Остальные каналы тоже не получить - решает вызывающий
+        raise
+    except HTTPException as he:
+         # Перехватываем HTTP ошибки от зависимостей (например, 401 от get_user_youtube_client)
+         print(f"HTTPException while processing channel {channel_id}: {he.detail}")
+         # Возможно, стоит прервать весь процесс при ошибке авторизации
+         # raise he
+         return None, {"url": url, "channel_id": channel_id, "error": f"API Auth/Permission Error: {he.detail}"}
+    except Exception as e:
+        print(f"Unexpected error processing channel {channel_id}: {e}")
+        traceback.print_exc()
+        # Можно откатить транзакцию, если нужно атомарное добавление
+        # db.rollback()
+        # raise HTTPException(status_code=500, detail=f"Error processing channel {channel_id}: {e}")
+        return None, {"url": url, "channel_id": channel_id, "error": f"Internal error: {e}"}
+
+
 # --- ИЗМЕНЕНИЕ: Добавляем зависимость youtube клиента ---
 @router.post("/", response_model=List[FavoriteChannelRead], status_code=201) # Убрали /favorites из пути
 async def add_favorite_channels(
@@ -56,105 +191,21 @@ async def add_favorite_channels(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db), # Используем get_db напрямую
     # --- Новая зависимость ---
-    youtube: build = Depends(get_user_youtube_client_via_cookie)
+    youtube: build = Depends(get_user_youtube_client_via_cookie),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """Добавляет каналы в избранное пользователя."""
+    # Массовый импорт: вызовы API этого запроса уступают интерактивным запросам других пользователей
+    set_upstream_priority(Priority.BULK)
     added_channels_db = []
     errors = []
 
     for url in channel_urls:
-        channel_id = extract_channel_id(url)
-        if not channel_id:
-            errors.append({"url": url, "error": "Invalid or unsupported channel URL format. Only URLs with /channel/UC... IDs are currently supported."})
-            print(f"Skipping invalid URL: {url}")
-            continue
-
-        print(f"Processing channel ID: {channel_id} for user {current_user.email}")
-
-        # Проверяем, есть ли уже такой канал у этого пользователя
-        existing_channel = db.exec(
-            select(FavoriteChannel)
-            .where(FavoriteChannel.user_id == current_user.id)
-            .where(FavoriteChannel.channel_id == channel_id)
-        ).first()
-        if existing_channel:
-            print(f"Channel {channel_id} already in favorites for user {current_user.email}. Skipping.")
-            # Можно добавить его в ответ, если нужно вернуть все запрошенные (даже существующие)
-            # added_channels_db.append(existing_channel)
-            continue
-
-        # --- ИЗМЕНЕНИЕ: Получаем информацию о канале с YouTube используя youtube клиент ---
-        try:
-            print(f"Fetching channel info from YouTube API for: {channel_id}")
-            channel_info_dict = await core_get_channel_info(youtube, channel_id)
-            if not channel_info_dict:
-              # Эта ошибка обрабатывается внутри core_get_channel_info, но проверим еще раз
-              print(f"Failed to get channel info for {channel_id} from API.")
-              errors.append({"url": url, "channel_id": channel_id, "error": "Channel not found or API error."})
-              continue # Переходим к следующему URL
-
-            # --- ИЗМЕНЕНИЕ: Получаем количество видео с youtube клиентом ---
-            video_count = core_get_total_videos(youtube, channel_id)
-            # Обработка случая, когда video_count равен None (ошибка API)
-            if video_count is None:
-                 print(f"Failed to get video count for {channel_id}. Setting to 0.")
-                 video_count = 0 # Устанавливаем значение по умолчанию или пропускаем канал
-
-            # Ищем последнее видео на канале, чтобы узнать дату публикации
-            print(f"Searching for the last video on channel: {channel_id}")
-            search_response = youtube.search().list(
-                part='snippet',
-                channelId=channel_id,
-                type='video',
-                order='date', # Сортировка по дате (сначала новые)
-                maxResults=1
-            ).execute()
-
-            last_published_at = None
-            if search_response.get('items'):
-                published_str = search_response['items'][0]['snippet'].get('publishedAt')
-                if published_str:
-                     try:
-                          # Преобразуем строку в datetime с таймзоной UTC
-                          last_published_at = datetime.datetime.fromisoformat(published_str.replace('Z', '+00:00'))
-                     except ValueError:
-                          print(f"Could not parse last published date: {published_str}")
-                          last_published_at = datetime.datetime.now(datetime.timezone.utc) # Fallback
-
-            else:
-                print(f"No videos found on channel {channel_id} to determine last published date.")
-                # Устанавливаем текущую дату или None, в зависимости от требований
-                last_published_at = datetime.datetime.now(datetime.timezone.utc) # Или None
-
-            # Создаем объект FavoriteChannel для БД
-            favorite_channel = FavoriteChannel(
-                user_id=current_user.id,
-                channel_id=channel_id,
-                channel_title=channel_info_dict.get('channel_title', 'Unknown Title'),
-                channel_thumbnail=channel_info_dict.get('channel_thumbnail', ''),
-                channel_subscribers=channel_info_dict.get('channel_subscribers', 0),
-                channel_video_count=video_count, # Используем полученное количество видео
-                channel_last_published_at=last_published_at, # Используем полученную дату
-                channel_url=channel_info_dict.get('channel_url', f'https://www.youtube.com/channel/{channel_id}'),
-                # added_at устанавливается по умолчанию в модели
-            )
-            db.add(favorite_channel)
+        favorite_channel, error = await prepare_favorite_channel(db, current_user, url, youtube, redis_client)
+        if error:
+            errors.append(error)
+        if favorite_channel:
             added_channels_db.append(favorite_channel)
-            print(f"Prepared channel {channel_id} for adding to DB.")
-
-        except HTTPException as he:
-             # Перехватываем HTTP ошибки от зависимостей (например, 401 от get_user_youtube_client)
-             print(f"HTTPException while processing channel {channel_id}: {he.detail}")
-             errors.append({"url": url, "channel_id": channel_id, "error": f"API Auth/Permission Error: {he.detail}"})
-             # Возможно, стоит прервать весь процесс при ошибке авторизации
-             # raise he
-        except Exception as e:
-            print(f"Unexpected error processing channel {channel_id}: {e}")
-            traceback.print_exc()
-            errors.append({"url": url, "channel_id": channel_id, "error": f"Internal error: {e}"})
-            # Можно откатить транзакцию, если нужно атомарное добавление
-            # db.rollback()
-            # raise HTTPException(status_code=500, detail=f"Error processing channel {channel_id}: {e}")
 
     # Коммитим все успешно добавленные каналы
     if added_channels_db:
@@ -168,6 +219,7 @@ async def add_favorite_channels(
              print(f"Error committing favorites to DB: {e}")
              db.rollback()
              raise HTTPException(status_code=500, detail=f"Database commit error: {e}")
+        await bump_list_version(redis_client, FAVORITES_LIST, current_user.id)
 
     # Возвращаем список успешно добавленных каналов
     # Если были ошибки, можно вернуть их в заголовке или в теле ответа (если изменить response_model)
@@ -177,29 +229,126 @@ async def add_favorite_channels(
          # raise HTTPException(status_code=400, detail={"added": [FavoriteChannelRead.model_validate(ch) for ch in added_channels_db], "errors": errors})
 
     # Валидируем через Pydantic модель перед возвратом
-    return [FavoriteChannelRead.model_validate(channel) for channel in added_channels_db]
+    return [FavoriteChannelRead.from_db(channel) for channel in added_channels_db]
 
 # --- Эндпоинты get и delete не требуют клиента YouTube ---
 @router.get("/", response_model=FavoriteChannelList) # Убрали /favorites из пути
 async def get_favorite_channels(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Количество каналов на странице; без limit - все каналы"),
+    cursor: Optional[str] = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db) # Используем get_db
+    db: Session = Depends(get_db), # Используем get_db
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
-    """Возвращает список избранных каналов пользователя из базы данных."""
+    """
+    Возвращает страницу избранных каналов пользователя (новые сначала).
+    Без limit - весь список одной страницей, как до появления пагинации (next_cursor всегда null).
+    Поддерживает условный запрос: при совпадении If-None-Match отвечает 304, не обращаясь к БД.
+    """
+    etag = await get_list_etag(redis_client, FAVORITES_LIST, current_user.id, limit, cursor)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
     print(f"Fetching favorite channels for user: {current_user.email}")
-    channels = db.exec(
-        select(FavoriteChannel).where(FavoriteChannel.user_id == current_user.id)
-    ).all()
+    channels, next_cursor = paginate_by_added_at(
+        db,
+        select(FavoriteChannel)
+        .where(FavoriteChannel.user_id == current_user.id)
+        .options(joinedload(FavoriteChannel.channel)), # Данные канала - одним JOIN
+        FavoriteChannel, limit, cursor,
+    )
     print(f"Found {len(channels)} favorite channels in DB.")
+    # Просматриваемые каналы фоновый refresher обновляет в первую очередь
+    await record_channel_views(redis_client, (ch.channel_id for ch in channels))
+    if etag:
+        response.headers["ETag"] = etag
     # Модель FavoriteChannelList ожидает словарь {"channels": [...]}
-    return FavoriteChannelList(channels=[FavoriteChannelRead.model_validate(ch) for ch in channels])
+    return FavoriteChannelList(channels=[FavoriteChannelRead.from_db(ch) for ch in channels], next_cursor=next_cursor)
+
+
+@router.get("/feed", response_model=FavoritesFeedResponse)
+async def get_favorites_feed(
+    limit: int = Query(30, ge=1, le=100, description="Количество видео на странице"),
+    cursor: Optional[str] = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    youtube: build = Depends(get_user_youtube_client_via_cookie),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
+):
+    """
+    Возвращает общую ленту последних загрузок всех избранных каналов пользователя (новые сначала).
+    Загрузки читаются из плейлистов загрузок параллельно и кэшируются по каналу для всех пользователей.
+    """
+    after = None
+    if cursor:
+        after = tuple(decode_cursor(cursor, 2))
+        # Ключ ленты - (published_at, video_id): строки сравниваются только со строками
+        if not all(isinstance(part, str) for part in after):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+    channel_ids = db.exec(
+        select(FavoriteChannel.channel_id).where(FavoriteChannel.user_id == current_user.id)
+    ).all()
+    print(f"Building favorites feed for user {current_user.email} from {len(channel_ids)} channels")
+
+    uploads = await get_uploads_for_channels(youtube, channel_ids, redis_client)
+    await record_channel_views(redis_client, channel_ids)
+
+    # Списки каналов уже отсортированы от новых к старым - сливаем их без полной сортировки
+    sort_key = lambda item: (item['published_at'], item['video_id'])
+    merged = heapq.merge(*uploads.values(), key=sort_key, reverse=True)
+    if after is not None:
+        merged = itertools.dropwhile(lambda item: sort_key(item) >= after, merged)
+
+    page = list(itertools.islice(merged, limit + 1))
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    next_cursor = encode_cursor(*sort_key(page[-1])) if has_more else None
+    items = [FavoritesFeedItem.model_validate(item) for item in page]
+    return FavoritesFeedResponse(item_count=len(items), items=items, next_cursor=next_cursor)
+
+
+@router.get("/search", response_model=FavoritesSearchResponse)
+async def search_favorites(
+    q: str = Query(..., min_length=1, max_length=200, description="Слова для поиска в названиях и описаниях"),
+    limit: int = Query(50, ge=1, le=200, description="Количество видео в ответе"),
+    published_after: Optional[datetime.datetime] = Query(None, description="Только видео, опубликованные позже (ISO 8601, UTC без смещения)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    youtube: build = Depends(get_user_youtube_client_via_cookie),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
+):
+    """
+    Поиск по последним загрузкам избранных каналов пользователя без search.list (100 units на канал).
+    Загрузки берутся из того же кэша, что и /favorites/feed (устаревшие плейлисты дочитываются параллельно,
+    1 unit за страницу), совпадения ищутся локально по инвертированному индексу названий и описаний.
+    Все слова запроса должны встретиться, последнее - по префиксу.
+    """
+    channel_ids = db.exec(
+        select(FavoriteChannel.channel_id).where(FavoriteChannel.user_id == current_user.id)
+    ).all()
+    uploads = await get_uploads_for_channels(youtube, channel_ids, redis_client)
+    await record_channel_views(redis_client, channel_ids)
+
+    published_after_str = None
+    if published_after is not None:
+        if published_after.tzinfo is None:
+            published_after = published_after.replace(tzinfo=datetime.timezone.utc)
+        published_after_str = published_after.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    matches = await asyncio.to_thread(search_uploads, uploads, q, limit, published_after_str)
+    items = [FavoritesSearchItem.model_validate(item) for item in matches]
+    return FavoritesSearchResponse(item_count=len(items), items=items, channels_searched=len(uploads))
 
 
 @router.delete("/{channel_id_db}", status_code=status.HTTP_204_NO_CONTENT) # Используем другое имя параметра пути
 async def delete_favorite_channel(
     channel_id_db: str, # ID канала из пути
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db) # Используем get_db
+    db: Session = Depends(get_db), # Используем get_db
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """Удаляет канал из избранного пользователя по ID канала."""
     print(f"Attempting to delete favorite channel {channel_id_db} for user {current_user.email}")
@@ -222,4 +371,42 @@ async def delete_favorite_channel(
     except Exception as e:
         print(f"Error deleting favorite channel {channel_id_db} from DB: {e}")
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database delete error: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database delete error: {e}")
+    await bump_list_version(redis_client, FAVORITES_LIST, current_user.id)
+
+# --- Фоновая задача: импорт избранного (POST /jobs, type=favorites_import) ---
+class FavoritesImportJob(BaseModel):
+    channel_urls: List[str] = Field(..., min_length=1, max_length=5000)
+
+
+@job_handler('favorites_import', FavoritesImportJob, "Добавление каналов в избранное по списку URL")
+async def run_favorites_import(ctx: JobContext, params: FavoritesImportJob) -> Dict:
+    """
+    То же, что POST /favorites/, но без ограничения времени запроса: каждый канал сохраняется сразу,
+    результаты (добавленный канал или ошибка) доступны по мере обработки.
+    Каналы запрашиваются ключами пула приложения (у задачи нет cookie пользователя) с переключением ключей;
+    когда ключи исчерпаны, задача завершается ошибкой (уже добавленные каналы остаются).
+    """
+    if not api_key_manager.available_keys():
+        raise ApiKeysExhaustedError("No YouTube API keys available (not configured or exhausted).")
+    added = failed = 0
+    with Session(engine) as db:
+        user = db.get(User, uuid.UUID(ctx.user_id))
+        if user is None:
+            raise ValueError("User not found")
+        total = len(params.channel_urls)
+        for done, url in enumerate(params.channel_urls, start=1):
+            favorite_channel, error = await prepare_favorite_channel(db, user, url, None, ctx.redis)
+            if favorite_channel:
+                db.commit()
+                db.refresh(favorite_channel)
+                added += 1
+                await ctx.add_results([{'added': FavoriteChannelRead.from_db(favorite_channel).model_dump(mode='json')}])
+            elif error:
+                db.rollback()
+                failed += 1
+                await ctx.add_results([{'error': error}])
+            await ctx.progress(done, total)
+    if added:
+        await bump_list_version(ctx.redis, FAVORITES_LIST, uuid.UUID(ctx.user_id))
+    return {'added': added, 'failed': failed, 'skipped': total - added - failed}
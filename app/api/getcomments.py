@@ -1,176 +1,156 @@
-from fastapi import APIRouter, Query, HTTPException, Response, status
-from googleapiclient.discovery import build
-from app.core.config import settings
-from urllib.parse import quote
-from typing import Optional, List
-from math import ceil
+import asyncio
 import json
-import uuid
-from pathlib import Path
-import aiofiles
-
-
-YOUTUBE_API_SERVICE_NAME = 'youtube'
-YOUTUBE_API_VERSION = 'v3'
-YOUTUBE_ANALYTICS_API_SERVICE_NAME = "youtubeAnalytics"
-YOUTUBE_ANALYTICS_API_VERSION = "v2"
-
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Literal, Optional
 
-def get_youtube_client():
-    """Создает и возвращает клиентский объект YouTube API."""
-    return build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION, developerKey=settings.youtube_api_key)
+import redis.asyncio as redis
+from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi.responses import StreamingResponse
+from googleapiclient.errors import HttpError
+from pydantic import BaseModel, Field
 
+from app.core.config import settings
+from app.core.jobs import JobContext, job_handler
+from app.core.redis_client import get_optional_redis_client
+from app.core.youtube import partial_response
+from app.core.youtube_client_manager import api_key_manager, ApiKeysExhaustedError
+from app.services.comment_archive import comment_archive
+from app.services.comment_digest import budget_to_chars, build_digest, get_cached_digest, store_digest
+from app.services.comments import fetch_comment_threads_page, harvest_comments
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+JOB_RESULTS_BATCH_SIZE = 100 # Комментариев, дописываемых в результаты задачи за раз
 
-async def save_json_to_file(data):
-    # Преобразуем словарь в JSON-строку
-    json_data = json.dumps(data, indent=4)
-
-    # Генерируем уникальный идентификатор
-    unique_id = str(uuid.uuid4())
 
-    # Создаем путь к папке data
-    data_dir = Path("comms")
-    data_dir.mkdir(exist_ok=True)  # Создаем папку, если её нет
+def _http_error_to_exception(e: HttpError) -> HTTPException:
+    if e.status_code == 403 and 'commentsDisabled' in str(e.content):
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='comments disabled')
+    if e.status_code == 404:
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='video not found')
+    return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"YouTube API upstream error: {e.status_code}")
 
-    # Создаем имя файла
-    file_name = data_dir / f"comms_{unique_id}.json"
 
-    # Асинхронно записываем данные в файл
-    async with aiofiles.open(file_name, mode='w') as json_file:
-        await json_file.write(json_data)
+async def _archived(video_id: str, comments: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    """Передает комментарии дальше, параллельно отдавая их фоновому архиватору."""
+    harvested_at = datetime.now(timezone.utc).isoformat()
+    async for comment in comments:
+        if settings.comment_archive_enabled:
+            comment_archive.archive({'video_id': video_id, 'harvested_at': harvested_at, **comment})
+        yield comment
 
 
 @router.get("/getcomments")
 async def get_comments(
     video_id: str = Query(..., description="ID видео для которого необходимо получить комментарии"),
+    max_comments: int = Query(settings.comments_default_limit, ge=1, le=settings.comments_max_limit, description="Максимум комментариев (вместе с ответами)"),
+    include_replies: bool = Query(True, description="Включать ответы на комментарии"),
+    order: Literal['relevance', 'time'] = Query('relevance', description="Порядок веток комментариев"),
+    format: Literal['json', 'ndjson', 'digest'] = Query('json', description="json - список текстов; ndjson - поток записей комментариев; digest - выжимка в пределах бюджета"),
+    budget_chars: Optional[int] = Query(None, ge=100, le=1_000_000, description="digest: бюджет в символах"),
+    budget_tokens: Optional[int] = Query(None, ge=25, le=250_000, description="digest: бюджет в токенах (~4 символа на токен), если budget_chars не задан"),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
-    try:
-        youtube = get_youtube_client()
+    """
+    Собирает комментарии видео постранично (commentThreads.list + comments.list для ответов)
+    через пул API-ключей. В режиме ndjson записи отдаются по мере получения страниц.
+    В режиме digest комментарии нормализуются, дубликаты и почти-дубликаты схлопываются,
+    остальное ранжируется по лайкам/ответам и упаковывается в бюджет; выжимка кэшируется
+    на (video_id, бюджет, max_comments, include_replies, order), повторный запрос не тратит ни квоту, ни CPU.
+    Собранные комментарии архивируются в фоне в comms/ (сжатый JSONL с ротацией).
+    """
+    digest_budget = budget_to_chars(budget_chars, budget_tokens)
+    if format == 'digest':
+        cached_digest = await get_cached_digest(redis_client, video_id, digest_budget, max_comments, include_replies, order)
+        if cached_digest is not None:
+            return {**cached_digest, 'cached': True}
 
-        video_info = youtube.videos().list(
+    try:
+        video_info = await api_key_manager.execute(lambda youtube: youtube.videos().list(
             part="statistics",
             id=video_id,
-        ).execute()
-
-        if 'commentCount' not in video_info['items'][0]['statistics']:
+            **partial_response("items(id,statistics/commentCount)"),
+        ))
+        if not video_info.get('items'):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='video not found')
+
+        # Без commentCount частичный ответ не содержит statistics
+        statistics = video_info['items'][0].get('statistics', {})
+        if 'commentCount' not in statistics:
             return {'detail': 'comments hidden'}
+        if int(statistics['commentCount']) == 0:
+            return {'detail': 'no comments'}
 
-        comments_count = int(video_info['items'][0]['statistics']['commentCount'])
+        # Первая страница запрашивается до начала ответа, чтобы ошибки вернулись с правильным статусом
+        first_page = await fetch_comment_threads_page(video_id, order)
+    except HttpError as e:
+        raise _http_error_to_exception(e)
+    except ApiKeysExhaustedError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service temporarily unavailable due to API quota limits.")
 
-        if comments_count == 0:
-            return {'detail': 'no comments'}
+    comments = _archived(video_id, harvest_comments(video_id, first_page, max_comments, order, include_replies))
+
+    if format == 'ndjson':
+        async def stream_lines() -> AsyncIterator[bytes]:
+            try:
+                async for comment in comments:
+                    yield (json.dumps(comment, ensure_ascii=False) + "\n").encode("utf-8")
+            except (HttpError, ApiKeysExhaustedError) as e:
+                # Статус уже отправлен - сообщаем об обрыве последней строкой
+                logger.warning(f"Comment harvesting for {video_id} stopped early: {e}")
+                yield (json.dumps({'error': 'harvest interrupted', 'detail': str(e)}) + "\n").encode("utf-8")
 
-        try:
-            comments_response = youtube.commentThreads().list(
-                part='snippet,replies',
-                videoId=video_id,
-                maxResults=100,
-                order='relevance',
-                textFormat='plainText',
-            ).execute()
-        except Exception as e:
-            raise HTTPException(status_code=403, detail='comments disabled')
-
-        await save_json_to_file({
-            'video_id': video_id,
-            'comments': comments_response,
-        })
-
-        comments_response = comments_response['items']
-        comments_results = [comm['snippet']['topLevelComment']['snippet']['textOriginal'] for comm in comments_response]
-
-        return {'comments_count': len(comments_results), 'items': comments_results}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-# @router.get("/getcomments")
-# async def get_comments(
-#     video_id: str = Query(..., description="ID видео для которого необходимо получить комментарии"),
-# ):
-#     # try:
-#     # percentage_get_comments = 10
-#
-#     youtube = get_youtube_client()
-#     # comments_result = []
-#
-#     video_info = youtube.videos().list(
-#         part="statistics",
-#         id=video_id,
-#     ).execute()
-#
-#     if 'commentCount' not in video_info['items'][0]['statistics']:
-#         return {'detail': 'comments hidden'}
-#
-#     comments_count = int(video_info['items'][0]['statistics']['commentCount'])
-#
-#     if comments_count == 0:
-#         return {'detail': 'no comments'}
-#
-#     # comments_get_count = min(int(comments_count * percentage_get_comments / 100), 1000)
-#     # pages_count = ceil(comments_get_count / 100)
-#
-#     try:
-#         comments_response = youtube.commentThreads().list(
-#             part='snippet,replies',
-#             videoId=video_id,
-#             maxResults=100,
-#             order='relevance',
-#             textFormat='plainText',
-#         ).execute()
-#     except Exception as e:
-#         raise HTTPException(status_code=403, detail='comments disabled')
-#
-#     await save_json_to_file({
-#         'video_id': video_id,
-#         'comments': comments_response,
-#     })
-#
-#     comments_response = comments_response['items']
-#     comments_results = [comm['snippet']['topLevelComment']['snippet']['textOriginal'] for comm in comments_response]
-#
-#
-#     # next_page_token = None
-#
-#     # for i in range(pages_count):
-#     #     if not next_page_token:
-#     #         comments_responce_page = youtube.commentThreads().list(
-#     #             part='snippet,replies',
-#     #             videoId=video_id,
-#     #             maxResults=100,
-#     #             order='relevance',
-#     #             textFormat='plainText',
-#     #         ).execute()
-#     #     else:
-#     #         comments_responce_page = youtube.commentThreads().list(
-#     #             part='snippet,replies',
-#     #             videoId=video_id,
-#     #             maxResults=100,
-#     #             order='relevance',
-#     #             pageToken=next_page_token,
-#     #             textFormat='plainText',
-#     #         ).execute()
-#     #
-#     #     next_page_token = comments_responce_page['nextPageToken'] if 'nextPageToken' in comments_responce_page else -1
-#     #     comments_responce += comments_responce_page['items']
-#
-#     # comments = youtube.commentThreads().list(
-#     #     part='snippet,replies',
-#     #     videoId=video_id,
-#     #     maxResults=100,
-#     #     order='relevance',
-#     #     textFormat='plainText',
-#     # ).execute()
-#
-#     # if comments_count - len(comments['items']) > 0:
-#
-#
-#     return {'comments_count': len(comments_results), 'items': comments_results}
-#
-#     # except Exception as e:
-#     #     raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        return StreamingResponse(stream_lines(), media_type="application/x-ndjson")
+
+    try:
+        harvested = [comment async for comment in comments]
+    except HttpError as e:
+        raise _http_error_to_exception(e)
+    except ApiKeysExhaustedError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service temporarily unavailable due to API quota limits.")
+
+    if format == 'digest':
+        digest = await asyncio.to_thread(build_digest, video_id, harvested, digest_budget)
+        await store_digest(redis_client, digest, max_comments, include_replies, order)
+        return {**digest, 'cached': False}
+
+    comments_results = [comment['text'] for comment in harvested]
+    return {'comments_count': len(comments_results), 'items': comments_results}
+
+
+# --- Фоновая задача: сбор комментариев (POST /jobs, type=comments_harvest) ---
+class CommentsHarvestJob(BaseModel):
+    video_id: str
+    max_comments: int = Field(settings.comments_max_limit, ge=1, le=settings.jobs_comments_max_limit)
+    include_replies: bool = True
+    order: Literal['relevance', 'time'] = 'relevance'
+
+
+@job_handler('comments_harvest', CommentsHarvestJob, "Сбор комментариев видео (с ответами)")
+async def run_comments_harvest(ctx: JobContext, params: CommentsHarvestJob) -> Dict:
+    """
+    То же, что /forai/getcomments?format=ndjson, но с лимитом до jobs_comments_max_limit:
+    записи комментариев дописываются в результаты задачи пачками по мере обхода страниц.
+    """
+    try:
+        first_page = await fetch_comment_threads_page(params.video_id, params.order)
+    except HttpError as e:
+        raise ValueError(_http_error_to_exception(e).detail) from e
+
+    batch = []
+    harvested = 0
+    comments = harvest_comments(params.video_id, first_page, params.max_comments, params.order, params.include_replies)
+    async for comment in _archived(params.video_id, comments):
+        batch.append(comment)
+        if len(batch) >= JOB_RESULTS_BATCH_SIZE:
+            harvested += len(batch)
+            await ctx.add_results(batch)
+            await ctx.progress(harvested, params.max_comments)
+            batch = []
+    harvested += len(batch)
+    await ctx.add_results(batch)
+    await ctx.progress(harvested, params.max_comments)
+    return {'video_id': params.video_id, 'comments_count': harvested}
@@ -0,0 +1,75 @@
+# app/api/health.py
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict
+
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from app.core.batch_loader import batch_loaders
+from app.core.config import settings
+from app.core.database import ping_db
+from app.core.lifespan import startup_state
+from app.core.periodic import periodic_scheduler
+from app.core.redis_client import get_redis
+from app.core.upstream_scheduler import upstream_scheduler
+
+router = APIRouter()
+
+
+async def _ping_redis():
+    client = get_redis()
+    if client is None:
+        raise RuntimeError("REDIS_URL is not set")
+    await client.ping()
+
+
+async def _check(probe: Callable[[], Awaitable[None]]) -> Dict:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(probe(), timeout=settings.readiness_check_timeout_seconds)
+        result = {'ok': True}
+    except asyncio.TimeoutError:
+        result = {'ok': False, 'error': 'timeout'}
+    except Exception as e:
+        result = {'ok': False, 'error': str(e)}
+    result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+async def _periodic_metrics() -> Dict:
+    try:
+        return await asyncio.wait_for(periodic_scheduler.metrics(), timeout=settings.readiness_check_timeout_seconds)
+    except asyncio.TimeoutError:
+        return {'error': 'timeout'}
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: процесс жив и обслуживает event loop. Зависимости не проверяются."""
+    return {'status': 'ok', 'uptime_seconds': round(time.time() - startup_state.started_at, 1)}
+
+
+@router.get("/readyz")
+async def readyz():
+    """
+    Readiness: прогрев завершен и БД / Redis отвечают.
+    Возвращает задержку каждой зависимости; 503, если приложение еще не готово принимать трафик.
+    """
+    database, redis_check, periodic = await asyncio.gather(
+        _check(lambda: asyncio.to_thread(ping_db)),
+        _check(_ping_redis),
+        _periodic_metrics(),
+    )
+    ready = startup_state.ready and database['ok'] and redis_check['ok']
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            'status': 'ready' if ready else 'not_ready',
+            'startup': startup_state.as_dict(),
+            'checks': {'database': database, 'redis': redis_check},
+            'upstream': upstream_scheduler.as_dict(),
+            'batch_loaders': {name: loader.as_dict() for name, loader in batch_loaders.items()},
+            'periodic': periodic,
+        },
+    )
@@ -0,0 +1,110 @@
+# app/api/jobs.py
+import logging
+from typing import Dict, List
+
+import redis.asyncio as redis
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import ValidationError
+
+from app.api.auth import get_current_user
+from app.core.jobs import JOB_TYPES, JobQueueUnavailable, job_queue
+from app.models.user import User
+from app.schemas.job import JobCreate, JobDetail, JobList, JobRead, JobTypeInfo
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _queue_unavailable(e: Exception) -> HTTPException:
+    logger.error(f"Job queue unavailable: {e}")
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Job queue is temporarily unavailable.")
+
+
+async def get_user_job(job_id: str, user: User) -> Dict:
+    try:
+        job = await job_queue.get(job_id)
+    except (redis.RedisError, JobQueueUnavailable) as e:
+        raise _queue_unavailable(e)
+    if job is None or job['user_id'] != str(user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.get("/types", response_model=List[JobTypeInfo])
+async def get_job_types():
+    """Доступные типы задач и JSON Schema их параметров."""
+    return [
+        JobTypeInfo(type=job_type.name, description=job_type.description, params_schema=job_type.params_model.model_json_schema())
+        for job_type in JOB_TYPES.values()
+    ]
+
+
+@router.post("", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(job: JobCreate, current_user: User = Depends(get_current_user)):
+    """
+    Ставит длительную операцию в очередь и сразу возвращает ее id.
+    Ход выполнения, частичные результаты и итог - GET /jobs/{id}, отмена - DELETE /jobs/{id}.
+    """
+    job_type = JOB_TYPES.get(job.type)
+    if job_type is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown job type. Available: {', '.join(JOB_TYPES)}")
+    try:
+        params = job_type.params_model.model_validate(job.params)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors(include_url=False, include_context=False))
+
+    try:
+        created = await job_queue.submit(str(current_user.id), job.type, params)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except (redis.RedisError, JobQueueUnavailable) as e:
+        raise _queue_unavailable(e)
+    return JobRead.model_validate(created)
+
+
+@router.get("", response_model=JobList)
+async def list_jobs(
+    limit: int = Query(50, ge=1, le=200, description="Количество задач (новые сначала)"),
+    current_user: User = Depends(get_current_user),
+):
+    """Задачи пользователя; завершенные хранятся settings.jobs_ttl_seconds."""
+    try:
+        jobs = await job_queue.list_for_user(str(current_user.id), limit)
+    except (redis.RedisError, JobQueueUnavailable) as e:
+        raise _queue_unavailable(e)
+    return JobList(jobs=[JobRead.model_validate(job) for job in jobs])
+
+
+@router.get("/{job_id}", response_model=JobDetail)
+async def get_job(
+    job_id: str,
+    results_offset: int = Query(0, ge=0, description="С какого результата отдавать (для дочитывания по мере выполнения)"),
+    results_limit: int = Query(100, ge=0, le=1000, description="Сколько результатов отдать; 0 - только состояние"),
+    current_user: User = Depends(get_current_user),
+):
+    """Состояние задачи, прогресс и страница результатов (доступны и до завершения)."""
+    job = await get_user_job(job_id, current_user)
+    results = []
+    if results_limit:
+        try:
+            results = await job_queue.get_results(job_id, results_offset, results_limit)
+        except (redis.RedisError, JobQueueUnavailable) as e:
+            raise _queue_unavailable(e)
+    return JobDetail.model_validate({**job, 'results': results, 'results_offset': results_offset})
+
+
+@router.delete("/{job_id}", response_model=JobRead)
+async def cancel_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """
+    Отменяет задачу. Ожидающая задача отменяется сразу, выполняющаяся - в течение секунды-двух;
+    полученные до отмены результаты остаются доступны. Завершенная задача не меняется.
+    """
+    await get_user_job(job_id, current_user)
+    try:
+        job = await job_queue.cancel(job_id)
+    except (redis.RedisError, JobQueueUnavailable) as e:
+        raise _queue_unavailable(e)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return JobRead.model_validate(job)
@@ -1,8 +1,8 @@
 # app/api/search.py
+import asyncio
 import logging
 from fastapi import APIRouter, Query, HTTPException, Response, status, Depends
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from sqlmodel import Session, select
 import time # Для timestamp в limit-status
 from datetime import datetime, timedelta, timezone # Для limit-status
 from pydantic import BaseModel # Для limit-status
@@ -10,16 +10,28 @@ from pydantic import BaseModel # Для limit-status
 # --- Зависимости и Модели ---
 from app.api.auth import get_current_user
 from app.models.user import User
-from app.core.youtube_client_manager import api_key_manager
-from app.core.youtube import parse_duration, get_rfc3339_date, get_channel_info
-from app.models.search_models import Item, SearchResponse
+from app.core.youtube import get_rfc3339_date
+from app.models.search_models import SearchResponse
 from app.core.rate_limiter import rate_limit_search # Наш rate limiter
-from app.core.redis_client import get_redis_client # Для эндпоинта статуса
+from app.core.redis_client import get_redis_client, get_optional_redis_client # Для эндпоинта статуса
 from app.core.config import settings # Для получения настроек лимита
+from app.core.database import get_db
+from app.core.pagination import paginate_by_added_at
+from app.models.search_history import SearchHistory
+from app.models.saved_search import SavedSearch
+from app.schemas.search_history import SearchHistoryEntry, SearchHistoryList, SearchHistoryReplay
+from app.schemas.saved_search import SavedSearchCreate, SavedSearchEntry, SavedSearchList, SavedSearchRead, SavedSearchRefresh
+from app.services.search import DATE_PUBLISHED_FILTERS, SEARCH_KINDS, record_search_popularity, run_search
+from app.services.channel_baseline import BASELINE_METHODS, apply_channel_baseline
+from app.services.local_index import local_index
+from app.services.video_snapshots import apply_view_velocity
+from app.services.search_history import SNAPSHOT_ENCODING, new_share_token, pack_snapshot, save_search_snapshot, search_params_hash, unpack_snapshot
+from app.services.saved_searches import refresh_saved_search
+from app.core.youtube_client_manager import ApiKeysExhaustedError
+from googleapiclient.errors import HttpError
+from sqlalchemy import func
 
 # --- Вспомогательные утилиты ---
-from urllib.parse import quote
-import json
 import uuid
 import aiofiles
 from pathlib import Path
@@ -37,18 +49,6 @@ def sort_json_by_key_values(json_objects, key_values, key):
     sorted_objects = sorted(json_objects, key=lambda x: priority.get(x[key], len(key_values)))
     return sorted_objects
 
-def is_shorts(video_r):
-    title = video_r["snippet"].get("title", "").lower()
-    description = video_r["snippet"].get("description", "").lower()
-    duration = parse_duration(video_r.get('contentDetails', {}).get('duration'))
-    return "#shorts" in title or "#shorts" in description or duration <= 3 * 60
-
-def is_shorts_v(video_r):
-    title = video_r["snippet"].get("title", "").lower()
-    description = video_r["snippet"].get("description", "").lower()
-    duration = parse_duration(video_r.get('contentDetails', {}).get('duration'))
-    return "#shorts" in title or "#shorts" in description or duration <= 60
-
 async def save_json_to_file(data):
     # Сохранение ответа API для отладки (можно включать/выключать)
     # json_data = json.dumps(data, indent=4)
@@ -64,232 +64,42 @@ def find_object_with_next(data, key, value):
     return next((obj for obj in data if obj.get(key) == value), None)
 
 
-# --- Функция для сборки объекта Item ---
-async def build_search_item_obj(youtube: build, search_r, video_r, channel_id, item_type='video'):
-    """
-    Строит объект Item из данных поиска, видео и канала.
-    Обрабатывает возможные HttpError при запросе информации о канале.
-    """
-    try:
-        channel_info = await get_channel_info(youtube, channel_id)
-        if not channel_info:
-            return None
-
-        stats = video_r.get('statistics', {})
-        snippet = video_r.get('snippet', {})
-        content_details = video_r.get('contentDetails', {})
-
-        likes = int(stats['likeCount']) if 'likeCount' in stats else 0
-        likes_hidden = 'likeCount' not in stats
-
-        comments = int(stats['commentCount']) if 'commentCount' in stats else 0
-        comments_hidden = 'commentCount' not in stats
-
-        channel_views = channel_info.get('viewCount', 0)
-        channel_video_count = channel_info.get('videoCount', 0)
-
-        avg_views_per_video = float(channel_views) / float(channel_video_count) if channel_video_count > 0 else 0
-        video_views = float(stats.get('viewCount', 0))
-
-        if avg_views_per_video <= 0 and video_views > 0:
-             avg_views_per_video = video_views
-
-        combined_metric = video_views / avg_views_per_video if avg_views_per_video > 0 else None
-
-        video_url = f'https://www.youtube.com/watch?v={video_r["id"]}'
-        if item_type == 'shorts':
-            video_url = f'https://www.youtube.com/shorts/{video_r["id"]}'
-
-        # Используем .get() для большей устойчивости к отсутствующим полям
-        search_item = Item.model_validate({
-            'video_id': video_r.get('id'),
-            'title': snippet.get('title', 'No Title'),
-            'thumbnail': snippet.get('thumbnails', {}).get('high', {}).get('url'),
-            'published_at': snippet.get('publishedAt'),
-            'views': int(stats.get('viewCount', 0)),
-            'channel_title': channel_info.get('channel_title', 'Unknown Channel'),
-            'channel_url': channel_info.get('channel_url', f'https://www.youtube.com/channel/{channel_id}'),
-            'channel_subscribers': channel_info.get('channel_subscribers', 0),
-            'video_count': channel_info.get('videoCount', 0),
-            'likes': likes,
-            'likes_hidden': likes_hidden,
-            'comments': comments,
-            'comments_hidden': comments_hidden,
-            'combined_metric': combined_metric,
-            'duration': parse_duration(content_details.get('duration')),
-            'video_url': video_url,
-            'channel_thumbnail': channel_info.get('channel_thumbnail'),
-        })
-        return search_item.model_dump()
-
-    except HttpError as e:
-         logger.error(f"HttpError in build_search_item_obj (channel_id: {channel_id}, video_id: {video_r.get('id', 'N/A')}): {e.status_code} - {e.reason}")
-         raise e
-    except KeyError as e:
-        logger.error(f"KeyError building item for video ID {video_r.get('id', 'N/A')}: Missing key {e}")
-        return None
-    except Exception as e:
-        logger.exception(f"Unexpected error building item for video ID {video_r.get('id', 'N/A')}: {e}")
-        return None
-
-
-# --- Функция для получения пачки видео ---
-async def get_videos_page(youtube: build, encoded_query, max_results_target, date_published, current_results, page_token=None):
-    """
-    Получает одну страницу результатов поиска видео и их детали.
-    Фильтрует shorts.
-    Пробрасывает HttpError при ошибках API.
-    Возвращает: (list_of_items_on_page, next_page_token, total_results_estimate)
-    """
-    try:
-        logger.info(f"API Call: youtube.search().list (videos, query='{encoded_query}', page_token={page_token is not None})")
-        search_response_dict = youtube.search().list(
-            q=encoded_query, part='snippet', type='video',
-            pageToken=page_token, publishedAfter=date_published, maxResults=50
-        ).execute()
-    except HttpError as e:
-        logger.error(f"HttpError during youtube.search().list: {e.status_code} - {e.reason}")
-        raise e
-    except Exception as e:
-        logger.exception(f"Unexpected error during youtube.search().list: {e}")
-        raise HTTPException(status_code=500, detail=f"YouTube API search unexpected error: {e}")
-
-    total_results = search_response_dict.get('pageInfo', {}).get('totalResults', 0)
-    next_page_token_from_api = search_response_dict.get('nextPageToken')
-    search_items = search_response_dict.get('items', [])
-    logger.debug(f"Search page results: {len(search_items)} items found. Next page: {'Yes' if next_page_token_from_api else 'No'}")
-
-    if not search_items:
-        return [], None, total_results
-
-    video_ids = [item["id"]["videoId"] for item in search_items if item.get("id", {}).get("videoId")]
-    if not video_ids:
-        return [], next_page_token_from_api, total_results
-
-    logger.info(f"API Call: youtube.videos().list for {len(video_ids)} IDs")
-    try:
-        video_response = youtube.videos().list(
-            part="snippet,contentDetails,statistics", id=','.join(video_ids), maxResults=len(video_ids)
-        ).execute()
-        video_items = video_response.get('items', [])
-    except HttpError as e:
-        logger.error(f"HttpError during youtube.videos().list: {e.status_code} - {e.reason}")
-        raise e
-    except Exception as e:
-        logger.exception(f"Unexpected error during youtube.videos().list: {e}")
-        raise HTTPException(status_code=500, detail=f"YouTube API videos.list unexpected error: {e}")
-
-    video_details_map = {v['id']: v for v in video_items}
-    page_results = []
-    processed_count = 0
-
-    for search_item in search_items:
-        video_id = search_item.get("id", {}).get("videoId")
-        channel_id = search_item.get("snippet", {}).get("channelId")
-        video_detail = video_details_map.get(video_id)
-
-        if not video_id or not channel_id or not video_detail: continue
-
-        # Фильтруем shorts
-        if is_shorts_v(video_detail):
-            logger.debug(f"Skipping video {video_id} in /videos search as it's shorts.")
-            continue
-
-        try:
-            built_item = await build_search_item_obj(youtube, search_item, video_detail, channel_id, 'video')
-        except HttpError as e:
-            logger.error(f"HttpError from build_search_item_obj for video {video_id}: {e.status_code}")
-            raise e # Пробрасываем для ротации
-
-        if built_item:
-            page_results.append(built_item)
-            processed_count += 1
-            # Проверяем общее количество с учетом уже имеющихся результатов
-            if len(current_results) + len(page_results) >= max_results_target:
-                 logger.debug(f"Reached max_results_target ({max_results_target}) within get_videos_page. Stopping processing.")
-                 break # Прерываем обработку этой страницы
-
-    logger.info(f"Processed {processed_count} valid videos from this API page.")
-    return page_results, next_page_token_from_api, total_results
-
-
-# --- Функция для получения пачки Shorts ---
-async def get_shorts_page(youtube: build, encoded_query, max_results_target, date_published, current_results, page_token=None):
-    """
-    Получает одну страницу результатов поиска shorts и их детали.
-    Фильтрует не-shorts.
-    Пробрасывает HttpError при ошибках API.
-    Возвращает: (list_of_items_on_page, next_page_token, total_results_estimate)
-    """
+async def save_to_history(user: User, kind: str, query: str, date_published_filter: str, max_results: int, items) -> None:
+    """Сохраняет результат в историю поиска; ошибка записи не влияет на ответ поиска."""
     try:
-        logger.info(f"API Call: youtube.search().list (shorts, query='{encoded_query}', page_token={page_token is not None})")
-        search_response_dict = youtube.search().list(
-            q=encoded_query, part='snippet', type='video', videoDuration='short', # videoDuration может быть неточным
-            pageToken=page_token, publishedAfter=date_published, maxResults=50
-        ).execute()
-    except HttpError as e:
-        logger.error(f"HttpError during youtube.search().list (shorts): {e.status_code} - {e.reason}")
-        raise e
+        await asyncio.to_thread(save_search_snapshot, user.id, kind, query, date_published_filter, max_results, items)
     except Exception as e:
-        logger.exception(f"Unexpected error during youtube.search().list (shorts): {e}")
-        raise HTTPException(status_code=500, detail=f"YouTube API search unexpected error: {e}")
-
-    total_results = search_response_dict.get('pageInfo', {}).get('totalResults', 0)
-    next_page_token_from_api = search_response_dict.get('nextPageToken')
-    search_items = search_response_dict.get('items', [])
-    logger.debug(f"Search page results (shorts): {len(search_items)} items found. Next page: {'Yes' if next_page_token_from_api else 'No'}")
-
-    if not search_items:
-        return [], None, total_results
+        logger.error(f"Failed to save search history for user {user.email}: {e}", exc_info=True)
 
-    video_ids = [item["id"]["videoId"] for item in search_items if item.get("id", {}).get("videoId")]
-    if not video_ids:
-        return [], next_page_token_from_api, total_results
 
-    logger.info(f"API Call: youtube.videos().list for {len(video_ids)} IDs (shorts)")
-    try:
-        video_response = youtube.videos().list(
-            part="snippet,contentDetails,statistics", id=','.join(video_ids), maxResults=len(video_ids)
-        ).execute()
-        video_items = video_response.get('items', [])
-    except HttpError as e:
-        logger.error(f"HttpError during youtube.videos().list (shorts): {e.status_code} - {e.reason}")
-        raise e
-    except Exception as e:
-        logger.exception(f"Unexpected error during youtube.videos().list (shorts): {e}")
-        raise HTTPException(status_code=500, detail=f"YouTube API videos.list unexpected error: {e}")
+def get_history_entry(db: Session, user: User, history_id: int) -> SearchHistory:
+    entry = db.exec(
+        select(SearchHistory)
+        .where(SearchHistory.user_id == user.id)
+        .where(SearchHistory.id == history_id)
+    ).first()
+    if not entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Search history entry not found")
+    return entry
 
-    video_details_map = {v['id']: v for v in video_items}
-    page_results = []
-    processed_count = 0
 
-    for search_item in search_items:
-        video_id = search_item.get("id", {}).get("videoId")
-        channel_id = search_item.get("snippet", {}).get("channelId")
-        video_detail = video_details_map.get(video_id)
+def replay_history_entry(entry: SearchHistory) -> SearchHistoryReplay:
+    items = unpack_snapshot(entry)
+    return SearchHistoryReplay(
+        item_count=len(items), type=entry.kind, items=items,
+        query=entry.query, date_published=entry.date_published_filter, searched_at=entry.added_at,
+    )
 
-        if not video_id or not channel_id or not video_detail: continue
 
-        # Используем is_shorts_v для строгой проверки
-        if not is_shorts_v(video_detail):
-            logger.debug(f"Skipping video {video_id} in /shorts search as it fails duration/tags check.")
-            continue
-
-        try:
-            built_item = await build_search_item_obj(youtube, search_item, video_detail, channel_id, 'shorts')
-        except HttpError as e:
-            logger.error(f"HttpError from build_search_item_obj for short {video_id}: {e.status_code}")
-            raise e # Пробрасываем
-
-        if built_item:
-            page_results.append(built_item)
-            processed_count += 1
-            if len(current_results) + len(page_results) >= max_results_target:
-                 logger.debug(f"Reached max_results_target ({max_results_target}) within get_shorts_page. Stopping processing.")
-                 break
-
-    logger.info(f"Processed {processed_count} valid shorts from this API page.")
-    return page_results, next_page_token_from_api, total_results
+def get_saved_search(db: Session, user: User, saved_search_id: int) -> SavedSearch:
+    entry = db.exec(
+        select(SavedSearch)
+        .where(SavedSearch.user_id == user.id)
+        .where(SavedSearch.id == saved_search_id)
+    ).first()
+    if not entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Saved search not found")
+    return entry
 
 
 # --- Эндпоинт поиска Видео ---
@@ -298,107 +108,31 @@ async def search_videos(
     query: str = Query(..., description="Поисковый запрос (название видео)"),
     max_results: int = Query(50, description="Количество видео в ответе", ge=1, le=100), # Увеличил макс до 100
     date_published_filter: str = Query('all_time', alias="date_published", description="Дата публикации (all_time, last_week, last_month, last_3_month, last_6_month, last_year)"),
+    baseline: Optional[str] = Query(None, description="База combined_metric: lifetime, median, trimmed_mean (по умолчанию - из настроек)"),
     current_user: User = Depends(get_current_user),
-    _rate_limit: bool = Depends(rate_limit_search) # Применяем rate limiter
+    _rate_limit: bool = Depends(rate_limit_search), # Применяем rate limiter
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """
     Поиск видео YouTube с фильтрацией. Требует аутентификации.
     Применяется ограничение частоты запросов.
-    Использует пул API-ключей приложения с ротацией при ошибках квоты.
+    Использует пул API-ключей приложения с ротацией при ошибках квоты;
+    результаты популярных запросов отдаются из общего кэша (прогревается в фоне).
     """
     logger.info(f"User '{current_user.email}' /videos search: query='{query}', max={max_results}, date='{date_published_filter}'")
-    if date_published_filter not in ('all_time', 'last_week', 'last_month', 'last_3_month', 'last_6_month', 'last_year'):
+    if date_published_filter not in DATE_PUBLISHED_FILTERS:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for date_published')
-
-    encoded_query = quote(query, safe="")
-    rfc3339_date = get_rfc3339_date(date_published_filter) if date_published_filter != 'all_time' else None
-    all_results = []
-    next_page_token = None
-    # Ограничение страниц API для одного запроса
-    max_pages_to_fetch = 1 # Можно вынести в конфиг
-    attempts = 0
-    max_attempts = (len(api_key_manager.keys) if api_key_manager.keys else 0) + 1
-
-    while attempts < max_attempts:
-        youtube = api_key_manager.get_client()
-        if youtube is None:
-            logger.error(f"Failed to get YouTube client (attempt {attempts + 1}). Keys exhausted or not configured.")
-            if attempts == 0 and not api_key_manager.keys:
-                 raise HTTPException(status_code=500, detail="YouTube API keys are not configured.")
-            raise HTTPException(status_code=503, detail="Service temporarily unavailable due to API quota limits.")
-
-        current_key_index = api_key_manager._last_used_index
-        logger.info(f"Attempt {attempts + 1}/{max_attempts} using API key index {current_key_index}")
-
-        try:
-            # Начинаем сбор результатов для ЭТОЙ попытки
-            attempt_results = []
-            next_page_token = None # Сбрасываем пагинацию для новой попытки
-
-            for page_num in range(max_pages_to_fetch):
-                logger.debug(f"Fetching videos page {page_num + 1} (attempt {attempts + 1})")
-
-                page_items, page_next_token, _ = await get_videos_page(
-                    youtube=youtube,
-                    encoded_query=encoded_query,
-                    max_results_target=max_results,
-                    date_published=rfc3339_date,
-                    current_results=attempt_results, # Передаем текущие результаты этой попытки
-                    page_token=next_page_token
-                )
-
-                attempt_results.extend(page_items)
-                next_page_token = page_next_token # Токен для следующей страницы этой попытки
-
-                logger.debug(f"Page {page_num + 1} completed. Results this attempt: {len(attempt_results)}. Next page: {'Yes' if next_page_token else 'No'}")
-
-                if len(attempt_results) >= max_results or not next_page_token:
-                    logger.info(f"Stopping pagination for attempt {attempts + 1}: reached max results ({len(attempt_results)}) or no more pages.")
-                    break # Выходим из цикла пагинации (for page_num...)
-            # --- КОНЕЦ ЦИКЛА ПАГИНАЦИИ ---
-
-            logger.info(f"Successfully completed API calls with key index {current_key_index} (attempt {attempts + 1}). Found {len(attempt_results)} items.")
-            all_results = attempt_results # Сохраняем результаты успешной попытки
-            break # Выходим из цикла попыток (while attempts...)
-
-        except HttpError as e:
-            logger.warning(f"HttpError with key index {current_key_index} (attempt {attempts + 1}): {e.status_code} - {e.reason}")
-            is_quota_error = False
-            if e.status_code == 403:
-                try:
-                    error_details = json.loads(e.content.decode('utf-8'))
-                    is_quota_error = any(err.get('reason') == 'quotaExceeded' for err in error_details.get('error', {}).get('errors', []))
-                except: pass # Ignore parsing errors
-
-            if is_quota_error:
-                logger.warning(f"Quota exceeded for API key index {current_key_index}.")
-                api_key_manager.mark_last_used_key_exhausted()
-                attempts += 1
-                logger.info(f"Switching key. Starting attempt {attempts + 1}.")
-                continue # К следующей попытке
-            elif e.status_code in [400, 404]:
-                 logger.error(f"Client/Not Found Error (key {current_key_index}): {e.status_code} - {e.reason}. Content: {e.content.decode('utf-8')}")
-                 raise HTTPException(status_code=e.status_code, detail=f"YouTube API request error: {e.reason}")
-            elif e.status_code in [401, 403]:
-                 logger.error(f"Auth/Permission Error (key {current_key_index}, not quota): {e.status_code}. Content: {e.content.decode('utf-8')}")
-                 raise HTTPException(status_code=500, detail="YouTube API authorization error with backend key.")
-            else:
-                logger.error(f"Unhandled HttpError (key {current_key_index}): {e.status_code}. Content: {e.content.decode('utf-8')}")
-                raise HTTPException(status_code=502, detail=f"YouTube API upstream error: {e.reason}")
-        except Exception as e:
-             logger.exception(f"Unexpected error during video search (attempt {attempts + 1})")
-             raise HTTPException(status_code=500, detail=f"Internal server error during video search: {str(e)}")
-    # --- КОНЕЦ ЦИКЛА ПОПЫТОК ---
-
-    if attempts >= max_attempts:
-         logger.error(f"Failed to complete video search after {attempts} attempts. All keys exhausted?")
-         if not all_results: # Если совсем ничего не нашли
-             raise HTTPException(status_code=503, detail="Service temporarily unavailable due to API quota limits.")
-         else: # Если нашли что-то, но не смогли завершить (редко)
-              logger.warning(f"Returning potentially incomplete video results ({len(all_results)})")
-
-    final_results = all_results[:max_results] # Обрезаем, если нашли больше нужного
-    logger.info(f"Returning {len(final_results)} video results to user {current_user.email}.")
+    baseline = baseline or settings.channel_baseline_default_method
+    if baseline not in BASELINE_METHODS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for baseline')
+
+    await record_search_popularity(redis_client, 'videos', query, date_published_filter)
+    final_results, from_cache = await run_search('videos', query, max_results, date_published_filter, redis_client)
+    fresh_ids = None if from_cache else {item['video_id'] for item in final_results}
+    await apply_view_velocity(redis_client, final_results, fresh_ids)
+    await apply_channel_baseline(redis_client, final_results, baseline)
+    await save_to_history(current_user, 'videos', query, date_published_filter, max_results, final_results)
+    logger.info(f"Returning {len(final_results)} video results to user {current_user.email} (from cache: {from_cache}).")
     return SearchResponse(item_count=len(final_results), type='videos', items=final_results)
 
 
@@ -408,109 +142,247 @@ async def search_shorts(
     query: str = Query(..., description="Поисковый запрос (название шортсов)"),
     max_results: int = Query(50, description="Количество видео в ответе", ge=1, le=100),
     date_published_filter: str = Query('all_time', alias="date_published", description="Дата публикации (all_time, last_week, last_month, last_3_month, last_6_month, last_year)"),
+    baseline: Optional[str] = Query(None, description="База combined_metric: lifetime, median, trimmed_mean (по умолчанию - из настроек)"),
     current_user: User = Depends(get_current_user),
-    _rate_limit: bool = Depends(rate_limit_search) # Применяем rate limiter
+    _rate_limit: bool = Depends(rate_limit_search), # Применяем rate limiter
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """
     Поиск shorts YouTube с фильтрацией. Требует аутентификации.
     Применяется ограничение частоты запросов.
-    Использует пул API-ключей приложения с ротацией.
+    Использует пул API-ключей приложения с ротацией; популярные запросы отдаются из общего кэша.
     """
     logger.info(f"User '{current_user.email}' /shorts search: query='{query}', max={max_results}, date='{date_published_filter}'")
-    if date_published_filter not in ('all_time', 'last_week', 'last_month', 'last_3_month', 'last_6_month', 'last_year'):
+    if date_published_filter not in DATE_PUBLISHED_FILTERS:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for date_published')
-
-    encoded_query = quote(query, safe="")
-    rfc3339_date = get_rfc3339_date(date_published_filter) if date_published_filter != 'all_time' else None
-    all_results = []
-    next_page_token = None
-    max_pages_to_fetch = 1
-    attempts = 0
-    max_attempts = (len(api_key_manager.keys) if api_key_manager.keys else 0) + 1
-
-    while attempts < max_attempts:
-        youtube = api_key_manager.get_client()
-        if youtube is None:
-            logger.error(f"Failed to get YouTube client for shorts (attempt {attempts + 1}).")
-            if attempts == 0 and not api_key_manager.keys:
-                 raise HTTPException(status_code=500, detail="YouTube API keys are not configured.")
-            raise HTTPException(status_code=503, detail="Service temporarily unavailable due to API quota limits.")
-
-        current_key_index = api_key_manager._last_used_index
-        logger.info(f"Attempt {attempts + 1}/{max_attempts} for shorts using API key index {current_key_index}")
-
-        try:
-            attempt_results = []
-            next_page_token = None # Сброс пагинации для новой попытки
-
-            for page_num in range(max_pages_to_fetch):
-                logger.debug(f"Fetching shorts page {page_num + 1} (attempt {attempts + 1})")
-
-                page_items, page_next_token, _ = await get_shorts_page(
-                    youtube=youtube,
-                    encoded_query=encoded_query,
-                    max_results_target=max_results,
-                    date_published=rfc3339_date,
-                    current_results=attempt_results,
-                    page_token=next_page_token
-                )
-
-                attempt_results.extend(page_items)
-                next_page_token = page_next_token
-
-                logger.debug(f"Shorts page {page_num + 1} completed. Results this attempt: {len(attempt_results)}. Next page: {'Yes' if next_page_token else 'No'}")
-
-                if len(attempt_results) >= max_results or not next_page_token:
-                    logger.info(f"Stopping shorts pagination for attempt {attempts + 1}: reached max results ({len(attempt_results)}) or no more pages.")
-                    break
-            # --- КОНЕЦ ЦИКЛА ПАГИНАЦИИ ---
-
-            logger.info(f"Successfully completed shorts API calls with key index {current_key_index} (attempt {attempts + 1}). Found {len(attempt_results)} items.")
-            all_results = attempt_results
-            break # Выходим из цикла попыток
-
-        except HttpError as e:
-            # Обработка ошибок HttpError (аналогично /videos)
-            logger.warning(f"HttpError with key index {current_key_index} (shorts attempt {attempts + 1}): {e.status_code} - {e.reason}")
-            is_quota_error = False
-            if e.status_code == 403:
-                try:
-                    error_details = json.loads(e.content.decode('utf-8'))
-                    is_quota_error = any(err.get('reason') == 'quotaExceeded' for err in error_details.get('error', {}).get('errors', []))
-                except: pass
-
-            if is_quota_error:
-                logger.warning(f"Quota exceeded for API key index {current_key_index} (shorts).")
-                api_key_manager.mark_last_used_key_exhausted()
-                attempts += 1
-                logger.info(f"Switching key. Starting attempt {attempts + 1}.")
-                continue
-            elif e.status_code in [400, 404]:
-                 logger.error(f"Client/Not Found Error (key {current_key_index}, shorts): {e.status_code} - {e.reason}. Content: {e.content.decode('utf-8')}")
-                 raise HTTPException(status_code=e.status_code, detail=f"YouTube API request error: {e.reason}")
-            elif e.status_code in [401, 403]:
-                 logger.error(f"Auth/Permission Error (key {current_key_index}, not quota, shorts): {e.status_code}. Content: {e.content.decode('utf-8')}")
-                 raise HTTPException(status_code=500, detail="YouTube API authorization error with backend key.")
-            else:
-                logger.error(f"Unhandled HttpError (key {current_key_index}, shorts): {e.status_code}. Content: {e.content.decode('utf-8')}")
-                raise HTTPException(status_code=502, detail=f"YouTube API upstream error: {e.reason}")
-        except Exception as e:
-             logger.exception(f"Unexpected error during shorts search (attempt {attempts + 1})")
-             raise HTTPException(status_code=500, detail=f"Internal server error during shorts search: {str(e)}")
-    # --- КОНЕЦ ЦИКЛА ПОПЫТОК ---
-
-    if attempts >= max_attempts:
-         logger.error(f"Failed to complete shorts search after {attempts} attempts.")
-         if not all_results:
-             raise HTTPException(status_code=503, detail="Service temporarily unavailable due to API quota limits.")
-         else:
-             logger.warning(f"Returning potentially incomplete shorts results ({len(all_results)})")
-
-    final_results = all_results[:max_results]
-    logger.info(f"Returning {len(final_results)} shorts results to user {current_user.email}.")
+    baseline = baseline or settings.channel_baseline_default_method
+    if baseline not in BASELINE_METHODS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for baseline')
+
+    await record_search_popularity(redis_client, 'shorts', query, date_published_filter)
+    final_results, from_cache = await run_search('shorts', query, max_results, date_published_filter, redis_client)
+    fresh_ids = None if from_cache else {item['video_id'] for item in final_results}
+    await apply_view_velocity(redis_client, final_results, fresh_ids)
+    await apply_channel_baseline(redis_client, final_results, baseline)
+    await save_to_history(current_user, 'shorts', query, date_published_filter, max_results, final_results)
+    logger.info(f"Returning {len(final_results)} shorts results to user {current_user.email} (from cache: {from_cache}).")
     return SearchResponse(item_count=len(final_results), type='shorts', items=final_results)
 
 
+# --- Поиск по локальному индексу (без квоты) ---
+@router.get("/local", response_model=SearchResponse)
+async def search_local(
+    query: str = Query(..., description="Поисковый запрос (название, описание, канал)"),
+    max_results: int = Query(50, description="Количество видео в ответе", ge=1, le=200),
+    kind: str = Query('videos', description="videos или shorts"),
+    date_published_filter: str = Query('all_time', alias="date_published", description="Дата публикации (all_time, last_week, last_month, last_3_month, last_6_month, last_year)"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Поиск по локальному индексу видео, которые сервис уже получал из YouTube API.
+    Не расходует квоту и лимит поисков; статистика видео - на момент индексации.
+    """
+    if kind not in SEARCH_KINDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for kind')
+    if date_published_filter not in DATE_PUBLISHED_FILTERS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for date_published')
+    if not settings.local_index_enabled:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Local search index is disabled')
+
+    items = await local_index.search(query, kind, max_results, get_rfc3339_date(date_published_filter))
+    logger.info(f"User '{current_user.email}' /local search: {len(items)} results.")
+    return SearchResponse(item_count=len(items), type=kind, items=items)
+
+
+# --- История поиска: повтор результата без обращения к YouTube API ---
+@router.get("/history", response_model=SearchHistoryList)
+async def get_search_history(
+    limit: int = Query(50, ge=1, le=200, description="Количество записей на странице"),
+    cursor: Optional[str] = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    kind: Optional[str] = Query(None, description="Только videos или shorts"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """История поисков пользователя (новые сначала). Повтор поиска обновляет его запись и поднимает ее наверх."""
+    query = select(SearchHistory).where(SearchHistory.user_id == current_user.id)
+    if kind is not None:
+        if kind not in SEARCH_KINDS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for kind')
+        query = query.where(SearchHistory.kind == kind)
+    entries, next_cursor = paginate_by_added_at(db, query, SearchHistory, limit, cursor)
+    return SearchHistoryList(entries=[SearchHistoryEntry.model_validate(entry) for entry in entries], next_cursor=next_cursor)
+
+
+@router.get("/history/{history_id}", response_model=SearchHistoryReplay)
+async def replay_search(
+    history_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Сохраненный результат поиска. Не расходует квоту и лимит поисков."""
+    entry = get_history_entry(db, current_user, history_id)
+    return await asyncio.to_thread(replay_history_entry, entry)
+
+
+@router.delete("/history/{history_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_search_history_entry(
+    history_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Удаляет запись истории (ссылка на нее перестает работать)."""
+    entry = get_history_entry(db, current_user, history_id)
+    db.delete(entry)
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/history/{history_id}/share", response_model=SearchHistoryEntry)
+async def share_search_history_entry(
+    history_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Открывает запись по ссылке только для чтения: /search/shared/{share_token}. Повторный вызов возвращает тот же токен."""
+    entry = get_history_entry(db, current_user, history_id)
+    if entry.share_token is None:
+        entry.share_token = new_share_token()
+        db.add(entry)
+        db.commit()
+        db.refresh(entry)
+    return SearchHistoryEntry.model_validate(entry)
+
+
+@router.delete("/history/{history_id}/share", response_model=SearchHistoryEntry)
+async def unshare_search_history_entry(
+    history_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Закрывает доступ по ссылке."""
+    entry = get_history_entry(db, current_user, history_id)
+    if entry.share_token is not None:
+        entry.share_token = None
+        db.add(entry)
+        db.commit()
+        db.refresh(entry)
+    return SearchHistoryEntry.model_validate(entry)
+
+
+@router.get("/shared/{share_token}", response_model=SearchHistoryReplay)
+async def get_shared_search(share_token: str, db: Session = Depends(get_db)):
+    """Результат поиска, открытый владельцем по ссылке. Аутентификация не требуется."""
+    entry = db.exec(select(SearchHistory).where(SearchHistory.share_token == share_token)).first()
+    if not entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Shared search not found")
+    return await asyncio.to_thread(replay_history_entry, entry)
+
+
+# --- Сохраненные поиски: мониторинг с инкрементальным обновлением ---
+@router.post("/saved", response_model=SavedSearchEntry, status_code=status.HTTP_201_CREATED)
+async def create_saved_search(
+    saved_search: SavedSearchCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Сохраняет поиск для регулярного обновления (POST /search/saved/{id}/refresh). Поиск при создании не выполняется."""
+    if saved_search.kind not in SEARCH_KINDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for kind')
+    if saved_search.date_published not in DATE_PUBLISHED_FILTERS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid value for date_published')
+
+    params_hash = search_params_hash(saved_search.kind, saved_search.query, saved_search.date_published)
+    existing = db.exec(
+        select(SavedSearch.id)
+        .where(SavedSearch.user_id == current_user.id)
+        .where(SavedSearch.params_hash == params_hash)
+    ).first()
+    if existing is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Search is already saved (id {existing})")
+    count = db.exec(select(func.count()).select_from(SavedSearch).where(SavedSearch.user_id == current_user.id)).one()
+    if count >= settings.saved_search_max_per_user:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Saved searches limit reached ({settings.saved_search_max_per_user})")
+
+    entry = SavedSearch(
+        user_id=current_user.id, kind=saved_search.kind, query=saved_search.query,
+        date_published_filter=saved_search.date_published, max_results=saved_search.max_results,
+        params_hash=params_hash, item_count=0, snapshot=pack_snapshot([]), snapshot_encoding=SNAPSHOT_ENCODING,
+    )
+    db.add(entry)
+    db.commit()
+    db.refresh(entry)
+    return SavedSearchEntry.model_validate(entry)
+
+
+@router.get("/saved", response_model=SavedSearchList)
+async def list_saved_searches(
+    limit: int = Query(50, ge=1, le=200, description="Количество записей на странице"),
+    cursor: Optional[str] = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Сохраненные поиски пользователя (новые сначала)."""
+    query = select(SavedSearch).where(SavedSearch.user_id == current_user.id)
+    entries, next_cursor = paginate_by_added_at(db, query, SavedSearch, limit, cursor)
+    return SavedSearchList(entries=[SavedSearchEntry.model_validate(entry) for entry in entries], next_cursor=next_cursor)
+
+
+@router.get("/saved/{saved_search_id}", response_model=SavedSearchRead)
+async def get_saved_search_items(
+    saved_search_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Отслеживаемые видео на момент последнего обновления. Не расходует квоту."""
+    entry = get_saved_search(db, current_user, saved_search_id)
+    items = await asyncio.to_thread(unpack_snapshot, entry)
+    return SavedSearchRead.model_validate({**entry.model_dump(), 'items': items})
+
+
+@router.post("/saved/{saved_search_id}/refresh", response_model=SavedSearchRefresh)
+async def refresh_saved_search_endpoint(
+    saved_search_id: int,
+    current_user: User = Depends(get_current_user),
+    _rate_limit: bool = Depends(rate_limit_search),
+    db: Session = Depends(get_db),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
+):
+    """
+    Обновляет сохраненный поиск и возвращает разницу с прошлым запуском: new, rising и removed.
+    Первый запуск - обычный поиск. Следующие ищут только видео, опубликованные после прошлого запуска,
+    а статистику уже известных видео обновляют через videos.list (1 unit за 50 видео).
+    """
+    entry = get_saved_search(db, current_user, saved_search_id)
+    try:
+        diff = await refresh_saved_search(entry, redis_client)
+    except ApiKeysExhaustedError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service temporarily unavailable due to API quota limits.")
+    except HttpError as e:
+        logger.error(f"HttpError refreshing saved search {saved_search_id}: {e.status_code} - {e.reason}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"YouTube API upstream error: {e.reason}")
+    db.add(entry)
+    db.commit()
+    db.refresh(entry)
+    logger.info(f"User '{current_user.email}' refreshed saved search {saved_search_id}.")
+    return SavedSearchRefresh(
+        search=SavedSearchEntry.model_validate(entry), incremental=diff['incremental'],
+        new=diff['new'], new_complete=diff['new_complete'], rising=diff['rising'], removed=diff['removed'],
+    )
+
+
+@router.delete("/saved/{saved_search_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_saved_search(
+    saved_search_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Удаляет сохраненный поиск."""
+    entry = get_saved_search(db, current_user, saved_search_id)
+    db.delete(entry)
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
 # --- Эндпоинт статуса лимита ---
 class SearchLimitStatusResponse(BaseModel):
     limit: int
@@ -2,14 +2,25 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, Body, Query # Import Query
 from typing import List, Dict, Optional
+from datetime import datetime, timezone
 from googleapiclient.discovery import build
+import redis.asyncio as redis
+from pydantic import BaseModel, Field
 import logging
 import traceback
 
 from app.api.auth import get_user_youtube_client_via_cookie
-from app.models.search_models import Item, SearchResponse
-from app.core.youtube import get_channel_info, parse_duration, get_total_videos_on_channel
+from app.models.search_models import Item, SearchResponse, VideosByIdsResponse
+from app.core.youtube import get_channel_info, get_total_videos_on_channel
 from app.core.config import settings
+from app.core.jobs import JobContext, job_handler
+from app.core.youtube_client_manager import ApiKeysExhaustedError, api_key_manager
+from app.core.redis_client import get_optional_redis_client
+from app.services.channel_baseline import BASELINE_METHODS, apply_channel_baseline
+from app.services.channels import get_channel_info_cached
+from app.services.uploads import get_latest_uploads
+from app.services.video_metadata import build_item, get_items_for_video_ids, load_videos
+from app.services.video_snapshots import apply_view_velocity
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +28,8 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+MAX_IDS_PER_REQUEST = 50 # videos.list accepts at most 50 IDs per call
+
 # --- Helper Function (build_item_from_video_details - remains the same) ---
 async def build_item_from_video_details(
     youtube: build,
@@ -29,8 +42,6 @@ async def build_item_from_video_details(
     """
     video_id = video_detail.get('id')
     snippet = video_detail.get('snippet', {})
-    statistics = video_detail.get('statistics', {})
-    content_details = video_detail.get('contentDetails', {})
     channel_id = snippet.get('channelId')
 
     if not video_id or not channel_id:
@@ -51,55 +62,7 @@ async def build_item_from_video_details(
             logger.warning(f"Could not get channel info for {channel_id} (video_id: {video_id}). Skipping item.")
             return None
 
-        # --- Video Stats ---
-        likes = int(statistics['likeCount']) if 'likeCount' in statistics else 0
-        likes_hidden = 'likeCount' not in statistics
-        views = int(statistics.get('viewCount', 0))
-        comments = int(statistics['commentCount']) if 'commentCount' in statistics else 0
-        comments_hidden = 'commentCount' not in statistics
-        duration_str = content_details.get('duration')
-        duration_seconds = parse_duration(duration_str) if duration_str else 0
-
-        # --- Channel Stats from Fetched Info ---
-        channel_views = channel_info_dict.get('viewCount', 0)
-        # Use videoCount from channel_info_dict directly
-        channel_video_count = channel_info_dict.get('videoCount', 0)
-
-        # --- Combined Metric ---
-        avg_views_per_video = float(channel_views) / float(channel_video_count) if channel_video_count > 0 else 0
-        # Fallback if avg is zero (e.g., new channel) but video has views
-        if avg_views_per_video <= 0 and views > 0:
-             avg_views_per_video = float(views) # Use current video views as a rough estimate
-
-        combined_metric = float(views) / avg_views_per_video if avg_views_per_video > 0 else None
-
-        # --- Determine URL (basic video vs shorts - simple duration check) ---
-        item_type = 'shorts' if duration_seconds <= 60 else 'video' # Simple check
-        if item_type == 'video':
-            video_url = f'https://www.youtube.com/watch?v={video_id}'
-        else: # shorts
-            video_url = f'https://www.youtube.com/shorts/{video_id}'
-
-        # --- Create Item ---
-        item_obj = Item.model_validate({
-            'video_id': video_id,
-            'title': snippet.get('title', 'No Title'),
-            'thumbnail': snippet.get('thumbnails', {}).get('high', {}).get('url', ''),
-            'published_at': snippet.get('publishedAt'), # Pydantic handles parsing
-            'views': views,
-            'channel_title': channel_info_dict.get('channel_title', 'Unknown Channel'),
-            'channel_url': channel_info_dict.get('channel_url', f'https://www.youtube.com/channel/{channel_id}'),
-            'channel_subscribers': channel_info_dict.get('channel_subscribers', 0),
-            'video_count': channel_video_count, # Total videos on channel
-            'likes': likes,
-            'likes_hidden': likes_hidden,
-            'comments': comments,
-            'comments_hidden': comments_hidden,
-            'combined_metric': combined_metric,
-            'duration': duration_seconds,
-            'video_url': video_url,
-            'channel_thumbnail': channel_info_dict.get('channel_thumbnail', ''),
-        })
+        item_obj = build_item(video_detail, channel_info_dict)
         logger.debug(f"Successfully built item for video_id: {video_id}")
         return item_obj
 
@@ -111,55 +74,34 @@ async def build_item_from_video_details(
         return None
 
 
-# --- Endpoint 1: Get Info by Video IDs (remains the same) ---
-@router.post("/videos_by_ids", response_model=SearchResponse)
+# --- Endpoint 1: Get Info by Video IDs ---
+@router.post("/videos_by_ids", response_model=VideosByIdsResponse)
 async def get_videos_by_ids(
-    video_ids: List[str] = Body(..., embed=True, description="A list of YouTube video IDs (max 50)."),
-    youtube: build = Depends(get_user_youtube_client_via_cookie)
+    video_ids: List[str] = Body(..., embed=True, description="A list of YouTube video IDs (any length, up to settings.videos_by_ids_max_ids)."),
+    baseline: Optional[str] = Query(None, description="Baseline for combined_metric: lifetime, median or trimmed_mean (defaults to settings)."),
+    youtube: build = Depends(get_user_youtube_client_via_cookie),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """
-    Retrieves detailed information for a list of specified video IDs.
+    Retrieves detailed information for a list of specified video IDs, in the order given.
+    Video metadata and channel info come from the shared cache; misses are fetched in concurrent
+    50-ID batches. `cached_ids` lists the videos served without a videos.list call.
     Response structure matches the `/search/videos` endpoint.
     Requires authentication.
     """
     if not video_ids:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Video ID list cannot be empty.")
-    if len(video_ids) > 50:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Maximum of 50 video IDs allowed per request.")
-
-    logger.info(f"Request received for video IDs: {video_ids}")
-    unique_video_ids = list(set(video_ids)) # Ensure unique IDs
-    ids_string = ','.join(unique_video_ids)
+    if len(video_ids) > settings.videos_by_ids_max_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Maximum of {settings.videos_by_ids_max_ids} video IDs allowed per request.")
+    baseline = baseline or settings.channel_baseline_default_method
+    if baseline not in BASELINE_METHODS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid value for baseline.")
 
-    results: List[Item] = []
-    channel_info_cache: Dict[str, Optional[Dict]] = {} # Cache channel info during this request
+    unique_video_ids = list(dict.fromkeys(video_ids)) # Ensure unique IDs, keep order
+    logger.info(f"Request received for {len(unique_video_ids)} video IDs.")
 
     try:
-        # --- Fetch Video Details ---
-        logger.info(f"Calling YouTube API: videos().list for IDs: {ids_string}")
-        video_response = youtube.videos().list(
-            part="snippet,contentDetails,statistics",
-            id=ids_string,
-            maxResults=len(unique_video_ids)
-        ).execute()
-
-        video_items = video_response.get('items', [])
-        logger.info(f"Received details for {len(video_items)} videos from API.")
-
-        if not video_items:
-             # Return empty list if none of the IDs were valid or found
-             return SearchResponse(item_count=0, type='videos', items=[])
-
-        # --- Process Each Video ---
-        for video_detail in video_items:
-             item = await build_item_from_video_details(youtube, video_detail, channel_info_cache)
-             if item:
-                 results.append(item)
-
-        logger.info(f"Successfully processed {len(results)} videos.")
-
-        return SearchResponse(item_count=len(results), type='videos', items=results)
-
+        results, cached_ids = await get_items_for_video_ids(youtube, unique_video_ids, redis_client)
     except HTTPException as he:
         # Re-raise HTTP exceptions from dependencies or helpers
         raise he
@@ -172,81 +114,86 @@ async def get_videos_by_ids(
         else:
              raise HTTPException(status_code=500, detail=f"Internal server error fetching video details: {e}")
 
+    await apply_channel_baseline(redis_client, results, baseline)
+    found_ids = {item.video_id for item in results}
+    logger.info(f"Successfully processed {len(results)} videos ({len(cached_ids)} from cache).")
+    return VideosByIdsResponse(
+        item_count=len(results),
+        type='videos',
+        items=results,
+        cached_ids=[vid for vid in unique_video_ids if vid in cached_ids and vid in found_ids],
+        missing_ids=[vid for vid in unique_video_ids if vid not in found_ids],
+    )
+
 
 # --- Endpoint 2: Get Latest Videos by Channel ID (Query Parameter) ---
-# --- CHANGE: Path changed, channel_id moved to Query parameter ---
 @router.get("/channel_latest_videos", response_model=SearchResponse)
 async def get_channel_latest_videos(
-    # --- CHANGE: channel_id is now a query parameter ---
     channel_id: str = Query(..., description="The YouTube channel ID."),
+    count: int = Query(6, ge=1, le=200, description="Number of most recent videos to return."),
+    published_after: Optional[datetime] = Query(None, description="Only return videos published after this moment (ISO 8601, UTC if no offset)."),
+    baseline: Optional[str] = Query(None, description="Baseline for combined_metric: lifetime, median or trimmed_mean (defaults to settings)."),
     youtube: build = Depends(get_user_youtube_client_via_cookie),
+    redis_client: Optional[redis.Redis] = Depends(get_optional_redis_client),
 ):
     """
-    Retrieves the 6 most recent videos from the specified channel ID (provided as a query parameter).
+    Retrieves the most recent videos from the specified channel ID (provided as a query parameter).
+    Videos are read from the channel's uploads playlist (playlistItems.list, 1 unit per page) instead
+    of search.list (100 units); uploads and channel info are cached, so a repeated call costs at most
+    one videos.list unit.
     Response structure matches the `/search/videos` endpoint.
     Requires authentication.
     """
-    # --- CHANGE: Logging reflects query parameter usage ---
-    logger.info(f"Request received for latest 6 videos from channel ID (query param): {channel_id}")
+    logger.info(f"Request received for latest {count} videos from channel ID (query param): {channel_id}, published_after={published_after}")
+    baseline = baseline or settings.channel_baseline_default_method
+    if baseline not in BASELINE_METHODS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid value for baseline.")
+
+    published_after_str = None
+    if published_after is not None:
+        if published_after.tzinfo is None:
+            published_after = published_after.replace(tzinfo=timezone.utc)
+        published_after_str = published_after.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
     results: List[Item] = []
     channel_info_cache: Dict[str, Optional[Dict]] = {} # Cache for this request
 
     try:
-        # --- Step 1: Search for the latest 6 videos ---
-        logger.info(f"Calling YouTube API: search().list for channel {channel_id}")
-        search_response = youtube.search().list(
-            part='snippet',
-            channelId=channel_id,
-            order='date', # Order by date (most recent first)
-            type='video', # Ensure we get videos
-            maxResults=6
-        ).execute()
-
-        search_items = search_response.get('items', [])
-        logger.info(f"Found {len(search_items)} potential latest videos via search.")
-
-        if not search_items:
+        # --- Step 1: Read the latest uploads (cached, paged lazily) ---
+        uploads = await get_latest_uploads(youtube, channel_id, redis_client, count, published_after_str)
+        logger.info(f"Found {len(uploads)} latest uploads for channel {channel_id}.")
+
+        if not uploads:
             logger.info(f"No videos found for channel {channel_id}.")
             return SearchResponse(item_count=0, type='videos', items=[])
 
-        video_ids = [item['id']['videoId'] for item in search_items if item.get('id', {}).get('videoId')]
-
-        if not video_ids:
-             logger.warning(f"Search results found, but no video IDs extracted for channel {channel_id}.")
-             return SearchResponse(item_count=0, type='videos', items=[])
-
-        ids_string = ','.join(video_ids)
-
-        # --- Step 2: Get details for these specific videos ---
-        logger.info(f"Calling YouTube API: videos().list for latest video IDs: {ids_string}")
-        video_response = youtube.videos().list(
-            part="snippet,contentDetails,statistics",
-            id=ids_string,
-            maxResults=len(video_ids)
-        ).execute()
-
-        video_items = video_response.get('items', [])
-        logger.info(f"Received details for {len(video_items)} latest videos from API.")
+        # --- Step 2: Get details for these specific videos (1 unit per 50 IDs) ---
+        video_ids = [upload['video_id'] for upload in uploads]
+        video_details_map = await load_videos(youtube, video_ids)
 
-        if not video_items:
-             logger.warning(f"Could not get details for the found video IDs: {ids_string}")
+        if not video_details_map:
+             logger.warning(f"Could not get details for the found video IDs of channel {channel_id}")
              return SearchResponse(item_count=0, type='videos', items=[])
 
-        # --- Step 3: Process Each Video (using a pre-fetched channel info) ---
-        # Fetch channel info ONCE using the input channel_id
-        channel_info_dict = await get_channel_info(youtube, channel_id)
+        # --- Step 3: Process Each Video (using cached channel info) ---
+        channel_info_dict = await get_channel_info_cached(youtube, channel_id, redis_client)
         if not channel_info_dict:
              logger.error(f"Failed to get channel info for the primary channel ID: {channel_id}. Cannot proceed.")
              raise HTTPException(status_code=404, detail=f"Channel info not found for ID: {channel_id}")
 
         channel_info_cache[channel_id] = channel_info_dict # Pre-populate cache
 
-        for video_detail in video_items:
+        for video_id in video_ids: # Keep newest-first order of the uploads playlist
+            video_detail = video_details_map.get(video_id)
+            if not video_detail:
+                continue
             item = await build_item_from_video_details(youtube, video_detail, channel_info_cache)
             if item:
                 results.append(item)
 
+        # Статистика получена из API только что - дописываем ее в ряд снимков и считаем скорость просмотров
+        await apply_view_velocity(redis_client, results, fresh_ids={item.video_id for item in results})
+        await apply_channel_baseline(redis_client, results, baseline)
         logger.info(f"Successfully processed {len(results)} latest videos for channel {channel_id}.")
 
         return SearchResponse(item_count=len(results), type='videos', items=results)
@@ -264,4 +211,43 @@ async def get_channel_latest_videos(
         elif 'HttpError 401' in str(e) or 'HttpError 403' in str(e):
              raise HTTPException(status_code=401, detail="YouTube API authorization error. Please re-login.")
         else:
-             raise HTTPException(status_code=500, detail=f"Internal server error fetching latest channel videos: {e}")
\ No newline at end of file
+             raise HTTPException(status_code=500, detail=f"Internal server error fetching latest channel videos: {e}")
+
+
+# --- Background job: deep channel scan (POST /jobs, type=channel_scan) ---
+class ChannelScanJob(BaseModel):
+    channel_id: str
+    count: int = Field(500, ge=1, le=settings.jobs_channel_scan_max_videos)
+    published_after: Optional[datetime] = None
+
+
+@job_handler('channel_scan', ChannelScanJob, "Latest uploads of a channel with full video details")
+async def run_channel_scan(ctx: JobContext, params: ChannelScanJob) -> Dict:
+    """
+    Same as /videos/channel_latest_videos without the 200-video limit. Uploads are read from the
+    playlist, then details are fetched in 50-ID batches and appended to the job results batch by batch.
+    Uses the application key pool, since a job has no user cookie.
+    """
+    youtube = api_key_manager.get_client()
+    if youtube is None:
+        raise ApiKeysExhaustedError("No YouTube API keys available (not configured or exhausted).")
+    published_after_str = None
+    if params.published_after is not None:
+        published_after = params.published_after
+        if published_after.tzinfo is None:
+            published_after = published_after.replace(tzinfo=timezone.utc)
+        published_after_str = published_after.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    uploads = await get_latest_uploads(youtube, params.channel_id, ctx.redis, params.count, published_after_str)
+    video_ids = [upload['video_id'] for upload in uploads]
+    await ctx.progress(0, len(video_ids), f"{len(video_ids)} uploads found")
+
+    found = 0
+    for start in range(0, len(video_ids), MAX_IDS_PER_REQUEST):
+        chunk = video_ids[start:start + MAX_IDS_PER_REQUEST]
+        items, _ = await get_items_for_video_ids(youtube, chunk, ctx.redis)
+        await apply_channel_baseline(ctx.redis, items, settings.channel_baseline_default_method)
+        found += len(items)
+        await ctx.add_results(item.model_dump(mode='json') for item in items)
+        await ctx.progress(start + len(chunk), len(video_ids))
+    return {'channel_id': params.channel_id, 'uploads': len(video_ids), 'videos': found}
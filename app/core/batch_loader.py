@@ -0,0 +1,122 @@
+# app/core/batch_loader.py
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+from app.core.upstream_scheduler import current_upstream_priority, upstream_priority
+
+logger = logging.getLogger(__name__)
+
+BatchFunction = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+# Все загрузчики процесса по имени (метрики в /readyz)
+batch_loaders: Dict[str, "BatchLoader"] = {}
+
+
+class BatchLoader:
+    """
+    Объединение запросов по ID между корутинами (паттерн DataLoader), на процесс.
+    load()/load_many() из разных запросов в течение window_seconds собираются в одну пачку
+    (не больше max_batch_size ID) и отправляются одним вызовом batch_fn; результат раздается всем ожидающим.
+    ID, который уже ждет отправки или запрошен, повторно не запрашивается.
+    Результаты не кэшируются: после ответа следующий load() снова идет в batch_fn.
+    batch_fn получает список ID и возвращает {ID: значение}; отсутствующие ID - None.
+    Ошибку batch_fn получают все ожидающие ID пачки.
+    """
+
+    def __init__(self, name: str, batch_fn: BatchFunction, max_batch_size: int, window_seconds: float):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_seconds = max(0.0, window_seconds)
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._pending_priority = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Метрики
+        self._counters: Counter = Counter()
+        batch_loaders[name] = self
+
+    def _future_for(self, key: Hashable) -> asyncio.Future:
+        future = self._pending.get(key) or self._inflight.get(key)
+        if future is not None:
+            self._counters['deduplicated'] += 1
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Ошибку пачки забирает ожидающий; если он уже отменен - не пишем "exception was never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending[key] = future
+        # Пачка уходит с приоритетом самого важного из ожидающих
+        priority = current_upstream_priority()
+        if self._pending_priority is None or priority < self._pending_priority:
+            self._pending_priority = priority
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._dispatch)
+        return future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        priority, self._pending_priority = self._pending_priority, None
+        self._inflight.update(batch)
+        task = asyncio.get_running_loop().create_task(self._run(batch, priority))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future], priority) -> None:
+        self._counters['batches'] += 1
+        self._counters['keys'] += len(batch)
+        try:
+            with upstream_priority(priority):
+                results = await self.batch_fn(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        except BaseException:
+            # Остановка процесса - ожидающие получают CancelledError
+            for future in batch.values():
+                future.cancel()
+            raise
+        else:
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(results.get(key))
+        finally:
+            for key, future in batch.items():
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        """Значение для ключа (None - не найден)."""
+        self._counters['requested'] += 1
+        # shield: отмена одного ожидающего не отменяет общий результат для остальных
+        return await asyncio.shield(self._future_for(key))
+
+    async def load_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Значения для ключей; не найденные в результат не попадают."""
+        keys = list(dict.fromkeys(keys))
+        self._counters['requested'] += len(keys)
+        futures = [self._future_for(key) for key in keys]
+        values = await asyncio.gather(*(asyncio.shield(future) for future in futures))
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def as_dict(self) -> Dict:
+        batches = self._counters['batches']
+        return {
+            'requested': self._counters['requested'],
+            'deduplicated': self._counters['deduplicated'],
+            'batches': batches,
+            'avg_batch_size': round(self._counters['keys'] / batches, 1) if batches else None,
+            'pending': len(self._pending),
+            'inflight': len(self._inflight),
+        }
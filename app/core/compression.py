@@ -0,0 +1,147 @@
+# app/core/compression.py
+import gzip
+import logging
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# brotli и zstandard необязательны: без них остается gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 6
+
+# Порядок предпочтения при одинаковом q: zstd и br сжимают повторяющийся JSON заметно лучше gzip
+SUPPORTED_ENCODINGS: List[str] = [
+    encoding for encoding, available in (("zstd", zstandard is not None), ("br", brotli is not None), ("gzip", True))
+    if available
+]
+
+COMPRESSIBLE_CONTENT_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        return brotli.decompress(body)
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Выбирает кодирование по заголовку Accept-Encoding с учетом q-значений.
+    Возвращает None, если клиент не принимает ни одно из поддерживаемых.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def choose_encoding(headers: Headers, content_type: Optional[str], body_size: int) -> Optional[str]:
+    """Кодирование для ответа или None, если ответ маленький, несжимаемый или клиент не поддерживает сжатие."""
+    if body_size < settings.compression_minimum_size:
+        return None
+    if not content_type or not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+        return None
+    return negotiate_encoding(headers.get("accept-encoding"))
+
+
+def weak_etag(etag: str) -> str:
+    """Сжатое представление получает слабый ETag: байты отличаются, содержимое то же."""
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы (zstd / br / gzip по Accept-Encoding) размером от compression_minimum_size.
+    Ответы, уже имеющие Content-Encoding (например, готовые сжатые варианты из HTTP-кэша),
+    и потоковые ответы передаются без изменений.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not negotiate_encoding(Headers(scope=scope).get("accept-encoding")):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def compressing_send(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            response_headers = Headers(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if message.get("more_body", False) or "content-encoding" in response_headers:
+                # Потоковый или уже сжатый ответ - отдаем как есть
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            encoding = choose_encoding(request_headers, response_headers.get("content-type"), len(body))
+            headers = MutableHeaders(raw=list(start_message["headers"]))
+            headers.add_vary_header("Accept-Encoding")
+            if encoding:
+                body = compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                if "etag" in headers:
+                    headers["etag"] = weak_etag(headers["etag"])
+            await send({**start_message, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, compressing_send)
@@ -16,6 +16,9 @@ class Settings(BaseSettings):
 
     # --- Database ---
     database_url: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./test.db") # Используем aiosqlite для async
+    db_migrate_on_startup: bool = os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() == "true" # alembic upgrade head при старте (базовые таблицы - первая миграция)
+    db_create_all: bool = os.getenv("DB_CREATE_ALL", "false").lower() == "true" # create_all после миграций (только для разработки)
+    db_pool_warm_connections: int = int(os.getenv("DB_POOL_WARM_CONNECTIONS", 2)) # Соединений, открываемых при старте
 
     # --- Security & Auth ---
     secret_key: str = os.getenv("SECRET_KEY", "default_secret_key_change_me") # Добавил default
@@ -36,6 +39,114 @@ class Settings(BaseSettings):
     search_rate_limit_count: int = int(os.getenv("SEARCH_RATE_LIMIT_COUNT", 3))
     search_rate_limit_window_seconds: int = int(os.getenv("SEARCH_RATE_LIMIT_WINDOW_SECONDS", 6 * 60 * 60)) # 6 часов
 
+    # --- HTTP Caching ---
+    # Префикс пути = max-age в секундах; 0 - только ETag и ревалидация, без хранения ответа
+    # (обязательно для /search/videos и /search/shorts: у них лимит поисков, история и популярность)
+    http_cache_rules: str = os.getenv("HTTP_CACHE_RULES", "/search/videos=0,/search/shorts=0,/search/limit-status=0,/search/history=0,/search/saved=0,/search/shared=0,/search/=300,/videos/=600")
+    http_cache_max_entries: int = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", 1000)) # На один воркер
+    compression_minimum_size: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024)) # Ответы меньше (байт) не сжимаются
+
+    # --- Startup & Health ---
+    startup_budget_seconds: float = float(os.getenv("STARTUP_BUDGET_SECONDS", 5)) # Превышение логируется как предупреждение
+    readiness_check_timeout_seconds: float = float(os.getenv("READINESS_CHECK_TIMEOUT_SECONDS", 2))
+
+    # --- YouTube API ---
+    youtube_http_timeout_seconds: int = int(os.getenv("YOUTUBE_HTTP_TIMEOUT_SECONDS", 30))
+    youtube_daily_quota_per_key: int = int(os.getenv("YOUTUBE_DAILY_QUOTA_PER_KEY", 10000)) # units в сутки (сброс в полночь PT)
+    youtube_partial_responses_enabled: bool = os.getenv("YOUTUBE_PARTIAL_RESPONSES_ENABLED", "true").lower() == "true" # Параметр fields: API возвращает только читаемые поля
+
+    # --- Upstream Scheduler (очередь вызовов YouTube API, на воркер) ---
+    upstream_max_concurrency: int = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", 16)) # Одновременных вызовов API
+    upstream_per_key_concurrency: int = int(os.getenv("UPSTREAM_PER_KEY_CONCURRENCY", 6)) # Одновременных вызовов на один ключ
+    upstream_interactive_reserved: int = int(os.getenv("UPSTREAM_INTERACTIVE_RESERVED", 4)) # Слотов только для интерактивных запросов
+    upstream_batch_window_ms: float = float(os.getenv("UPSTREAM_BATCH_WINDOW_MS", 2)) # Сколько ждать ID от других запросов перед вызовом videos.list / channels.list
+
+    # --- Search Cache & Prewarm ---
+    search_cache_ttl_seconds: int = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 12 * 60 * 60)) # Общий кэш результатов поиска
+    search_prewarm_enabled: bool = os.getenv("SEARCH_PREWARM_ENABLED", "true").lower() == "true"
+    search_prewarm_cron: str = os.getenv("SEARCH_PREWARM_CRON", "*/30 21-23 * * *") # По времени суток квоты (America/Los_Angeles): перед сбросом квоты
+    search_prewarm_top_n: int = int(os.getenv("SEARCH_PREWARM_TOP_N", 50)) # Сколько популярных запросов прогревать
+    search_prewarm_max_results: int = int(os.getenv("SEARCH_PREWARM_MAX_RESULTS", 50)) # Результатов на запрос (покрывает max_results <= 50)
+    search_prewarm_min_age_seconds: int = int(os.getenv("SEARCH_PREWARM_MIN_AGE_SECONDS", 6 * 60 * 60)) # Более свежий кэш не обновляется
+    search_prewarm_reserve_units: int = int(os.getenv("SEARCH_PREWARM_RESERVE_UNITS", 2000)) # Неприкосновенный запас квоты
+    search_popularity_decay: float = float(os.getenv("SEARCH_POPULARITY_DECAY", 0.5)) # Множитель популярности после каждого прогрева
+    local_index_enabled: bool = os.getenv("LOCAL_INDEX_ENABLED", "true").lower() == "true" # Полнотекстовый индекс виденных видео (SQLite FTS5)
+    local_index_path: str = os.getenv("LOCAL_INDEX_PATH", "data/local_index.db")
+    local_index_queue_size: int = int(os.getenv("LOCAL_INDEX_QUEUE_SIZE", 20000)) # При переполнении видео не индексируются
+    local_index_fallback_enabled: bool = os.getenv("LOCAL_INDEX_FALLBACK_ENABLED", "true").lower() == "true" # Поиск по индексу, когда квота исчерпана
+    search_history_max_entries: int = int(os.getenv("SEARCH_HISTORY_MAX_ENTRIES", 200)) # Записей истории на пользователя, старые удаляются
+    saved_search_max_per_user: int = int(os.getenv("SAVED_SEARCH_MAX_PER_USER", 50))
+    saved_search_max_items: int = int(os.getenv("SAVED_SEARCH_MAX_ITEMS", 500)) # Отслеживаемых видео на сохраненный поиск, сверх - самые старые вытесняются
+    saved_search_overlap_seconds: int = int(os.getenv("SAVED_SEARCH_OVERLAP_SECONDS", 30 * 60)) # publishedAfter = прошлый запуск минус запас (индекс поиска YouTube отстает)
+    saved_search_rising_min_growth: float = float(os.getenv("SAVED_SEARCH_RISING_MIN_GROWTH", 0.05)) # Прирост просмотров с прошлого запуска (доля) для попадания в rising
+    saved_search_rising_limit: int = int(os.getenv("SAVED_SEARCH_RISING_LIMIT", 20))
+
+    # --- Channel Cache ---
+    channel_info_cache_ttl_seconds: int = int(os.getenv("CHANNEL_INFO_CACHE_TTL_SECONDS", 6 * 60 * 60)) # 6 часов
+
+    # --- Channel Baseline (базовый уровень просмотров для combined_metric) ---
+    channel_baseline_default_method: str = os.getenv("CHANNEL_BASELINE_DEFAULT_METHOD", "median") # lifetime, median или trimmed_mean
+    channel_baseline_sample_size: int = int(os.getenv("CHANNEL_BASELINE_SAMPLE_SIZE", 30)) # Последних загрузок в выборке (не больше uploads_cache_max_items)
+    channel_baseline_min_samples: int = int(os.getenv("CHANNEL_BASELINE_MIN_SAMPLES", 5)) # Меньше - остается lifetime
+    channel_baseline_min_age_hours: int = int(os.getenv("CHANNEL_BASELINE_MIN_AGE_HOURS", 72)) # Более свежие загрузки в выборку не входят
+    channel_baseline_trim: float = float(os.getenv("CHANNEL_BASELINE_TRIM", 0.1)) # Доля отбрасываемых значений с каждой стороны для trimmed_mean
+    channel_baseline_cache_ttl_seconds: int = int(os.getenv("CHANNEL_BASELINE_CACHE_TTL_SECONDS", 12 * 60 * 60))
+    channel_baseline_refresh_batch: int = int(os.getenv("CHANNEL_BASELINE_REFRESH_BATCH", 50)) # Каналов за один фоновый расчет
+
+    # --- Video Metadata Cache ---
+    video_metadata_cache_ttl_seconds: int = int(os.getenv("VIDEO_METADATA_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60)) # Название, длительность, канал - 7 дней
+    video_stats_cache_ttl_seconds: int = int(os.getenv("VIDEO_STATS_CACHE_TTL_SECONDS", 15 * 60)) # Просмотры, лайки, комментарии - 15 минут
+    video_snapshot_min_interval_seconds: int = int(os.getenv("VIDEO_SNAPSHOT_MIN_INTERVAL_SECONDS", 15 * 60)) # Чаще снимки статистики не пишутся
+    video_snapshot_max_points: int = int(os.getenv("VIDEO_SNAPSHOT_MAX_POINTS", 200)) # Сверх - ряд прореживается (сутки по 15 мин + 2 недели по 6 ч + месяц по дню ~ 170)
+    video_snapshot_ttl_seconds: int = int(os.getenv("VIDEO_SNAPSHOT_TTL_SECONDS", 30 * 24 * 60 * 60)) # Ряд видео без новых снимков удаляется
+    view_velocity_window_seconds: int = int(os.getenv("VIEW_VELOCITY_WINDOW_SECONDS", 60 * 60)) # Минимальный отрезок для расчета скорости
+    videos_by_ids_max_ids: int = int(os.getenv("VIDEOS_BY_IDS_MAX_IDS", 5000)) # Защита от слишком больших запросов
+    video_metadata_concurrency: int = int(os.getenv("VIDEO_METADATA_CONCURRENCY", 8)) # Параллельных пачек videos.list
+    video_catalog_enabled: bool = os.getenv("VIDEO_CATALOG_ENABLED", "true").lower() == "true" # Каталог видео в БД (таблица video)
+    video_catalog_queue_size: int = int(os.getenv("VIDEO_CATALOG_QUEUE_SIZE", 20000)) # При переполнении видео не записываются
+
+    # --- Comments ---
+    comments_default_limit: int = int(os.getenv("COMMENTS_DEFAULT_LIMIT", 1000)) # Комментариев (с ответами) за запрос по умолчанию
+    comments_max_limit: int = int(os.getenv("COMMENTS_MAX_LIMIT", 10000))
+    comment_replies_max_per_thread: int = int(os.getenv("COMMENT_REPLIES_MAX_PER_THREAD", 100))
+    comment_archive_enabled: bool = os.getenv("COMMENT_ARCHIVE_ENABLED", "true").lower() == "true"
+    comment_archive_dir: str = os.getenv("COMMENT_ARCHIVE_DIR", "comms")
+    comment_archive_max_bytes: int = int(os.getenv("COMMENT_ARCHIVE_MAX_BYTES", 64 * 1024 * 1024)) # Размер файла до ротации
+    comment_archive_max_files: int = int(os.getenv("COMMENT_ARCHIVE_MAX_FILES", 20)) # Старые файлы сверх лимита удаляются
+    comment_archive_queue_size: int = int(os.getenv("COMMENT_ARCHIVE_QUEUE_SIZE", 50000)) # При переполнении записи отбрасываются
+    comment_digest_default_budget_chars: int = int(os.getenv("COMMENT_DIGEST_DEFAULT_BUDGET_CHARS", 12000)) # ~3000 токенов
+    comment_digest_max_comment_chars: int = int(os.getenv("COMMENT_DIGEST_MAX_COMMENT_CHARS", 600)) # Длинные комментарии обрезаются
+    comment_digest_min_comment_chars: int = int(os.getenv("COMMENT_DIGEST_MIN_COMMENT_CHARS", 20)) # Остаток бюджета меньше - упаковка завершается
+    comment_digest_cache_ttl_seconds: int = int(os.getenv("COMMENT_DIGEST_CACHE_TTL_SECONDS", 6 * 60 * 60)) # 6 часов
+
+    # --- Favorites Feed ---
+    uploads_cache_ttl_seconds: int = int(os.getenv("UPLOADS_CACHE_TTL_SECONDS", 15 * 60)) # Через сколько кэш загрузок канала считается устаревшим
+    uploads_cache_max_items: int = int(os.getenv("UPLOADS_CACHE_MAX_ITEMS", 50)) # Сколько последних загрузок храним на канал
+    favorites_feed_concurrency: int = int(os.getenv("FAVORITES_FEED_CONCURRENCY", 8)) # Параллельных запросов к playlistItems
+
+    # --- Favorite Channel Stats Refresher ---
+    channel_stats_refresh_enabled: bool = os.getenv("CHANNEL_STATS_REFRESH_ENABLED", "true").lower() == "true"
+    channel_stats_refresh_interval_seconds: int = int(os.getenv("CHANNEL_STATS_REFRESH_INTERVAL_SECONDS", 6 * 60 * 60)) # 6 часов
+    channel_stats_refresh_max_channels: int = int(os.getenv("CHANNEL_STATS_REFRESH_MAX_CHANNELS", 5000)) # Каналов за один проход (50 на 1 unit)
+
+    # --- Periodic Tasks (один запуск на кластер, лидер выбирается через Redis) ---
+    periodic_tick_seconds: float = float(os.getenv("PERIODIC_TICK_SECONDS", 5)) # Как часто проверяется расписание
+    periodic_leader_ttl_seconds: int = int(os.getenv("PERIODIC_LEADER_TTL_SECONDS", 30)) # Через сколько упавший лидер заменяется
+    periodic_lock_ttl_seconds: int = int(os.getenv("PERIODIC_LOCK_TTL_SECONDS", 5 * 60)) # Блокировка выполняющейся задачи (продлевается)
+    periodic_jitter_seconds: float = float(os.getenv("PERIODIC_JITTER_SECONDS", 60)) # Случайный сдвиг запуска
+
+    # --- Background Jobs (POST /jobs) ---
+    jobs_workers_enabled: bool = os.getenv("JOBS_WORKERS_ENABLED", "true").lower() == "true" # Обработчики очереди в этом процессе
+    jobs_worker_concurrency: int = int(os.getenv("JOBS_WORKER_CONCURRENCY", 4)) # Одновременных задач на процесс
+    jobs_max_active_per_user: int = int(os.getenv("JOBS_MAX_ACTIVE_PER_USER", 5)) # Незавершенных задач пользователя
+    jobs_ttl_seconds: int = int(os.getenv("JOBS_TTL_SECONDS", 24 * 60 * 60)) # Сколько хранится завершенная задача с результатами
+    jobs_poll_timeout_seconds: int = int(os.getenv("JOBS_POLL_TIMEOUT_SECONDS", 5)) # Ожидание задачи в BLMOVE
+    jobs_lease_seconds: int = int(os.getenv("JOBS_LEASE_SECONDS", 120)) # Без heartbeat дольше - воркер считается пропавшим
+    jobs_reaper_interval_seconds: int = int(os.getenv("JOBS_REAPER_INTERVAL_SECONDS", 60)) # Проверка задач с истекшей арендой
+    jobs_max_attempts: int = int(os.getenv("JOBS_MAX_ATTEMPTS", 3)) # Запусков задачи, потерянной вместе с воркером, до ошибки
+    jobs_comments_max_limit: int = int(os.getenv("JOBS_COMMENTS_MAX_LIMIT", 100000)) # Комментариев в задаче comments_harvest
+    jobs_channel_scan_max_videos: int = int(os.getenv("JOBS_CHANNEL_SCAN_MAX_VIDEOS", 5000)) # Видео в задаче channel_scan
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore") # Используем ignore вместо allow
 
 settings = Settings()
@@ -1,10 +1,23 @@
 # app/core/database.py
+from pathlib import Path
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config as AlembicConfig
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from sqlmodel import create_engine, SQLModel, Session
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.core.config import settings
 from typing import Generator, Annotated
 from fastapi import Depends
 
-engine = create_engine(settings.database_url, echo=True)
+engine = create_engine(settings.database_url, echo=True, pool_pre_ping=True)
+
+# INSERT ... ON CONFLICT есть у PostgreSQL и SQLite (по имени диалекта engine)
+DIALECT_INSERTS = {'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
 
 
 def get_db() -> Generator:
@@ -13,7 +26,86 @@ def get_db() -> Generator:
 
 
 def init_db():
+    # Только для локальной разработки: в production схема создается миграциями Alembic
     SQLModel.metadata.create_all(engine)
 
 
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# Ревизия схемы, которую строил create_all до перехода на миграции (базовые таблицы + favoritechannel.added_at)
+LEGACY_SCHEMA_REVISION = '96d550bc8f0f'
+# Вторая база истории миграций: создает базовые таблицы на пустой базе
+BASE_TABLES_REVISION = 'a0c3e7b52d18'
+# Ключ pg_advisory_lock: одновременно стартующие воркеры и реплики мигрируют по очереди
+MIGRATION_LOCK_ID = 7_150_320_001
+
+
+def _alembic_config(connection) -> AlembicConfig:
+    config = AlembicConfig(str(PROJECT_ROOT / 'alembic.ini'))
+    config.set_main_option('script_location', str(PROJECT_ROOT / 'migrations'))
+    config.attributes['connection'] = connection
+    return config
+
+
+def _schema_matches_models(connection) -> bool:
+    """Схема базы совпадает с моделями (compare_metadata без расхождений; чужие таблицы не учитываются)."""
+    diffs = compare_metadata(MigrationContext.configure(connection), SQLModel.metadata)
+    return not [diff for diff in diffs if not (isinstance(diff, tuple) and diff[0] == 'remove_table')]
+
+
+def migrate_db():
+    """
+    Приводит схему к последней миграции (alembic upgrade head); вызывается при старте приложения.
+    У истории две базы: BASE_TABLES_REVISION (базовые таблицы) и LEGACY_SCHEMA_REVISION; на пустой базе
+    первой применяется BASE_TABLES_REVISION. База без alembic_version, но с таблицами, создана create_all:
+    если ее схема совпадает с моделями, она помечается head, иначе - LEGACY_SCHEMA_REVISION.
+    Существующим базам BASE_TABLES_REVISION только помечается; применяются лишь последующие миграции.
+    """
+    with engine.connect() as connection:
+        locked = connection.dialect.name == 'postgresql'
+        if locked:
+            connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+        try:
+            config = _alembic_config(connection)
+            tables = set(inspect(connection).get_table_names())
+            if 'user' in tables:
+                if 'alembic_version' not in tables:
+                    command.stamp(config, 'head' if _schema_matches_models(connection) else LEGACY_SCHEMA_REVISION)
+                heads = MigrationContext.configure(connection).get_current_heads()
+                applied = {script.revision for script in ScriptDirectory.from_config(config).iterate_revisions(heads, 'base')}
+                if BASE_TABLES_REVISION not in applied:
+                    command.stamp(config, BASE_TABLES_REVISION)
+            else:
+                command.upgrade(config, BASE_TABLES_REVISION)
+            command.upgrade(config, 'head')
+            connection.commit()
+        finally:
+            if locked:
+                connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+                connection.commit()
+
+
+def ping_db():
+    """Выполняет SELECT 1 (проверка доступности БД)."""
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def warm_db_pool(connections: int) -> int:
+    """
+    Заранее открывает соединения пула, чтобы первые запросы не ждали установки соединения.
+    Возвращает число открытых соединений.
+    """
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        # Соединения возвращаются в пул открытыми
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
@@ -0,0 +1,241 @@
+# app/core/http_cache.py
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.compression import choose_encoding, compress, weak_etag
+from app.core.list_versions import etag_matches
+from app.core.security import access_token_from_headers, session_user_id
+
+logger = logging.getLogger(__name__)
+
+# Заголовки исходного ответа, которые сохраняются в кэше вместе с телом
+STORED_HEADERS = ("content-type",)
+
+
+def parse_cache_rules(raw: Optional[str]) -> List[Tuple[str, int]]:
+    """
+    Разбирает правила вида "/search/videos=300,/videos/=600" в список (префикс пути, max-age).
+    max-age=0 - ответ не хранится, но получает ETag и "no-cache" (всегда ревалидация).
+    Правила отсортированы так, что более длинный префикс проверяется первым.
+    """
+    rules = []
+    for part in (raw or "").split(","):
+        if "=" not in part:
+            continue
+        prefix, max_age = part.rsplit("=", 1)
+        try:
+            rules.append((prefix.strip(), int(max_age)))
+        except ValueError:
+            logger.warning(f"Ignoring invalid HTTP cache rule: {part!r}")
+    return sorted(rules, key=lambda rule: len(rule[0]), reverse=True)
+
+
+def compute_etag(body: bytes) -> str:
+    """Сильный ETag по содержимому тела ответа."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class CachedResponse:
+    """
+    Сериализованный ответ: тело, ETag и время создания.
+    Сжатые варианты тела хранятся рядом с исходными байтами и создаются один раз на запись.
+    """
+
+    def __init__(self, body: bytes, headers: Dict[str, str], max_age: int):
+        self.body = body
+        self.headers = headers
+        self.etag = compute_etag(body)
+        self.created_at = time.time()
+        self.expires_at = self.created_at + max_age
+        self.encoded: Dict[str, bytes] = {}
+
+    def encoded_body(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compress(self.body, encoding)
+        return self.encoded[encoding]
+
+    def choose_encoding(self, request_headers: Headers) -> Optional[str]:
+        return choose_encoding(request_headers, self.headers.get("content-type"), len(self.body))
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.created_at, usegmt=True)
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+
+class ResponseCache:
+    """In-process LRU-кэш сериализованных ответов с TTL (свой в каждом воркере)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.is_fresh():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def _not_modified_since(headers: Headers, created_at: float) -> bool:
+    if_modified_since = headers.get("if-modified-since")
+    if not if_modified_since or headers.get("if-none-match"):
+        return False # If-None-Match имеет приоритет (RFC 9110)
+    try:
+        return int(created_at) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+class HTTPCacheMiddleware:
+    """
+    Добавляет к GET-ответам выбранных маршрутов ETag, Cache-Control: private, max-age и Last-Modified.
+    Отвечает 304 на совпавший If-None-Match / If-Modified-Since.
+    Ответы с max-age > 0 хранятся в сериализованном виде (ключ - ID пользователя из проверенного JWT + путь + query),
+    поэтому повтор того же запроса в пределах max-age не вызывает ни эндпоинт, ни сериализацию.
+    Эндпоинты с побочными эффектами (лимит поисков, история, популярность) должны иметь max-age=0:
+    тогда эндпоинт выполняется всегда, а middleware лишь отвечает 304 по ETag.
+    """
+
+    def __init__(self, app: ASGIApp, rules: List[Tuple[str, int]], cache: ResponseCache):
+        self.app = app
+        self.rules = rules
+        self.cache = cache
+
+    def _match_rule(self, path: str) -> Optional[int]:
+        for prefix, max_age in self.rules:
+            if path.startswith(prefix):
+                return max_age
+        return None
+
+    @staticmethod
+    def _cache_key(scope: Scope, headers: Headers) -> Optional[str]:
+        # Ответы приватные: без действующей сессии не кэшируем и не отдаем сохраненное -
+        # запрос уходит в эндпоинт, который сам ответит 401/403
+        token = access_token_from_headers(headers)
+        user_id = session_user_id(token) if token else None
+        if not user_id:
+            return None
+        raw = b"|".join([user_id.encode(), scope["path"].encode(), scope.get("query_string", b"")])
+        return hashlib.sha256(raw).hexdigest()
+
+    @staticmethod
+    def _cache_headers(max_age: int, etag: str, last_modified: str, encoding: Optional[str] = None) -> List[Tuple[bytes, bytes]]:
+        cache_control = f"private, max-age={max_age}" if max_age > 0 else "private, no-cache"
+        headers = [
+            (b"etag", (weak_etag(etag) if encoding else etag).encode("latin-1")),
+            (b"cache-control", cache_control.encode("latin-1")),
+            (b"last-modified", last_modified.encode("latin-1")),
+            (b"vary", b"Cookie, Accept-Encoding"),
+        ]
+        if encoding:
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+        return headers
+
+    async def _send_not_modified(self, send: Send, cache_headers: List[Tuple[bytes, bytes]]) -> None:
+        await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _send_cached(self, scope: Scope, request_headers: Headers, send: Send, entry: CachedResponse, max_age: int) -> None:
+        encoding = entry.choose_encoding(request_headers)
+        body = entry.encoded_body(encoding)
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in entry.headers.items()]
+        headers += self._cache_headers(max_age, entry.etag, entry.last_modified, encoding)
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        max_age = self._match_rule(scope["path"])
+        if max_age is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        cache_key = self._cache_key(scope, request_headers) if max_age > 0 else None
+
+        if cache_key:
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                remaining = max(0, int(entry.expires_at - time.time()))
+                if etag_matches(request_headers.get("if-none-match"), entry.etag) or _not_modified_since(request_headers, entry.created_at):
+                    logger.debug(f"HTTP cache: 304 from stored entry for {scope['path']}")
+                    await self._send_not_modified(send, self._cache_headers(remaining, entry.etag, entry.last_modified))
+                else:
+                    logger.debug(f"HTTP cache: serving stored entry for {scope['path']}")
+                    await self._send_cached(scope, request_headers, send, entry, remaining)
+                return
+
+        # --- Выполняем эндпоинт и буферизуем ответ, чтобы посчитать ETag по телу ---
+        start_message: Optional[Message] = None
+        body_chunks: List[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+            elif message["type"] == "http.response.body":
+                body_chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        if start_message is None:
+            return
+        body = b"".join(body_chunks)
+
+        if start_message["status"] != 200:
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        response_headers = Headers(raw=start_message["headers"])
+        entry = CachedResponse(
+            body=body,
+            headers={name: response_headers[name] for name in STORED_HEADERS if name in response_headers},
+            max_age=max_age,
+        )
+        if etag_matches(request_headers.get("if-none-match"), entry.etag):
+            if cache_key:
+                self.cache.set(cache_key, entry)
+            await self._send_not_modified(send, self._cache_headers(max_age, entry.etag, entry.last_modified))
+            return
+
+        # Сохраняемый ответ сжимаем сразу: сжатый вариант останется в записи для следующих запросов.
+        # Несохраняемые ответы сожмет CompressionMiddleware.
+        encoding = entry.choose_encoding(request_headers) if cache_key else None
+        if cache_key:
+            body = entry.encoded_body(encoding)
+            self.cache.set(cache_key, entry)
+
+        headers = MutableHeaders(raw=list(start_message["headers"]))
+        for name, value in self._cache_headers(max_age, entry.etag, entry.last_modified, encoding):
+            if name == b"vary":
+                headers.add_vary_header(value.decode("latin-1"))
+            else:
+                headers[name.decode("latin-1")] = value.decode("latin-1")
+        headers["content-length"] = str(len(body))
+        await send({**start_message, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,30 @@
+# app/core/http_clients.py
+import logging
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Общий клиент на процесс: пул соединений (и TLS-сессии) переиспользуется между запросами
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Возвращает общий httpx.AsyncClient, создавая его при первом обращении."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=settings.youtube_http_timeout_seconds)
+        logger.info("Shared HTTP client created.")
+    return _http_client
+
+
+async def close_http_client():
+    """Закрывает общий клиент. Вызывается при остановке приложения."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        logger.info("Shared HTTP client closed.")
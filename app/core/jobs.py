@@ -0,0 +1,387 @@
+# app/core/jobs.py
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Type
+
+import redis.asyncio as redis
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.upstream_scheduler import Priority, current_upstream_user, set_upstream_priority, set_upstream_user
+
+logger = logging.getLogger(__name__)
+
+# Очередь - LIST идентификаторов; состояние задачи - HASH; частичные результаты - LIST JSON-записей
+JOBS_QUEUE_KEY = "jobs:queue"
+JOB_KEY_PREFIX = "jobs:job"
+JOB_RESULTS_KEY_PREFIX = "jobs:results"
+USER_JOBS_KEY_PREFIX = "jobs:user"      # ZSET: id задачи -> время создания
+USER_ACTIVE_KEY_PREFIX = "jobs:active"  # SET: незавершенные задачи пользователя
+JOBS_RUNNING_KEY = "jobs:running"       # ZSET: id выполняющейся задачи -> время последнего heartbeat (аренда)
+JOBS_CLAIMED_KEY = "jobs:claimed"       # LIST: задачи, взятые воркером из очереди (BLMOVE) и еще не запущенные
+JOBS_CLAIMED_SEEN_KEY = "jobs:claimed:seen"  # ZSET: id из JOBS_CLAIMED_KEY -> когда reap_expired впервые его увидел
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Как часто (секунды) выполняющаяся задача сверяется с флагом отмены
+CANCEL_CHECK_INTERVAL_SECONDS = 1.0
+# Сколько heartbeat укладывается в аренду: пропуск одного-двух (пауза Redis) не теряет задачу
+HEARTBEATS_PER_LEASE = 4
+
+
+class JobCancelled(Exception):
+    """Пользователь отменил задачу; выбрасывается из JobContext в обработчик."""
+
+
+class JobQueueUnavailable(Exception):
+    """Redis недоступен - задачи не принимаются."""
+
+
+@dataclass
+class JobType:
+    name: str
+    params_model: Type[BaseModel]
+    handler: Callable[["JobContext", BaseModel], Awaitable[Optional[Dict]]]
+    description: str = ""
+
+
+# Обработчики регистрируются модулями, где живет соответствующая операция (@job_handler)
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+def job_handler(name: str, params_model: Type[BaseModel], description: str = ""):
+    """
+    Регистрирует обработчик задачи типа name.
+    Обработчик получает JobContext и параметры (params_model) и может вернуть итоговую сводку (dict).
+    """
+    def decorator(handler):
+        JOB_TYPES[name] = JobType(name, params_model, handler, description)
+        return handler
+    return decorator
+
+
+def _job_key(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}:{job_id}"
+
+
+def _results_key(job_id: str) -> str:
+    return f"{JOB_RESULTS_KEY_PREFIX}:{job_id}"
+
+
+def _user_jobs_key(user_id: str) -> str:
+    return f"{USER_JOBS_KEY_PREFIX}:{user_id}"
+
+
+def _user_active_key(user_id: str) -> str:
+    return f"{USER_ACTIVE_KEY_PREFIX}:{user_id}"
+
+
+def _decode_job(raw: Dict[str, str]) -> Optional[Dict]:
+    if not raw:
+        return None
+    job = dict(raw)
+    for field in ('params', 'summary'):
+        job[field] = json.loads(job[field]) if job.get(field) else None
+    for field in ('progress_done', 'progress_total', 'result_count', 'attempts'):
+        job[field] = int(job[field]) if job.get(field) not in (None, '') else None
+    for field in ('created_at', 'started_at', 'finished_at'):
+        job[field] = float(job[field]) if job.get(field) else None
+    job['cancel_requested'] = job.get('cancel_requested') == '1'
+    return job
+
+
+class JobContext:
+    """Передается обработчику: прогресс, частичные результаты и проверка отмены."""
+
+    def __init__(self, queue: "JobQueue", redis_client: redis.Redis, job_id: str, user_id: str):
+        self.queue = queue
+        self.redis = redis_client
+        self.job_id = job_id
+        self.user_id = user_id
+        self._cancel_checked_at = 0.0
+
+    async def check_cancelled(self, force: bool = False) -> None:
+        """Выбрасывает JobCancelled, если задачу отменили (Redis опрашивается не чаще раза в секунду)."""
+        now = time.monotonic()
+        if not force and now - self._cancel_checked_at < CANCEL_CHECK_INTERVAL_SECONDS:
+            return
+        self._cancel_checked_at = now
+        if await self.redis.hget(_job_key(self.job_id), 'cancel_requested') == '1':
+            raise JobCancelled()
+
+    async def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None) -> None:
+        mapping = {'progress_done': str(done)}
+        if total is not None:
+            mapping['progress_total'] = str(total)
+        if message is not None:
+            mapping['progress_message'] = message
+        await self.redis.hset(_job_key(self.job_id), mapping=mapping)
+        await self.check_cancelled()
+
+    async def add_results(self, results: Iterable[Any]) -> None:
+        """Дописывает частичные результаты; они доступны через GET /jobs/{id} до завершения задачи."""
+        records = [json.dumps(result, default=str, ensure_ascii=False) for result in results]
+        if not records:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(_results_key(self.job_id), *records)
+            pipe.hincrby(_job_key(self.job_id), 'result_count', len(records))
+            await pipe.execute()
+        await self.check_cancelled()
+
+
+class JobQueue:
+    """
+    Фоновые задачи с состоянием в Redis: очередь общая для всех воркеров (процессов),
+    каждый процесс запускает settings.jobs_worker_concurrency обработчиков.
+    Без воркеров задачи можно выполнить в текущем процессе через run_pending() (тесты, скрипты).
+    """
+
+    def __init__(self, redis_factory: Callable[[], Optional[redis.Redis]] = get_redis):
+        self._redis_factory = redis_factory
+
+    def _redis(self) -> redis.Redis:
+        client = self._redis_factory()
+        if client is None:
+            raise JobQueueUnavailable("Redis is not configured")
+        return client
+
+    async def submit(self, user_id: str, job_type: str, params: BaseModel) -> Dict:
+        """Ставит задачу в очередь. ValueError - неизвестный тип или лимит незавершенных задач пользователя."""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type: {job_type}")
+        client = self._redis()
+        if await client.scard(_user_active_key(user_id)) >= settings.jobs_max_active_per_user:
+            raise ValueError(f"Too many unfinished jobs (limit {settings.jobs_max_active_per_user})")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        job = {
+            'id': job_id,
+            'type': job_type,
+            'user_id': str(user_id),
+            'upstream_user': current_upstream_user(), # Вызовы API задачи идут в очередь того же пользователя
+            'params': params.model_dump_json(),
+            'status': QUEUED,
+            'progress_done': '0',
+            'result_count': '0',
+            'created_at': str(now),
+        }
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(_job_key(job_id), mapping=job)
+            pipe.zadd(_user_jobs_key(user_id), {job_id: now})
+            pipe.sadd(_user_active_key(user_id), job_id)
+            pipe.rpush(JOBS_QUEUE_KEY, job_id)
+            await pipe.execute()
+        logger.info(f"Job {job_id} ({job_type}) queued for user {user_id}.")
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return _decode_job(await self._redis().hgetall(_job_key(job_id)))
+
+    async def get_results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Any]:
+        raw = await self._redis().lrange(_results_key(job_id), offset, offset + limit - 1)
+        return [json.loads(record) for record in raw]
+
+    async def list_for_user(self, user_id: str, limit: int = 50) -> List[Dict]:
+        client = self._redis()
+        job_ids = await client.zrevrange(_user_jobs_key(user_id), 0, limit - 1)
+        if not job_ids:
+            return []
+        async with client.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hgetall(_job_key(job_id))
+            raw_jobs = await pipe.execute()
+        expired = [job_id for job_id, raw in zip(job_ids, raw_jobs) if not raw]
+        if expired:
+            await client.zrem(_user_jobs_key(user_id), *expired)
+        return [job for job in map(_decode_job, raw_jobs) if job]
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        Отменяет задачу: ожидающая в очереди сразу становится cancelled,
+        выполняющаяся останавливается при ближайшей проверке (прогресс или результаты), уже полученное сохраняется.
+        """
+        client = self._redis()
+        job = await self.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return job
+        await client.hset(_job_key(job_id), 'cancel_requested', '1')
+        if job['status'] == QUEUED and await client.lrem(JOBS_QUEUE_KEY, 0, job_id):
+            await self._finish(client, job_id, job['user_id'], CANCELLED)
+        return await self.get(job_id)
+
+    async def _finish(self, client: redis.Redis, job_id: str, user_id: str, status: str, error: Optional[str] = None, summary: Optional[Dict] = None) -> None:
+        mapping = {'status': status, 'finished_at': str(time.time())}
+        if error is not None:
+            mapping['error'] = error
+        if summary is not None:
+            mapping['summary'] = json.dumps(summary, default=str)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(_job_key(job_id), mapping=mapping)
+            pipe.expire(_job_key(job_id), settings.jobs_ttl_seconds)
+            pipe.expire(_results_key(job_id), settings.jobs_ttl_seconds)
+            pipe.srem(_user_active_key(user_id), job_id)
+            pipe.zrem(JOBS_RUNNING_KEY, job_id)
+            pipe.lrem(JOBS_CLAIMED_KEY, 1, job_id)
+            pipe.expire(_user_jobs_key(user_id), settings.jobs_ttl_seconds)
+            await pipe.execute()
+
+    async def _requeue(self, client: redis.Redis, job_id: str) -> None:
+        """Возвращает задачу в начало очереди; она начнется заново, частичные результаты удаляются."""
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.delete(_results_key(job_id))
+            pipe.hset(_job_key(job_id), mapping={'status': QUEUED, 'progress_done': '0', 'result_count': '0'})
+            pipe.zrem(JOBS_RUNNING_KEY, job_id)
+            pipe.lrem(JOBS_CLAIMED_KEY, 1, job_id)
+            pipe.lpush(JOBS_QUEUE_KEY, job_id)
+            await pipe.execute()
+
+    async def _heartbeat(self, client: redis.Redis, job_id: str) -> None:
+        """Продлевает аренду выполняющейся задачи, пока обработчик работает."""
+        interval = settings.jobs_lease_seconds / HEARTBEATS_PER_LEASE
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await client.zadd(JOBS_RUNNING_KEY, {job_id: time.time()}, xx=True, ch=True):
+                    logger.warning(f"Job {job_id} lost its lease (reaped as expired) but is still running.")
+                    return
+            except redis.RedisError as e:
+                logger.warning(f"Could not renew lease of job {job_id}: {e}")
+
+    async def reap_expired(self) -> int:
+        """
+        Задачи, аренда которых истекла (воркер убит: OOM, SIGKILL, перезапуск контейнера), возвращаются в очередь;
+        после jobs_max_attempts запусков - завершаются с ошибкой и освобождают слот пользователя.
+        Туда же возвращаются задачи, которые воркер взял из очереди, но не успел запустить.
+        Возвращает число обработанных задач. Выполняется периодически на одном воркере кластера.
+        """
+        client = self._redis()
+        reaped = await self._reap_claimed(client)
+        expired = await client.zrangebyscore(JOBS_RUNNING_KEY, '-inf', time.time() - settings.jobs_lease_seconds)
+        for job_id in expired:
+            # ZREM удаляет задачу ровно у одного из одновременно работающих сборщиков
+            if not await client.zrem(JOBS_RUNNING_KEY, job_id):
+                continue
+            job = await self.get(job_id)
+            if job is None or job['status'] != RUNNING:
+                continue
+            reaped += 1
+            if (job['attempts'] or 0) >= settings.jobs_max_attempts:
+                logger.error(f"Job {job_id} ({job['type']}) lost its worker {job['attempts']} times, failing it.")
+                await self._finish(client, job_id, job['user_id'], FAILED, error="Worker lost while running the job")
+            else:
+                logger.warning(f"Job {job_id} ({job['type']}) lease expired, requeueing it.")
+                await self._requeue(client, job_id)
+        return reaped
+
+    async def _reap_claimed(self, client: redis.Redis) -> int:
+        """
+        Задача в JOBS_CLAIMED_KEY дольше аренды - воркер умер между BLMOVE и запуском: она возвращается в очередь.
+        Время взятия BLMOVE не записывает, поэтому отсчет идет от первого прохода, заставшего задачу в списке.
+        """
+        claimed = set(await client.lrange(JOBS_CLAIMED_KEY, 0, -1))
+        now = time.time()
+        seen = dict(await client.zrange(JOBS_CLAIMED_SEEN_KEY, 0, -1, withscores=True))
+        async with client.pipeline(transaction=False) as pipe:
+            if claimed - seen.keys():
+                pipe.zadd(JOBS_CLAIMED_SEEN_KEY, {job_id: now for job_id in claimed - seen.keys()}, nx=True)
+            if seen.keys() - claimed:
+                pipe.zrem(JOBS_CLAIMED_SEEN_KEY, *(seen.keys() - claimed))
+            await pipe.execute()
+
+        reaped = 0
+        for job_id, seen_at in seen.items():
+            if job_id not in claimed or seen_at > now - settings.jobs_lease_seconds:
+                continue
+            await client.zrem(JOBS_CLAIMED_SEEN_KEY, job_id)
+            job = await self.get(job_id)
+            if job is None or job['status'] != QUEUED:
+                await client.lrem(JOBS_CLAIMED_KEY, 1, job_id)
+                continue
+            reaped += 1
+            logger.warning(f"Job {job_id} ({job['type']}) was claimed by a worker that never started it, requeueing it.")
+            await self._requeue(client, job_id)
+        return reaped
+
+    async def _execute(self, client: redis.Redis, job_id: str) -> None:
+        job = await self.get(job_id)
+        if job is None or job['status'] != QUEUED:
+            await client.lrem(JOBS_CLAIMED_KEY, 1, job_id)
+            return # Отменена или истекла, пока ждала в очереди
+        job_type = JOB_TYPES.get(job['type'])
+        if job_type is None:
+            await self._finish(client, job_id, job['user_id'], FAILED, error=f"Unknown job type: {job['type']}")
+            return
+
+        now = time.time()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(_job_key(job_id), mapping={'status': RUNNING, 'started_at': str(now)})
+            pipe.hincrby(_job_key(job_id), 'attempts', 1)
+            pipe.zadd(JOBS_RUNNING_KEY, {job_id: now})
+            pipe.lrem(JOBS_CLAIMED_KEY, 1, job_id)
+            await pipe.execute()
+        heartbeat = asyncio.create_task(self._heartbeat(client, job_id))
+        set_upstream_priority(Priority.BULK)
+        set_upstream_user(job.get('upstream_user') or str(job['user_id']))
+        context = JobContext(self, client, job_id, job['user_id'])
+        started = time.perf_counter()
+        try:
+            await context.check_cancelled(force=True)
+            summary = await job_type.handler(context, job_type.params_model.model_validate(job['params']))
+        except JobCancelled:
+            logger.info(f"Job {job_id} cancelled after {time.perf_counter() - started:.1f}s.")
+            await self._finish(client, job_id, job['user_id'], CANCELLED)
+        except asyncio.CancelledError:
+            # Процесс останавливается: задача возвращается в очередь и начнется заново.
+            # Если процесс убит без остановки, задачу вернет reap_expired по истечении аренды
+            logger.warning(f"Job {job_id} interrupted by shutdown, requeueing it.")
+            await self._requeue(client, job_id)
+            raise
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({job['type']}) failed: {e}")
+            await self._finish(client, job_id, job['user_id'], FAILED, error=str(e) or type(e).__name__)
+        else:
+            logger.info(f"Job {job_id} ({job['type']}) succeeded in {time.perf_counter() - started:.1f}s.")
+            await self._finish(client, job_id, job['user_id'], SUCCEEDED, summary=summary)
+        finally:
+            heartbeat.cancel()
+
+    async def run_worker(self) -> None:
+        """
+        Цикл обработчика: забирает задачи из общей очереди по одной.
+        BLMOVE атомарно переносит задачу в JOBS_CLAIMED_KEY: если воркер умрет до запуска, ее вернет reap_expired.
+        """
+        while True:
+            try:
+                client = self._redis()
+                job_id = await client.blmove(JOBS_QUEUE_KEY, JOBS_CLAIMED_KEY, settings.jobs_poll_timeout_seconds)
+            except (redis.RedisError, JobQueueUnavailable) as e:
+                logger.warning(f"Job queue unavailable: {e}")
+                await asyncio.sleep(settings.jobs_poll_timeout_seconds)
+                continue
+            if job_id:
+                # Каждая задача - в своем контексте: приоритет и пользователь не переходят на следующую
+                await asyncio.create_task(self._execute(client, job_id))
+
+    async def run_pending(self) -> int:
+        """Выполняет все задачи из очереди в текущем процессе, по одной. Возвращает их количество."""
+        client = self._redis()
+        processed = 0
+        while (job_id := await client.lmove(JOBS_QUEUE_KEY, JOBS_CLAIMED_KEY)) is not None:
+            await asyncio.create_task(self._execute(client, job_id))
+            processed += 1
+        return processed
+
+
+job_queue = JobQueue()
@@ -0,0 +1,146 @@
+# app/core/lifespan.py
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.database import engine, init_db, migrate_db, warm_db_pool
+from app.core.http_clients import close_http_client, get_http_client
+from app.core.jobs import job_queue
+from app.core.periodic import CronTrigger, IntervalTrigger, periodic_scheduler
+from app.core.quota_ledger import QUOTA_TIMEZONE
+from app.core.redis_client import close_redis_pool, get_redis
+from app.core.youtube import get_discovery_document
+from app.core.youtube_client_manager import api_key_manager
+from app.services.channel_stats_refresher import refresh_favorite_channel_stats
+from app.services.comment_archive import comment_archive
+from app.services.local_index import local_index
+from app.services.search_prewarmer import prewarm_popular_searches
+from app.services.video_catalog import video_catalog
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """Результат прогрева: готовность, общее время и время каждой фазы (для /readyz и логов)."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready = False
+        self.duration_ms: Optional[float] = None
+        self.phases_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    def as_dict(self) -> Dict:
+        return {
+            'ready': self.ready,
+            'duration_ms': self.duration_ms,
+            'budget_ms': settings.startup_budget_seconds * 1000,
+            'phases_ms': self.phases_ms,
+            'errors': self.errors,
+        }
+
+
+startup_state = StartupState()
+
+# Фоновые задачи, запущенные при старте (останавливаются при выключении)
+background_tasks: List[asyncio.Task] = []
+
+
+async def _warm_database():
+    if settings.db_migrate_on_startup:
+        await asyncio.to_thread(migrate_db)
+    if settings.db_create_all:
+        await asyncio.to_thread(init_db)
+    await asyncio.to_thread(warm_db_pool, settings.db_pool_warm_connections)
+
+
+async def _warm_redis():
+    client = get_redis()
+    if client is not None:
+        await client.ping()
+
+
+async def _warm_youtube_clients():
+    # Разбор discovery-документа и создание клиентов ключей - CPU-работа, выносим из event loop
+    await asyncio.to_thread(get_discovery_document)
+    await asyncio.to_thread(api_key_manager.warm_up)
+
+
+async def _warm_http_client():
+    get_http_client()
+
+
+async def _run_phase(name: str, warm: Callable[[], Awaitable[None]]):
+    started = time.perf_counter()
+    try:
+        await warm()
+    except Exception as e:
+        # Ошибка прогрева не мешает старту: зависимость проверит /readyz, запрос создаст ресурс сам
+        startup_state.errors[name] = str(e)
+        logger.error(f"Startup phase '{name}' failed: {e}")
+    startup_state.phases_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def warm_up():
+    """Параллельно прогревает пул БД, пул Redis, discovery-документ и общие HTTP-клиенты."""
+    started = time.perf_counter()
+    await asyncio.gather(
+        _run_phase('database', _warm_database),
+        _run_phase('redis', _warm_redis),
+        _run_phase('youtube_clients', _warm_youtube_clients),
+        _run_phase('http_client', _warm_http_client),
+    )
+    startup_state.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    startup_state.ready = True
+
+    if startup_state.duration_ms > settings.startup_budget_seconds * 1000:
+        logger.warning(f"Startup took {startup_state.duration_ms} ms, over the {settings.startup_budget_seconds} s budget: {startup_state.phases_ms}")
+    else:
+        logger.info(f"Startup completed in {startup_state.duration_ms} ms: {startup_state.phases_ms}")
+
+
+def register_periodic_tasks():
+    """Периодические задачи: выполняются один раз на кластер (лидером), а не в каждом воркере."""
+    if settings.channel_stats_refresh_enabled:
+        periodic_scheduler.register(
+            'channel_stats_refresh', refresh_favorite_channel_stats,
+            IntervalTrigger(settings.channel_stats_refresh_interval_seconds), jitter_seconds=settings.periodic_jitter_seconds,
+        )
+    if settings.jobs_workers_enabled:
+        periodic_scheduler.register(
+            'jobs_reaper', job_queue.reap_expired, IntervalTrigger(settings.jobs_reaper_interval_seconds),
+        )
+    if settings.search_prewarm_enabled:
+        periodic_scheduler.register(
+            'search_prewarm', prewarm_popular_searches,
+            CronTrigger(settings.search_prewarm_cron, tz=QUOTA_TIMEZONE), jitter_seconds=settings.periodic_jitter_seconds,
+        )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await warm_up()
+    register_periodic_tasks()
+    if periodic_scheduler.tasks:
+        background_tasks.append(asyncio.create_task(periodic_scheduler.run()))
+    if settings.comment_archive_enabled:
+        background_tasks.append(asyncio.create_task(comment_archive.run()))
+    if settings.local_index_enabled:
+        background_tasks.append(asyncio.create_task(local_index.run()))
+    if video_catalog.enabled:
+        background_tasks.append(asyncio.create_task(video_catalog.run()))
+    if settings.jobs_workers_enabled:
+        # Прерванные остановкой задачи возвращаются в очередь, потерянные вместе с процессом - по истечении аренды (app/core/jobs.py)
+        background_tasks.extend(asyncio.create_task(job_queue.run_worker()) for _ in range(settings.jobs_worker_concurrency))
+    yield
+    startup_state.ready = False
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await close_http_client()
+    await close_redis_pool()
+    engine.dispose()
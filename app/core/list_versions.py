@@ -0,0 +1,71 @@
+# app/core/list_versions.py
+import hashlib
+import logging
+import time
+from typing import Any, Optional
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+# Счетчик версии списка пользователя: увеличивается при каждом изменении списка.
+# ETag строится из версии, поэтому проверка If-None-Match не требует чтения списка из БД.
+LIST_VERSION_KEY_PREFIX = "list_version"
+LIST_VERSION_TTL_SECONDS = 30 * 24 * 60 * 60
+
+FAVORITES_LIST = "favorites"
+COLLECTIONS_LIST = "collections"
+# Общая версия для изменений, затрагивающих списки всех пользователей (фоновое обновление статистики каналов)
+GLOBAL_SCOPE = "global"
+
+
+def _version_key(list_name: str, scope: Any) -> str:
+    return f"{LIST_VERSION_KEY_PREFIX}:{list_name}:{scope}"
+
+
+async def bump_list_version(redis_client: Optional[redis.Redis], list_name: str, scope: Any) -> None:
+    """Отмечает изменение списка. Вызывать ПОСЛЕ коммита, иначе клиент может закэшировать старые данные с новым ETag."""
+    if redis_client is None:
+        return
+    key = _version_key(list_name, scope)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            # Если счетчика нет, начинаем с текущего времени: после вытеснения ключа версии не повторятся
+            pipe.set(key, time.time_ns(), nx=True, ex=LIST_VERSION_TTL_SECONDS)
+            pipe.incr(key)
+            pipe.expire(key, LIST_VERSION_TTL_SECONDS)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Redis error bumping list version {key}: {e}")
+
+
+async def get_list_etag(redis_client: Optional[redis.Redis], list_name: str, user_id: Any, *params: Any) -> Optional[str]:
+    """
+    Возвращает сильный ETag для списка пользователя с учетом параметров запроса (limit, cursor...).
+    None, если Redis недоступен - тогда условные запросы не поддерживаются.
+    """
+    if redis_client is None:
+        return None
+    user_key = _version_key(list_name, user_id)
+    global_key = _version_key(list_name, GLOBAL_SCOPE)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(user_key, time.time_ns(), nx=True, ex=LIST_VERSION_TTL_SECONDS)
+            pipe.set(global_key, time.time_ns(), nx=True, ex=LIST_VERSION_TTL_SECONDS)
+            pipe.get(user_key)
+            pipe.get(global_key)
+            _, _, user_version, global_version = await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Redis error reading list version {user_key}: {e}")
+        return None
+
+    raw = "|".join(str(part) for part in (list_name, user_id, user_version, global_version, *params))
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Проверяет заголовок If-None-Match (список ETag через запятую или "*")."""
+    if not if_none_match or not etag:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
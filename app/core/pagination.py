@@ -0,0 +1,63 @@
+# app/core/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+from sqlmodel import Session
+
+
+def encode_cursor(*parts: Any) -> str:
+    """Упаковывает значения ключа последней записи страницы в непрозрачный курсор."""
+    raw = json.dumps(list(parts), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Распаковывает курсор, созданный encode_cursor.
+    Возвращает 400, если курсор поврежден или содержит другое число значений.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        parts = None
+
+    if not isinstance(parts, list) or len(parts) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+    return parts
+
+
+def paginate_by_added_at(session: Session, query, model, limit: Optional[int], cursor: Optional[str]) -> Tuple[List[Any], Optional[str]]:
+    """
+    Keyset-пагинация по (added_at, id) от новых к старым.
+    Опирается на составной индекс (user_id, added_at, id): страница читается без OFFSET,
+    стоимость не растет с номером страницы.
+    limit=None - все оставшиеся записи одной страницей.
+    Возвращает (записи страницы, курсор следующей страницы или None).
+    """
+    if cursor:
+        added_at_raw, last_id = decode_cursor(cursor, 2)
+        try:
+            added_at = datetime.fromisoformat(added_at_raw)
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+        query = query.where(or_(
+            model.added_at < added_at,
+            and_(model.added_at == added_at, model.id < last_id),
+        ))
+
+    query = query.order_by(model.added_at.desc(), model.id.desc())
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = session.exec(query).all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].added_at.isoformat(), rows[-1].id)
+    return rows, next_cursor
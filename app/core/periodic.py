@@ -0,0 +1,305 @@
+# app/core/periodic.py
+import asyncio
+import logging
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.upstream_scheduler import Priority, set_upstream_priority
+
+logger = logging.getLogger(__name__)
+
+# Лидер - процесс, который запускает периодические задачи для всего кластера
+PERIODIC_LEADER_KEY = "periodic:leader"
+PERIODIC_LOCK_KEY_PREFIX = "periodic:lock"   # Задача выполняется (защита от наложения запусков)
+PERIODIC_NEXT_RUN_KEY = "periodic:next_run"  # HASH: задача -> время следующего запуска (переживает смену лидера)
+PERIODIC_STATS_KEY_PREFIX = "periodic:stats" # HASH: метрики последнего запуска задачи
+
+
+class IntervalTrigger:
+    """Запуск каждые seconds секунд; первый - через seconds после старта."""
+
+    def __init__(self, seconds: int):
+        self.seconds = max(1, seconds)
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+    def __repr__(self) -> str:
+        return f"every {self.seconds}s"
+
+
+def _parse_cron_field(raw: str, low: int, high: int) -> Set[int]:
+    """Поле cron: "*", "*/n", "a", "a-b", "a-b/n" и списки через запятую."""
+    values: Set[int] = set()
+    for part in raw.split(","):
+        part, _, step_raw = part.partition("/")
+        step = int(step_raw) if step_raw else 1
+        if part == "*":
+            first, last = low, high
+        else:
+            start, _, end = part.partition("-")
+            first, last = int(start), int(end or start)
+        if first < low or last > high or first > last or step < 1:
+            raise ValueError(f"Cron field {raw!r} is out of range {low}-{high}")
+        values.update(range(first, last + 1, step))
+    return values
+
+
+class CronTrigger:
+    """
+    Пятипольное cron-выражение "минута час день_месяца месяц день_недели" в часовом поясе tz.
+    День недели: 0 или 7 - воскресенье. Если заданы оба дня (месяца и недели), подходит любой из них, как в cron.
+    """
+
+    def __init__(self, expression: str, tz: tzinfo = timezone.utc):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression!r}")
+        self.expression = expression
+        self.tz = tz
+        self.minutes = sorted(_parse_cron_field(fields[0], 0, 59))
+        self.hours = sorted(_parse_cron_field(fields[1], 0, 23))
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _parse_cron_field(fields[4], 0, 7)}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays # weekday(): 0 - понедельник
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        start = moment.astimezone(self.tz).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start
+        for _ in range(5 * 366):
+            if self._day_matches(day):
+                same_day = day.date() == start.date()
+                for hour in self.hours:
+                    if same_day and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        if same_day and hour == start.hour and minute < start.minute:
+                            continue
+                        return day.replace(hour=hour, minute=minute).astimezone(timezone.utc)
+            day = (day + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+    def __repr__(self) -> str:
+        return f"cron '{self.expression}' ({self.tz})"
+
+
+class PeriodicTask:
+    def __init__(self, name: str, func: Callable[[], Awaitable[Any]], trigger, jitter_seconds: float, lock_ttl_seconds: int):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.jitter_seconds = jitter_seconds
+        self.lock_ttl_seconds = lock_ttl_seconds
+
+    def next_run(self, after: datetime) -> float:
+        # Случайный сдвиг: задачи разных инсталляций и соседние задачи не стартуют в одну секунду
+        return self.trigger.next_after(after).timestamp() + random.uniform(0, self.jitter_seconds)
+
+
+async def _compare_and(client: redis.Redis, key: str, token: str, action: Callable) -> bool:
+    """Выполняет action(pipe) над key, только если значение ключа - token (WATCH/MULTI)."""
+    async with client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(key)
+            if await pipe.get(key) != token:
+                await pipe.unwatch()
+                return False
+            pipe.multi()
+            action(pipe)
+            await pipe.execute()
+            return True
+        except redis.WatchError:
+            return False
+
+
+class PeriodicScheduler:
+    """
+    Периодические задачи, выполняемые один раз на весь кластер, а не в каждом воркере uvicorn.
+    - Цикл работает в каждом процессе, но запускает задачи только лидер: владелец ключа periodic:leader
+      (SET NX с TTL, продлевается каждый тик). Упавший лидер теряет ключ через periodic_leader_ttl_seconds.
+    - Время следующего запуска хранится в Redis, поэтому новый лидер продолжает расписание.
+    - Пока задача выполняется, она держит свою блокировку: следующий запуск, наступивший раньше
+      окончания, пропускается (skipped), а не накладывается.
+    - Метрики последнего запуска (время, длительность, статус, ошибка, счетчики) - в periodic:stats:{name}.
+    Без Redis процесс считает себя лидером и выполняет задачи сам.
+    """
+
+    def __init__(self, redis_factory: Callable[[], Optional[redis.Redis]] = get_redis):
+        self._redis_factory = redis_factory
+        self.instance_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self.tasks: Dict[str, PeriodicTask] = {}
+        self.is_leader = False
+        self._running: Dict[str, asyncio.Task] = {}
+        self._local_next_run: Dict[str, float] = {}
+
+    def register(self, name: str, func: Callable[[], Awaitable[Any]], trigger, jitter_seconds: float = 0, lock_ttl_seconds: Optional[int] = None) -> None:
+        """lock_ttl_seconds - на сколько продлевается блокировка задачи (продлевается, пока задача работает)."""
+        self.tasks[name] = PeriodicTask(name, func, trigger, jitter_seconds, lock_ttl_seconds or settings.periodic_lock_ttl_seconds)
+
+    async def _elect(self, client: redis.Redis) -> bool:
+        ttl = settings.periodic_leader_ttl_seconds
+        if await client.set(PERIODIC_LEADER_KEY, self.instance_id, nx=True, ex=ttl):
+            return True
+        return await _compare_and(client, PERIODIC_LEADER_KEY, self.instance_id, lambda pipe: pipe.expire(PERIODIC_LEADER_KEY, ttl))
+
+    async def _hold_lock(self, client: redis.Redis, task: PeriodicTask) -> None:
+        key = f"{PERIODIC_LOCK_KEY_PREFIX}:{task.name}"
+        while True:
+            await asyncio.sleep(task.lock_ttl_seconds / 3)
+            if not await _compare_and(client, key, self.instance_id, lambda pipe: pipe.expire(key, task.lock_ttl_seconds)):
+                logger.warning(f"Periodic task '{task.name}' lost its lock while running.")
+                return
+
+    async def _record(self, client: Optional[redis.Redis], name: str, mapping: Dict[str, Any], counter: Optional[str] = None) -> None:
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                if mapping:
+                    pipe.hset(f"{PERIODIC_STATS_KEY_PREFIX}:{name}", mapping={k: str(v) for k, v in mapping.items()})
+                if counter:
+                    pipe.hincrby(f"{PERIODIC_STATS_KEY_PREFIX}:{name}", counter, 1)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not record periodic task stats for '{name}': {e}")
+
+    async def _execute(self, client: Optional[redis.Redis], task: PeriodicTask) -> None:
+        set_upstream_priority(Priority.BACKGROUND)
+        lock_keeper = asyncio.create_task(self._hold_lock(client, task)) if client is not None else None
+        started_at = time.time()
+        started = time.perf_counter()
+        await self._record(client, task.name, {'last_started_at': started_at, 'last_instance': self.instance_id, 'last_status': 'running'})
+        status, error, result = 'succeeded', '', None
+        try:
+            result = await task.func()
+        except asyncio.CancelledError:
+            status = 'cancelled' # Процесс останавливается
+            raise
+        except Exception as e:
+            status, error = 'failed', str(e) or type(e).__name__
+            logger.exception(f"Periodic task '{task.name}' failed: {e}")
+        finally:
+            if lock_keeper is not None:
+                lock_keeper.cancel()
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            await self._record(client, task.name, {
+                'last_finished_at': time.time(), 'last_duration_ms': duration_ms,
+                'last_status': status, 'last_error': error, 'last_result': '' if result is None else result,
+            }, counter={'succeeded': 'runs', 'failed': 'failures'}.get(status))
+            if client is not None:
+                key = f"{PERIODIC_LOCK_KEY_PREFIX}:{task.name}"
+                try:
+                    await _compare_and(client, key, self.instance_id, lambda pipe: pipe.delete(key))
+                except redis.RedisError as e:
+                    logger.warning(f"Could not release lock of periodic task '{task.name}': {e}")
+        logger.info(f"Periodic task '{task.name}' {status} in {duration_ms} ms (result: {result}).")
+
+    async def _dispatch(self, client: Optional[redis.Redis], task: PeriodicTask, now: datetime) -> None:
+        if client is None:
+            next_run = self._local_next_run.setdefault(task.name, task.next_run(now))
+        else:
+            raw = await client.hget(PERIODIC_NEXT_RUN_KEY, task.name)
+            next_run = float(raw) if raw else None
+            if next_run is None:
+                next_run = task.next_run(now)
+                await client.hset(PERIODIC_NEXT_RUN_KEY, task.name, str(next_run))
+        if now.timestamp() < next_run:
+            return
+
+        # Пропущенные за время простоя запуски не догоняются: следующий - по расписанию от текущего момента
+        following = task.next_run(now)
+        if client is None:
+            self._local_next_run[task.name] = following
+            acquired = task.name not in self._running
+        else:
+            await client.hset(PERIODIC_NEXT_RUN_KEY, task.name, str(following))
+            acquired = task.name not in self._running and await client.set(
+                f"{PERIODIC_LOCK_KEY_PREFIX}:{task.name}", self.instance_id, nx=True, ex=task.lock_ttl_seconds,
+            )
+        await self._record(client, task.name, {'next_run_at': following})
+        if not acquired:
+            logger.warning(f"Periodic task '{task.name}' is still running, skipping this run.")
+            await self._record(client, task.name, {}, counter='skipped')
+            return
+
+        runner = asyncio.create_task(self._execute(client, task))
+        self._running[task.name] = runner
+        runner.add_done_callback(lambda _: self._running.pop(task.name, None))
+
+    async def tick(self) -> None:
+        """Один проход: выборы лидера и запуск наступивших задач (для тестов - без цикла run())."""
+        client = self._redis_factory()
+        try:
+            leader = await self._elect(client) if client is not None else True
+        except redis.RedisError as e:
+            logger.warning(f"Periodic scheduler: Redis unavailable, skipping tick: {e}")
+            return
+        if leader != self.is_leader:
+            logger.info(f"Periodic scheduler {self.instance_id} {'became' if leader else 'is no longer'} the leader.")
+            self.is_leader = leader
+        if not leader:
+            return
+        now = datetime.now(timezone.utc)
+        for task in self.tasks.values():
+            try:
+                await self._dispatch(client, task, now)
+            except redis.RedisError as e:
+                logger.warning(f"Periodic scheduler: could not dispatch '{task.name}': {e}")
+
+    async def run(self) -> None:
+        logger.info(f"Periodic scheduler {self.instance_id} started: " + ", ".join(f"{t.name} ({t.trigger})" for t in self.tasks.values()))
+        try:
+            while True:
+                await self.tick()
+                await asyncio.sleep(settings.periodic_tick_seconds)
+        finally:
+            for runner in list(self._running.values()):
+                runner.cancel()
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+            client = self._redis_factory()
+            if client is not None and self.is_leader:
+                try:
+                    # Передаем лидерство сразу, не дожидаясь истечения TTL
+                    await _compare_and(client, PERIODIC_LEADER_KEY, self.instance_id, lambda pipe: pipe.delete(PERIODIC_LEADER_KEY))
+                except redis.RedisError:
+                    pass
+            self.is_leader = False
+
+    async def metrics(self) -> Dict:
+        """Лидер и метрики задач по всему кластеру (для /readyz)."""
+        result: Dict[str, Any] = {'instance': self.instance_id, 'is_leader': self.is_leader, 'running': sorted(self._running), 'tasks': {}}
+        client = self._redis_factory()
+        if client is None:
+            return result
+        try:
+            result['leader'] = await client.get(PERIODIC_LEADER_KEY)
+            async with client.pipeline(transaction=False) as pipe:
+                for name in self.tasks:
+                    pipe.hgetall(f"{PERIODIC_STATS_KEY_PREFIX}:{name}")
+                stats: List[Dict] = await pipe.execute()
+            result['tasks'] = dict(zip(self.tasks, stats))
+        except redis.RedisError as e:
+            result['error'] = str(e)
+        return result
+
+
+periodic_scheduler = PeriodicScheduler()
@@ -0,0 +1,81 @@
+# app/core/quota_ledger.py
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from zoneinfo import ZoneInfo
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Учет израсходованной квоты ключей приложения за текущие сутки квоты: HASH, поле - отпечаток ключа
+QUOTA_LEDGER_KEY_PREFIX = "quota:ledger"
+QUOTA_LEDGER_KEY_TTL_SECONDS = 2 * 24 * 60 * 60
+# Квота YouTube Data API сбрасывается в полночь по тихоокеанскому времени
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+# Стоимость методов в units; все остальные методы Data API стоят 1 unit
+QUOTA_COSTS = {
+    "youtube.search.list": 100,
+}
+
+
+def quota_day(now: Optional[datetime] = None) -> str:
+    return (now or datetime.now(QUOTA_TIMEZONE)).astimezone(QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+
+def quota_hour(now: Optional[datetime] = None) -> int:
+    """Текущий час суток квоты (0-23, тихоокеанское время)."""
+    return (now or datetime.now(QUOTA_TIMEZONE)).astimezone(QUOTA_TIMEZONE).hour
+
+
+def method_cost(method_id: Optional[str]) -> int:
+    return QUOTA_COSTS.get(method_id or "", 1)
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Ключи не хранятся в Redis в открытом виде."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def _ledger_key(day: Optional[str] = None) -> str:
+    return f"{QUOTA_LEDGER_KEY_PREFIX}:{day or quota_day()}"
+
+
+async def record_usage(redis_client: Optional[redis.Redis], api_key: str, method_id: Optional[str]) -> None:
+    """Списывает стоимость вызова метода с ключа в учете текущих суток."""
+    if redis_client is None:
+        return
+    ledger_key = _ledger_key()
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(ledger_key, key_fingerprint(api_key), method_cost(method_id))
+            pipe.expire(ledger_key, QUOTA_LEDGER_KEY_TTL_SECONDS)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not record quota usage: {e}")
+
+
+async def get_used_units(redis_client: Optional[redis.Redis]) -> Dict[str, int]:
+    """Израсходованные за текущие сутки units по отпечаткам ключей."""
+    if redis_client is None:
+        return {}
+    try:
+        raw = await redis_client.hgetall(_ledger_key())
+    except redis.RedisError as e:
+        logger.warning(f"Could not read quota ledger: {e}")
+        return {}
+    return {fingerprint: int(units) for fingerprint, units in raw.items()}
+
+
+async def get_spare_units(redis_client: Optional[redis.Redis], api_keys: Iterable[str]) -> int:
+    """
+    Остаток квоты на сегодня по переданным (доступным) ключам.
+    Без Redis учет недоступен - возвращается 0, чтобы фоновые задачи не тратили квоту вслепую.
+    """
+    if redis_client is None:
+        return 0
+    used = await get_used_units(redis_client)
+    return sum(max(0, settings.youtube_daily_quota_per_key - used.get(key_fingerprint(key), 0)) for key in api_keys)
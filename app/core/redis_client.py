@@ -1,8 +1,7 @@
 # app/core/redis_client.py
 import redis.asyncio as redis # Используем async версию клиента
 import logging
-from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 from fastapi import HTTPException, status # Импортируем HTTPException
 
 from app.core.config import settings
@@ -96,15 +95,28 @@ async def get_redis_client() -> AsyncGenerator[redis.Redis, None]:
         pass
 
 
-# Lifespan manager для FastAPI (без изменений)
-@asynccontextmanager
-async def lifespan(app):
-    print("Application startup: Initializing database and Redis pool...")
-    from app.core.database import init_db
-    init_db()
-    create_redis_pool()
-    print("Initialization complete.")
-    yield
-    print("Application shutdown: Closing Redis pool...")
-    await close_redis_pool()
-    print("Redis pool closed.")
\ No newline at end of file
+def get_redis() -> Optional[redis.Redis]:
+    """
+    Возвращает клиент Redis из общего пула или None, если Redis не настроен.
+    Для кода вне запроса (фоновые задачи, сервисы), которому кэш не обязателен.
+    """
+    pool = create_redis_pool()
+    if pool is None:
+        return None
+    return redis.Redis(connection_pool=pool)
+
+
+async def get_optional_redis_client() -> AsyncGenerator[Optional[redis.Redis], None]:
+    """
+    FastAPI зависимость для эндпоинтов, где Redis используется только как кэш.
+    В отличие от get_redis_client, не возвращает 503 при недоступности Redis, а отдает None.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            await client.ping()
+        except redis.RedisError as e:
+            logger.warning(f"Redis unavailable, continuing without cache: {e}")
+            client = None
+    yield client
+
@@ -1,7 +1,11 @@
 # app/core/security.py
+import time
+from typing import Optional
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from starlette.datastructures import Headers
+from starlette.requests import cookie_parser
 
 from app.core.config import settings
 
@@ -24,4 +28,20 @@ def decode_access_token(token: str):
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.algorithm])
         return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+# Cookie access_token из заголовков запроса (для ASGI-middleware, где еще нет Request.cookies)
+def access_token_from_headers(headers: Headers) -> Optional[str]:
+    return cookie_parser(headers.get("cookie", "")).get("access_token") or None
+
+
+# ID пользователя из действующей сессии: подпись и exp JWT, а также срок Google-токена внутри него
+# проверяются так же, как в get_google_credentials_from_token. Для невалидной сессии - None.
+def session_user_id(token: str) -> Optional[str]:
+    payload = decode_access_token(token)
+    if not payload:
+        return None
+    google_token_expires_at = payload.get("google_token_expires_at")
+    if not isinstance(google_token_expires_at, (int, float)) or time.time() >= google_token_expires_at:
+        return None
+    return payload.get("sub") or None
@@ -0,0 +1,215 @@
+# app/core/upstream_scheduler.py
+import asyncio
+import hashlib
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import AsyncIterator, Deque, Dict, Iterator
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.security import access_token_from_headers
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Класс приоритета вызова YouTube API (меньше - важнее)."""
+    INTERACTIVE = 0 # Пользователь ждет ответа: поиск, карточки видео, первая страница комментариев
+    BULK = 1        # Массовые операции по запросу пользователя: импорт избранного, сбор комментариев
+    BACKGROUND = 2  # Фоновые задачи: обновление статистики каналов, прогрев кэша поиска
+
+
+ANONYMOUS_USER = "anonymous"
+
+# Задаются UpstreamContextMiddleware для запроса и наследуются задачами, созданными внутри него
+_current_priority: ContextVar[Priority] = ContextVar("upstream_priority", default=Priority.INTERACTIVE)
+_current_user: ContextVar[str] = ContextVar("upstream_user", default=ANONYMOUS_USER)
+
+
+def current_upstream_user() -> str:
+    return _current_user.get()
+
+
+def current_upstream_priority() -> Priority:
+    return _current_priority.get()
+
+
+def set_upstream_priority(priority: Priority) -> None:
+    """Задает приоритет до конца текущей задачи (для фоновых циклов)."""
+    _current_priority.set(priority)
+
+
+def set_upstream_user(user: str) -> None:
+    """Задает пользователя до конца текущей задачи (фоновая работа, запущенная от имени пользователя)."""
+    _current_user.set(user)
+
+
+@contextmanager
+def upstream_priority(priority: Priority) -> Iterator[None]:
+    """Временно меняет приоритет вызовов API внутри блока."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("future", "key", "user", "priority", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, key: str, user: str, priority: Priority):
+        self.future = future
+        self.key = key
+        self.user = user
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+
+
+class UpstreamScheduler:
+    """
+    Очередь вызовов YouTube API внутри процесса.
+    - Слот выдается сначала более приоритетному классу (Priority).
+    - Внутри класса пользователи обслуживаются по кругу: у каждого своя FIFO-очередь,
+      поэтому массовый импорт одного пользователя не задерживает других.
+    - Не больше max_concurrency вызовов одновременно и не больше per_key_concurrency на один ключ.
+    - interactive_reserved слотов доступны только интерактивным вызовам: фоновая нагрузка
+      не может занять все слоты.
+    """
+
+    def __init__(self, max_concurrency: int, per_key_concurrency: int, interactive_reserved: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_key_concurrency = max(1, per_key_concurrency)
+        self.non_interactive_limit = max(1, self.max_concurrency - interactive_reserved)
+        self._queues: Dict[Priority, "OrderedDict[str, Deque[_Waiter]]"] = {priority: OrderedDict() for priority in Priority}
+        self._active = 0
+        self._active_non_interactive = 0
+        self._active_by_key: Counter = Counter()
+        # Метрики
+        self._granted: Counter = Counter()
+        self._wait_seconds: Counter = Counter()
+
+    def _has_capacity(self, priority: Priority) -> bool:
+        if self._active >= self.max_concurrency:
+            return False
+        return priority == Priority.INTERACTIVE or self._active_non_interactive < self.non_interactive_limit
+
+    def _grant(self, waiter: _Waiter) -> None:
+        self._active += 1
+        self._active_by_key[waiter.key] += 1
+        if waiter.priority != Priority.INTERACTIVE:
+            self._active_non_interactive += 1
+        self._granted[waiter.priority.name] += 1
+        self._wait_seconds[waiter.priority.name] += time.perf_counter() - waiter.enqueued_at
+        waiter.future.set_result(None)
+
+    def _release(self, waiter: _Waiter) -> None:
+        self._active -= 1
+        self._active_by_key[waiter.key] -= 1
+        if not self._active_by_key[waiter.key]:
+            del self._active_by_key[waiter.key]
+        if waiter.priority != Priority.INTERACTIVE:
+            self._active_non_interactive -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for priority in Priority:
+            users = self._queues[priority]
+            progressed = True
+            while users and progressed and self._has_capacity(priority):
+                progressed = False
+                # Один слот на пользователя за проход; обслуженный пользователь уходит в конец круга
+                for user in list(users):
+                    if not self._has_capacity(priority):
+                        break
+                    queue = users[user]
+                    waiter = queue[0]
+                    if self._active_by_key[waiter.key] >= self.per_key_concurrency:
+                        continue # Ключ занят - очередь пользователя ждет, остальные идут дальше
+                    queue.popleft()
+                    if queue:
+                        users.move_to_end(user)
+                    else:
+                        del users[user]
+                    self._grant(waiter)
+                    progressed = True
+
+    def _remove(self, waiter: _Waiter) -> None:
+        users = self._queues[waiter.priority]
+        queue = users.get(waiter.user)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            del users[waiter.user]
+
+    @asynccontextmanager
+    async def slot(self, key: str) -> AsyncIterator[None]:
+        """Ожидает слот для вызова с ключом key (приоритет и пользователь берутся из контекста)."""
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), key, _current_user.get(), _current_priority.get())
+        self._queues[waiter.priority].setdefault(waiter.user, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(waiter) # Слот выдан одновременно с отменой
+            else:
+                self._remove(waiter)
+                self._dispatch()
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def as_dict(self) -> Dict:
+        return {
+            'active': self._active,
+            'active_non_interactive': self._active_non_interactive,
+            'queued': {priority.name: sum(len(q) for q in self._queues[priority].values()) for priority in Priority},
+            'granted': dict(self._granted),
+            'avg_wait_ms': {
+                name: round(self._wait_seconds[name] / count * 1000, 1) for name, count in self._granted.items()
+            },
+        }
+
+
+class UpstreamContextMiddleware:
+    """
+    Определяет пользователя запроса для справедливой очереди вызовов API:
+    хэш cookie access_token (сам токен в планировщик не попадает), без сессии - общий anonymous.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = access_token_from_headers(Headers(scope=scope))
+        user = hashlib.sha256(token.encode()).hexdigest()[:16] if token else ANONYMOUS_USER
+        user_token = _current_user.set(user)
+        priority_token = _current_priority.set(Priority.INTERACTIVE)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_priority.reset(priority_token)
+            _current_user.reset(user_token)
+
+
+# Один планировщик на процесс (воркер): лимиты действуют в пределах воркера
+upstream_scheduler = UpstreamScheduler(
+    max_concurrency=settings.upstream_max_concurrency,
+    per_key_concurrency=settings.upstream_per_key_concurrency,
+    interactive_reserved=settings.upstream_interactive_reserved,
+)
@@ -7,49 +7,139 @@
 # import os
 
 from app.core.config import settings
+from app.core.quota_ledger import record_usage
+from app.core.redis_client import get_redis
+from app.core.upstream_scheduler import current_upstream_user, upstream_scheduler
 from typing import Optional, Dict
 from datetime import datetime, timedelta, UTC, timezone # Добавляем timezone и UTC
+import asyncio
+import functools
+import json
+import threading
 import re
 
+import httplib2
+import google_auth_httplib2
+from urllib.parse import parse_qs, urlparse
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.discovery_cache import get_static_doc
+
 # Оставляем константы и вспомогательные функции
 YOUTUBE_API_SERVICE_NAME = 'youtube'
 YOUTUBE_API_VERSION = 'v3'
 # YOUTUBE_ANALYTICS_API_SERVICE_NAME = "youtubeAnalytics" # Пока не используем
 # YOUTUBE_ANALYTICS_API_VERSION = "v2"
 
-# --- Функции get_recent_views, get_total_videos_on_channel, get_channel_info, get_channel_views ---
-# --- должны теперь принимать объект 'youtube' (клиент API) как аргумент ---
+# --- Неблокирующее выполнение запросов googleapiclient ---
+# Клиент googleapiclient синхронный: .execute() блокирует event loop на всё время HTTP-запроса.
+# Выполняем запросы в пуле потоков. httplib2.Http не потокобезопасен, поэтому
+# у каждого потока пула свой экземпляр (соединения внутри потока переиспользуются).
+_thread_local = threading.local()
+
+
+def _get_thread_http(request):
+    """Возвращает http-объект текущего потока с теми же credentials, что и у запроса."""
+    http = getattr(_thread_local, 'http', None)
+    if http is None:
+        http = httplib2.Http(timeout=settings.youtube_http_timeout_seconds)
+        _thread_local.http = http
+
+    credentials = getattr(request.http, 'credentials', None)
+    if credentials is not None:
+        # Клиент пользователя (OAuth): оборачиваем http потока его credentials
+        return google_auth_httplib2.AuthorizedHttp(credentials, http=http)
+    # Клиент с developerKey: ключ уже в URI запроса
+    return http
+
+
+def _request_api_key(request) -> Optional[str]:
+    """Ключ приложения из URI запроса (None для запросов с OAuth-клиентом пользователя)."""
+    keys = parse_qs(urlparse(request.uri).query).get('key')
+    return keys[0] if keys else None
+
+
+async def execute_async(request):
+    """
+    Выполняет запрос googleapiclient в пуле потоков, не блокируя event loop.
+    Вызов ждет слот в очереди планировщика (app/core/upstream_scheduler.py): приоритет,
+    справедливость между пользователями и лимит одновременных вызовов на ключ.
+    Запросы с ключами приложения списываются в учет квоты (app/core/quota_ledger.py).
+    """
+    api_key = _request_api_key(request)
+    # Вызовы с OAuth-клиентом расходуют квоту пользователя - отдельный "ключ" на пользователя
+    scheduler_key = api_key or f"oauth:{current_upstream_user()}"
+    try:
+        async with upstream_scheduler.slot(scheduler_key):
+            return await asyncio.to_thread(lambda: request.execute(http=_get_thread_http(request)))
+    except HttpError as e:
+        # Отклоненный из-за квоты запрос не тарифицируется, остальные ошибки - тарифицируются
+        if api_key is not None and b'quotaExceeded' in (e.content or b''):
+            api_key = None
+        raise
+    finally:
+        if api_key is not None:
+            await record_usage(get_redis(), api_key, getattr(request, 'methodId', None))
+
+
+def partial_response(fields: str) -> Dict[str, str]:
+    """
+    Аргументы для метода .list(): параметр fields (partial response) - API возвращает только поля из маски.
+    Маска объявляется рядом с кодом, который читает ответ: поле, которого в ней нет, в ответе отсутствует.
+    Квоту fields не меняет, но уменьшает ответ, время передачи и разбор JSON.
+    При youtube_partial_responses_enabled=False - полные ответы.
+    """
+    if not settings.youtube_partial_responses_enabled:
+        return {}
+    return {'fields': fields}
 
-async def get_recent_views(youtube, video_id: str, days: int = 7) -> Optional[int]:
+
+@functools.lru_cache(maxsize=1)
+def get_discovery_document() -> Dict:
+    """
+    Разобранный discovery-документ YouTube Data API (из пакета googleapiclient, без сети).
+    Читается и разбирается один раз на процесс; прогревается при старте приложения.
+    """
+    return json.loads(get_static_doc(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION))
+
+
+def build_youtube_client(developer_key: Optional[str] = None, credentials=None):
+    """
+    Создает клиент YouTube Data API по закэшированному discovery-документу.
+    В отличие от build(), не читает и не разбирает документ при каждом вызове.
+    """
+    return build_from_document(get_discovery_document(), developerKey=developer_key, credentials=credentials)
+
+
+def get_uploads_playlist_id(channel_id: str) -> str:
     """
-    Получает количество просмотров видео за последние `days` дней с помощью YouTube Analytics API.
-    ПРИМЕЧАНИЕ: Эта функция требует прав yt-analytics.readonly и будет работать ТОЛЬКО для канала,
-    к которому пользователь дал доступ (обычно его собственный).
-    Требует другого клиента API (Analytics). Пока не используется активно.
+    Возвращает ID плейлиста загрузок канала ("UC..." -> "UU...").
+    Позволяет читать загрузки через playlistItems.list (1 unit) без channels.list.
     """
-    # try:
-    #     # Клиент Analytics нужно создавать отдельно с нужными credentials
-    #     # analytics = build(YOUTUBE_ANALYTICS_API_SERVICE_NAME, YOUTUBE_ANALYTICS_API_VERSION, credentials=youtube.credentials)
-    #     # ... остальная логика ...
-    #     return 0 # Заглушка
-    # except Exception as e:
-    #     print(f"Error in get_recent_views for video ID {video_id}: {e}")
-    #     return None
-    print(f"WARNING: get_recent_views is currently disabled/requires Analytics API setup.")
-    return 0 # Возвращаем 0 или None, т.к. функционал пока не активен с user credentials
+    if channel_id.startswith("UC"):
+        return "UU" + channel_id[2:]
+    return channel_id
+
+
+# --- Функции get_total_videos_on_channel, get_channel_info, get_channel_views ---
+# --- должны теперь принимать объект 'youtube' (клиент API) как аргумент ---
+# Прирост просмотров за период (бывшая get_recent_views) считается по снимкам статистики
+# без Analytics API: app/services/video_snapshots.py
 
-def get_total_videos_on_channel(youtube, channel_id: str) -> Optional[int]:
+async def get_total_videos_on_channel(youtube, channel_id: str) -> Optional[int]:
     """
     Получает общее количество видео на канале.
     Принимает аутентифицированный клиент 'youtube'.
     """
     try:
-        channel_response = youtube.channels().list(
+        channel_response = await execute_async(youtube.channels().list(
             part="statistics",
-            id=channel_id
-        ).execute()
+            id=channel_id,
+            **partial_response("items/statistics/videoCount"),
+        ))
 
-        if not channel_response["items"]:
+        # Пустой массив items в частичном ответе опускается
+        if not channel_response.get("items"):
             return None
         channel_stats = channel_response["items"][0]["statistics"]
 
@@ -66,34 +156,41 @@ def get_total_videos_on_channel(youtube, channel_id: str) -> Optional[int]:
       # traceback.print_exc() # Раскомментировать для детальной отладки
       return None
 
+# Поля channels.list, которые читает parse_channel_info
+CHANNEL_INFO_FIELDS = "items(id,snippet(title,thumbnails/high/url),statistics(subscriberCount,viewCount,videoCount))"
+
+
+def parse_channel_info(channel_data: Dict) -> Dict:
+    """Преобразует элемент channels.list (part=snippet,statistics) в словарь информации о канале."""
+    snippet = channel_data["snippet"]
+    statistics = channel_data["statistics"]
+    return {
+        'channel_title': snippet['title'],
+        'channel_thumbnail': snippet['thumbnails']['high']['url'],
+        'channel_subscribers': int(statistics['subscriberCount']) if 'subscriberCount' in statistics else 0,
+        'channel_url': f'https://www.youtube.com/channel/{channel_data["id"]}',
+        # Добавим недостающие поля, если они нужны дальше
+        'viewCount': int(statistics['viewCount']) if 'viewCount' in statistics else 0,
+        'videoCount': int(statistics['videoCount']) if 'videoCount' in statistics else 0,
+    }
+
+
 async def get_channel_info(youtube, channel_id: str) -> Optional[Dict]:
     """
     Получает информацию о канале по его ID.
     Принимает аутентифицированный клиент 'youtube'.
     """
     try:
-        channel_response = youtube.channels().list(
+        channel_response = await execute_async(youtube.channels().list(
             part="snippet,statistics",
-            id=channel_id
-        ).execute()
+            id=channel_id,
+            **partial_response(CHANNEL_INFO_FIELDS),
+        ))
 
-        if not channel_response["items"]:
+        if not channel_response.get("items"):
             return None
 
-        channel_data = channel_response["items"][0]
-        snippet = channel_data["snippet"]
-        statistics = channel_data["statistics"]
-
-        channel_info = {
-            'channel_title': snippet['title'],
-            'channel_thumbnail': snippet['thumbnails']['high']['url'],
-            'channel_subscribers': int(statistics['subscriberCount']) if 'subscriberCount' in statistics else 0,
-            'channel_url': f'https://www.youtube.com/channel/{channel_id}',
-            # Добавим недостающие поля, если они нужны дальше
-            'viewCount': int(statistics['viewCount']) if 'viewCount' in statistics else 0,
-            'videoCount': int(statistics['videoCount']) if 'videoCount' in statistics else 0,
-        }
-        return channel_info
+        return parse_channel_info(channel_response["items"][0])
 
     except Exception as e:
         print(f"Error in get_channel_info for channel ID {channel_id}: {e}")
@@ -6,14 +6,31 @@ from datetime import datetime, timezone
 
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import json
 
 from app.core.config import settings # Импортируем settings
+from app.core.youtube import build_youtube_client, execute_async
 
 logger = logging.getLogger(__name__)
 
 YOUTUBE_API_SERVICE_NAME = 'youtube'
 YOUTUBE_API_VERSION = 'v3'
 
+class ApiKeysExhaustedError(Exception):
+    """Нет ни одного доступного API-ключа (не настроены или все истощены на сегодня)."""
+
+
+def is_quota_error(e: HttpError) -> bool:
+    """Проверяет, что HttpError вызвана исчерпанием квоты ключа (403 quotaExceeded)."""
+    if e.status_code != 403:
+        return False
+    try:
+        error_details = json.loads(e.content.decode('utf-8'))
+        return any(err.get('reason') == 'quotaExceeded' for err in error_details.get('error', {}).get('errors', []))
+    except Exception:
+        return False
+
+
 class ApiKeyManager:
     def __init__(self):
         self.keys: List[str] = []
@@ -30,6 +47,7 @@ class ApiKeyManager:
         # Словарь для хранения временно истощенных ключей {index: exhausted_utc_datetime}
         self.exhausted_keys: Dict[int, datetime] = {}
         self._last_used_index: Optional[int] = None # Индекс ключа, который был выдан последним
+        self._clients: Dict[int, build] = {} # Клиенты создаются один раз на ключ и переиспользуются
 
     def _is_key_valid(self, index: int) -> bool:
         """Проверяет, не истощен ли ключ на сегодня."""
@@ -64,6 +82,10 @@ class ApiKeyManager:
         logger.warning("All API keys are currently marked as exhausted.")
         return None
 
+    def available_keys(self) -> List[str]:
+        """Ключи, не истощенные на сегодня."""
+        return [key for index, key in enumerate(self.keys) if self._is_key_valid(index)]
+
     def get_client(self) -> Optional[build]:
         """Возвращает YouTube API клиент с использованием доступного ключа."""
         if not self.keys:
@@ -80,33 +102,75 @@ class ApiKeyManager:
         api_key = self.keys[self.current_key_index]
         self._last_used_index = self.current_key_index # Запоминаем, какой ключ выдали
 
+        client = self._clients.get(self.current_key_index)
+        if client is not None:
+            logger.debug(f"Providing YouTube client using API key at index {self.current_key_index}")
+            return client
+
         try:
             # Используем developerKey для аутентификации
-            client = build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION, developerKey=api_key, cache_discovery=False)
-            logger.info(f"Providing YouTube client using API key at index {self.current_key_index}")
+            client = build_youtube_client(developer_key=api_key)
+            self._clients[self.current_key_index] = client
+            logger.info(f"Built YouTube client for API key at index {self.current_key_index}")
             return client
         except Exception as e:
             logger.exception(f"Failed to build YouTube client with key at index {self.current_key_index}")
             # Возможно, стоит пометить ключ как "плохой" не только из-за квоты? Пока нет.
             return None # Не удалось создать клиент
 
+    def warm_up(self) -> int:
+        """Создает клиенты для всех ключей заранее (при старте). Возвращает число созданных клиентов."""
+        for index, api_key in enumerate(self.keys):
+            if index not in self._clients:
+                self._clients[index] = build_youtube_client(developer_key=api_key)
+        return len(self._clients)
+
+    def mark_key_exhausted(self, index: int):
+        """Помечает ключ с указанным индексом как истощенный на сегодня."""
+        if index is None or index >= len(self.keys):
+            logger.error(f"Could not mark key as exhausted: invalid index {index}.")
+            return
+        now_utc = datetime.now(timezone.utc)
+        self.exhausted_keys[index] = now_utc
+        logger.warning(f"Marked API key at index {index} as exhausted for today ({now_utc.date()}).")
+        if self._last_used_index == index:
+            # Сбрасываем, чтобы не пометить его снова случайно
+            self._last_used_index = None
+        # Сразу пытаемся переключиться на следующий
+        next_available = self._get_next_available_index()
+        if next_available is not None:
+             self.current_key_index = next_available
+        else:
+             logger.error("Could not switch key: All keys seem exhausted after marking one.")
+
     def mark_last_used_key_exhausted(self):
         """Помечает последний использованный ключ как истощенный на сегодня."""
         if self._last_used_index is not None and self._last_used_index < len(self.keys):
-            now_utc = datetime.now(timezone.utc)
-            self.exhausted_keys[self._last_used_index] = now_utc
-            logger.warning(f"Marked API key at index {self._last_used_index} as exhausted for today ({now_utc.date()}).")
-            # Сбрасываем, чтобы не пометить его снова случайно
-            self._last_used_index = None
-            # Сразу пытаемся переключиться на следующий
-            next_available = self._get_next_available_index()
-            if next_available is not None:
-                 self.current_key_index = next_available
-            else:
-                 logger.error("Could not switch key: All keys seem exhausted after marking one.")
+            self.mark_key_exhausted(self._last_used_index)
         else:
              logger.error("Could not mark key as exhausted: No key was recently used or index invalid.")
 
+    async def execute(self, make_request):
+        """
+        Выполняет запрос с ключами пула, переключая ключ при ошибке квоты.
+        make_request(youtube) должен строить запрос для переданного клиента.
+        Остальные HttpError пробрасываются; если ключей не осталось - ApiKeysExhaustedError.
+        """
+        max_attempts = len(self.keys) + 1
+        for attempt in range(max_attempts):
+            youtube = self.get_client()
+            if youtube is None:
+                break
+            key_index = self._last_used_index
+            try:
+                return await execute_async(make_request(youtube))
+            except HttpError as e:
+                if not is_quota_error(e):
+                    raise
+                logger.warning(f"Quota exceeded for API key index {key_index} (attempt {attempt + 1}/{max_attempts}).")
+                self.mark_key_exhausted(key_index)
+        raise ApiKeysExhaustedError("No YouTube API keys available (not configured or exhausted).")
+
 # Создаем единственный экземпляр менеджера, который будет использоваться во всем приложении
 # Это делает его синглтоном в рамках одного процесса FastAPI
 api_key_manager = ApiKeyManager()
\ No newline at end of file
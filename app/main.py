@@ -5,11 +5,14 @@ from starlette.middleware.sessions import SessionMiddleware
 from fastapi import Depends
 from app.models.user import User
 
-from app.api import auth, favorites, search, getcomments, collections, videos
+from app.api import auth, favorites, search, getcomments, collections, videos, health, jobs
 from app.api.auth import get_current_user
 
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.lifespan import lifespan
+from app.core.http_cache import HTTPCacheMiddleware, ResponseCache, parse_cache_rules
+from app.core.compression import CompressionMiddleware
+from app.core.upstream_scheduler import UpstreamContextMiddleware
 
 from fastapi import FastAPI
 from fastapi.openapi.docs import (
@@ -18,7 +21,8 @@ from fastapi.openapi.docs import (
     get_swagger_ui_oauth2_redirect_html,
 )
 
-app = FastAPI(docs_url=None, redoc_url=None)
+# Прогрев зависимостей и фоновые задачи - в lifespan (app/core/lifespan.py)
+app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
 
 
 @app.get("/docs", include_in_schema=False)
@@ -50,6 +54,16 @@ async def redoc_html():
 async def read_user(current_user: User = Depends(get_current_user)):
     return {"message": f"Hello {current_user.username}"}
 
+# ETag / Cache-Control / 304 для /search и /videos (правила в settings.http_cache_rules)
+app.add_middleware(
+    HTTPCacheMiddleware,
+    rules=parse_cache_rules(settings.http_cache_rules),
+    cache=ResponseCache(max_entries=settings.http_cache_max_entries),
+)
+
+# Пользователь запроса для справедливой очереди вызовов YouTube API
+app.add_middleware(UpstreamContextMiddleware)
+
 app.add_middleware(
     SessionMiddleware,
     secret_key=settings.secret_key,  # Replace with a secure secret key
@@ -66,6 +80,9 @@ app.add_middleware(
     expose_headers=["*"],  # Expose all headers
 )
 
+# Сжатие ответов (zstd / br / gzip) - внешний слой, видит итоговые заголовки
+app.add_middleware(CompressionMiddleware)
+
 # Подключаем роутеры
 app.include_router(auth.router, prefix="", tags=["auth"])
 app.include_router(favorites.router, prefix="/favorites", tags=["favorites"])
@@ -73,12 +90,8 @@ app.include_router(collections.router, prefix="/collections", tags=["collections
 app.include_router(search.router, prefix="/search", tags=["search"])
 app.include_router(videos.router, prefix="/videos", tags=["info about videos and channels"])
 app.include_router(getcomments.router, prefix="/forai", tags=["for ai"])
-
-
-# Создаем таблицы при старте приложения
-@app.on_event("startup")
-async def on_startup():
-    init_db()
+app.include_router(jobs.router, prefix="/jobs", tags=["background jobs"])
+app.include_router(health.router, prefix="", tags=["health"])
 
 
 if __name__ == "__main__":
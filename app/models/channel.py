@@ -0,0 +1,16 @@
+# app/models/channel.py
+
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class Channel(SQLModel, table=True):
+    """Канал YouTube - одна строка на канал, общая для всех пользователей, добавивших его в избранное."""
+    channel_id: str = Field(primary_key=True)  # ID канала на YouTube
+    title: str
+    thumbnail: str  # URL логотипа
+    subscribers: int
+    video_count: int
+    last_published_at: datetime
+    channel_url: str
+    updated_at: datetime = Field(default_factory=datetime.now)  # Когда статистика последний раз получена из API
@@ -2,7 +2,7 @@ import uuid
 
 from pydantic import json
 from sqlalchemy import JSON
-from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint
+from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint, Index
 from typing import Optional, List
 from datetime import datetime, timezone
 
@@ -17,6 +17,7 @@ class Collection(SQLModel, table=True):
 
     __table_args__ = (
         UniqueConstraint("user_id", "collection_title"),
+        Index("ix_collection_user_added_at_id", "user_id", "added_at", "id"), # Для keyset-пагинации списка
     )
 
 from .user import User  # Импортируем User *после* определения FavoriteChannel,
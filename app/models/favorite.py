@@ -1,29 +1,27 @@
 # app/models/favorite.py
 
 import uuid
-from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint
+from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint, Index
 from typing import Optional
 from datetime import datetime, timezone
 
+from .channel import Channel
+
 class FavoriteChannel(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id")  # Внешний ключ на User
-    channel_id: str = Field(index=True)  # ID канала на YouTube
-    channel_title: str
-    channel_thumbnail: str  # URL логотипа
-    channel_subscribers: int
-    channel_video_count: int
-    channel_last_published_at: datetime
-    channel_url: str
+    channel_id: str = Field(foreign_key="channel.channel_id", index=True)  # ID канала на YouTube; данные канала - в Channel
     added_at: datetime = Field(default_factory=datetime.now)
 
     user: "User" = Relationship(back_populates="favorite_channels") #Связь с User
+    channel: Channel = Relationship()
 
     #Добавляем составной индекс, чтобы не хранить дубли
     __table_args__ = (
         UniqueConstraint("user_id", "channel_id"),
+        Index("ix_favoritechannel_user_added_at_id", "user_id", "added_at", "id"), # Для keyset-пагинации списка
     )
 
 from .user import User  # Импортируем User *после* определения FavoriteChannel,
                       # чтобы избежать циклического импорта.
-User.model_rebuild() # нужно для обновления forward ref
\ No newline at end of file
+User.model_rebuild() # нужно для обновления forward ref
@@ -0,0 +1,31 @@
+# app/models/saved_search.py
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, LargeBinary
+from sqlmodel import SQLModel, Field, Index, UniqueConstraint
+
+
+class SavedSearch(SQLModel, table=True):
+    """
+    Сохраненный поиск пользователя для регулярного мониторинга.
+    Хранит отслеживаемые видео и время последнего запуска: обновление ищет только видео новее last_run_at.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="user.id")  # Внешний ключ на User
+    kind: str  # videos / shorts
+    query: str
+    date_published_filter: str
+    max_results: int  # Видео за один запуск поиска
+    params_hash: str  # Хэш нормализованных параметров (как в SearchHistory): один сохраненный поиск на параметры
+    item_count: int
+    snapshot: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # JSON отслеживаемых Item, сжатый snapshot_encoding
+    snapshot_encoding: str  # zstd / gzip
+    last_run_at: Optional[datetime] = None  # UTC; None - поиск еще не запускался
+    added_at: datetime = Field(default_factory=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "params_hash"),
+        Index("ix_savedsearch_user_added_at_id", "user_id", "added_at", "id"), # Для keyset-пагинации списка
+    )
@@ -0,0 +1,28 @@
+# app/models/search_history.py
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, LargeBinary
+from sqlmodel import SQLModel, Field, Index
+
+
+class SearchHistory(SQLModel, table=True):
+    """Снимок результата поиска пользователя: повтор и просмотр по ссылке без обращения к YouTube API."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="user.id")  # Внешний ключ на User
+    kind: str  # videos / shorts
+    query: str
+    date_published_filter: str
+    max_results: int
+    params_hash: str  # Хэш нормализованных параметров: повтор того же поиска обновляет запись
+    item_count: int
+    snapshot: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # JSON списка Item, сжатый snapshot_encoding
+    snapshot_encoding: str  # zstd / gzip
+    share_token: Optional[str] = Field(default=None, unique=True)  # Токен ссылки только для чтения
+    added_at: datetime = Field(default_factory=datetime.now)
+
+    __table_args__ = (
+        Index("ix_searchhistory_user_params_hash", "user_id", "params_hash"),
+        Index("ix_searchhistory_user_added_at_id", "user_id", "added_at", "id"), # Для keyset-пагинации списка
+    )
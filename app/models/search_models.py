@@ -19,9 +19,12 @@ class Item(BaseModel):
     comments: Optional[int] = Field(None, description="Количество комментариев")
     comments_hidden: bool = Field(False, description="Скрыта ли статистика лайков")
     combined_metric: Optional[float] = Field(None, description="Комбинированная метрика")
+    metric_baseline: str = Field('lifetime', description="Относительно чего считан combined_metric: lifetime, median или trimmed_mean")
     duration: int = Field(..., description="Длительность видео в секундах")
     video_url: HttpUrl = Field(..., description="Ссылка на видео")
     channel_thumbnail: HttpUrl
+    views_per_hour: Optional[float] = Field(None, description="Скорость набора просмотров (в час) по снимкам статистики; None - истории пока мало")
+    views_acceleration: Optional[float] = Field(None, description="Изменение скорости просмотров (просмотров в час за час)")
 
     class Config:
         orm_mode = True
@@ -34,3 +37,8 @@ class SearchResponse(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class VideosByIdsResponse(SearchResponse):
+    cached_ids: list[str] = Field(default_factory=list, description="ID видео, данные которых взяты из кэша")
+    missing_ids: list[str] = Field(default_factory=list, description="ID несуществующих или приватных видео")
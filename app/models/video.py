@@ -1,31 +1,33 @@
 # app/models/video.py
-from pydantic import BaseModel, HttpUrl, validator, Field
-from datetime import datetime
+from sqlalchemy import BigInteger, Column
+from sqlmodel import SQLModel, Field, Index
+from datetime import datetime, timezone
 from typing import Optional
 
-class Video(BaseModel):
-    video_id: str
-    title: str
-    thumbnail: HttpUrl
-    published_at: datetime
-    views: int
-    channel_title: str
-    channel_url: HttpUrl
-    channel_subscribers: int
-    likes: Optional[int] = Field(None, description="Количество лайков")
-    likes_hidden: bool = Field(False, description="Скрыта ли статистика лайков")
-    comments: Optional[int] = Field(None, description="Количество комментариев")
-    combined_metric: Optional[float] = Field(None, description="Комбинированная метрика")
-    duration: int = Field(..., description="Длительность видео в секундах")
-    total_videos: Optional[int] = Field(None, description="Общее количество видео на канале")
-    video_url: HttpUrl = Field(..., description="Ссылка на видео")
+
+def utcnow() -> datetime:
+    # В БД время хранится без часового пояса, в UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
-    @validator("published_at", pre=True)
-    def parse_published_at(cls, value):
-        if isinstance(value, str):
-            return datetime.fromisoformat(value.replace('Z', '+00:00'))
-        return value
+class Video(SQLModel, table=True):
+    """
+    Каталог видео, которые сервис получал из YouTube API - одна строка на видео, общая для всех пользователей.
+    Пишется пачками upsert'ов из app/services/video_catalog.py; читается перед обращением к API.
+    """
+    video_id: str = Field(primary_key=True)  # ID видео на YouTube
+    channel_id: str
+    channel_title: str
+    title: str
+    thumbnail: str  # URL превью (high)
+    published_at: datetime  # UTC
+    duration: str  # ISO 8601 (как в contentDetails.duration)
+    views: int = Field(sa_column=Column(BigInteger, nullable=False))  # Больше 2^31 у самых популярных видео
+    likes: Optional[int] = None  # None - лайки скрыты
+    comments: Optional[int] = None  # None - комментарии скрыты или отключены
+    metadata_updated_at: datetime = Field(default_factory=utcnow)  # Когда последний раз получен snippet (UTC)
+    stats_updated_at: datetime = Field(default_factory=utcnow)  # Когда последний раз получена statistics (UTC)
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    __table_args__ = (
+        Index("ix_video_channel_published_at", "channel_id", "published_at"), # Последние видео канала
+    )
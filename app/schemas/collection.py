@@ -1,11 +1,13 @@
 # app/schemas/collection.py
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, HttpUrl, Field
 from datetime import datetime
 import uuid
 import json
 
+from app.models.search_models import Item
+
 class CollectionBase(BaseModel):
     collection_title: str
     videos_urls: str = Field(default="[]")  # Храним как JSON строку
@@ -52,9 +54,17 @@ class CollectionRead(BaseModel):
 
 class CollectionList(BaseModel):
     collections: List[CollectionRead]
+    next_cursor: Optional[str] = None # Передать в cursor для получения следующей страницы
 
     @classmethod
     def from_db(cls, db_models):
         return cls(
             collections=[CollectionRead.from_db(model) for model in db_models]
-        )
\ No newline at end of file
+        )
+
+class CollectionItems(BaseModel):
+    id: int
+    collection_title: str
+    item_count: int
+    items: List[Item] # Видео коллекции в порядке добавления
+    unresolved_urls: List[str] = [] # Ссылки без ID видео или на удаленные/приватные видео
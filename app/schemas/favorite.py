@@ -3,6 +3,7 @@
 from pydantic import BaseModel, HttpUrl
 from datetime import datetime
 import uuid
+from typing import Optional
 
 class FavoriteChannelBase(BaseModel):
     channel_id: str
@@ -21,8 +22,48 @@ class FavoriteChannelRead(FavoriteChannelBase):
     user_id: uuid.UUID
     added_at: datetime #добавляем в схему
 
+    @classmethod
+    def from_db(cls, favorite):
+        # Данные канала хранятся в общей строке Channel (favorite.channel)
+        channel = favorite.channel
+        return cls(
+            id=favorite.id,
+            user_id=favorite.user_id,
+            added_at=favorite.added_at,
+            channel_id=favorite.channel_id,
+            channel_title=channel.title,
+            channel_thumbnail=channel.thumbnail,
+            channel_subscribers=channel.subscribers,
+            channel_video_count=channel.video_count,
+            channel_last_published_at=channel.last_published_at,
+            channel_url=channel.channel_url,
+        )
+
     class Config:
         from_attributes = True
 
 class FavoriteChannelList(BaseModel): # Для вывода списка
-    channels: list[FavoriteChannelRead]
\ No newline at end of file
+    channels: list[FavoriteChannelRead]
+    next_cursor: Optional[str] = None # Передать в cursor для получения следующей страницы
+
+class FavoritesFeedItem(BaseModel): # Загрузка из ленты избранных каналов
+    video_id: str
+    title: str
+    thumbnail: str  # URL
+    published_at: datetime
+    channel_id: str
+    channel_title: str
+    video_url: str
+
+class FavoritesFeedResponse(BaseModel):
+    item_count: int
+    items: list[FavoritesFeedItem]
+    next_cursor: Optional[str] = None # Передать в cursor для получения следующей страницы
+
+class FavoritesSearchItem(FavoritesFeedItem): # Загрузка избранного канала, найденная /favorites/search
+    score: float # Вес совпадений: слово в названии - 3, в описании - 1
+
+class FavoritesSearchResponse(BaseModel):
+    item_count: int
+    items: list[FavoritesSearchItem]
+    channels_searched: int # Каналов, загрузки которых удалось получить
@@ -0,0 +1,43 @@
+# app/schemas/job.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobCreate(BaseModel):
+    type: str = Field(description="Тип задачи: favorites_import, channel_scan, comments_harvest")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Параметры задачи (зависят от типа)")
+
+
+class JobRead(BaseModel):
+    id: str
+    type: str
+    status: str # queued, running, succeeded, failed, cancelled
+    params: Optional[Dict[str, Any]] = None
+    progress_done: Optional[int] = None
+    progress_total: Optional[int] = None
+    progress_message: Optional[str] = None
+    result_count: Optional[int] = None # Частичных результатов на данный момент
+    summary: Optional[Dict[str, Any]] = None # Итог успешной задачи
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    attempts: Optional[int] = None # Запусков: задача, потерянная вместе с воркером, перезапускается
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class JobDetail(JobRead):
+    results: List[Any] = Field(default_factory=list) # Страница результатов с results_offset
+    results_offset: int = 0
+
+
+class JobList(BaseModel):
+    jobs: List[JobRead]
+
+
+class JobTypeInfo(BaseModel):
+    type: str
+    description: str
+    params_schema: Dict[str, Any]
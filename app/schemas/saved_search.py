@@ -0,0 +1,59 @@
+# app/schemas/saved_search.py
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.models.search_models import Item
+
+
+class SavedSearchCreate(BaseModel):
+    kind: str = Field('videos', description="videos или shorts")
+    query: str = Field(..., min_length=1, max_length=500)
+    date_published: str = Field('all_time', description="all_time, last_week, last_month, last_3_month, last_6_month, last_year")
+    max_results: int = Field(50, ge=1, le=50, description="Видео за один запуск поиска (одна страница search.list)")
+
+
+class SavedSearchEntry(BaseModel):
+    id: int
+    kind: str
+    query: str
+    date_published: str = Field(validation_alias="date_published_filter")
+    max_results: int
+    item_count: int
+    last_run_at: Optional[datetime] = None # UTC; None - поиск еще не запускался
+    added_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SavedSearchList(BaseModel):
+    entries: List[SavedSearchEntry]
+    next_cursor: Optional[str] = None # Передать в cursor для получения следующей страницы
+
+
+class SavedSearchRead(SavedSearchEntry):
+    """Отслеживаемые видео на момент последнего запуска (без обращения к YouTube API)."""
+    items: List[Item]
+
+
+class RisingItem(Item):
+    previous_views: int = Field(description="Просмотры на прошлом запуске")
+    views_delta: int = Field(description="Прирост просмотров с прошлого запуска")
+
+
+class RemovedItem(BaseModel):
+    video_id: str
+    title: str
+    reason: str = Field(description="unavailable - удалено или скрыто, out_of_window - старше date_published, evicted - вытеснено новыми")
+
+
+class SavedSearchRefresh(BaseModel):
+    """Разница с прошлым запуском сохраненного поиска."""
+    search: SavedSearchEntry
+    incremental: bool = Field(description="False - первый запуск: все найденные видео в new")
+    new: List[Item]
+    new_complete: bool = Field(description="False - новых видео больше, чем max_results; не вошедшие в ответ не отслеживаются")
+    rising: List[RisingItem]
+    removed: List[RemovedItem]
@@ -0,0 +1,33 @@
+# app/schemas/search_history.py
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.models.search_models import SearchResponse
+
+
+class SearchHistoryEntry(BaseModel):
+    id: int
+    kind: str
+    query: str
+    date_published: str = Field(validation_alias="date_published_filter")
+    max_results: int
+    item_count: int
+    share_token: Optional[str] = None # Есть, если запись открыта по ссылке /search/shared/{share_token}
+    added_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SearchHistoryList(BaseModel):
+    entries: List[SearchHistoryEntry]
+    next_cursor: Optional[str] = None # Передать в cursor для получения следующей страницы
+
+
+class SearchHistoryReplay(SearchResponse):
+    """Сохраненный результат поиска (без обращения к YouTube API)."""
+    query: str
+    date_published: str
+    searched_at: datetime
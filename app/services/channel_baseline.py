@@ -0,0 +1,217 @@
+# app/services/channel_baseline.py
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+import redis.asyncio as redis
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.upstream_scheduler import Priority, set_upstream_priority
+from app.core.youtube import partial_response
+from app.core.youtube_client_manager import ApiKeysExhaustedError, api_key_manager
+from app.services.uploads import get_channel_uploads
+from app.services.video_catalog import VIDEO_STATISTICS_FIELDS, video_catalog
+
+# numpy необязателен: без него медиана и усеченное среднее считаются на чистом Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Базовый уровень просмотров канала - общий кэш для всех пользователей
+CHANNEL_BASELINE_KEY_PREFIX = "channel:baseline"
+VIDEOS_PER_REQUEST = 50 # videos.list принимает до 50 ID за вызов (1 unit)
+# lifetime - просмотры канала / число видео (как раньше), остальные - по последним загрузкам
+BASELINE_METHODS = ('lifetime', 'median', 'trimmed_mean')
+
+# Каналы, ожидающие расчета, и задача, которая их обрабатывает (одна на процесс)
+_pending: Set[str] = set()
+_inflight: Set[str] = set()
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def _cache_key(channel_id: str) -> str:
+    return f"{CHANNEL_BASELINE_KEY_PREFIX}:{channel_id}"
+
+
+def channel_id_from_url(channel_url) -> str:
+    return str(channel_url).rstrip('/').rsplit('/', 1)[-1]
+
+
+def compute_baseline(views: List[int], trim: float) -> Dict:
+    """
+    Медиана и усеченное среднее (по trim с каждой стороны) просмотров выборки.
+    Пустая выборка - значения None.
+    """
+    result = {'median': None, 'trimmed_mean': None, 'sample_size': len(views), 'computed_at': time.time()}
+    if not views:
+        return result
+    cut = int(len(views) * trim)
+    if np is not None:
+        values = np.sort(np.asarray(views, dtype=np.float64))
+        result['median'] = float(np.median(values))
+        result['trimmed_mean'] = float(values[cut:len(values) - cut].mean())
+    else:
+        values = sorted(float(v) for v in views)
+        middle = len(values) // 2
+        result['median'] = values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+        trimmed = values[cut:len(values) - cut]
+        result['trimmed_mean'] = sum(trimmed) / len(trimmed)
+    return result
+
+
+def _is_mature(upload: Dict, now: datetime) -> bool:
+    # Свежие загрузки еще набирают просмотры и занижают базовый уровень
+    try:
+        published_at = datetime.fromisoformat(upload['published_at'].replace('Z', '+00:00'))
+    except (KeyError, ValueError):
+        return False
+    return (now - published_at).total_seconds() >= settings.channel_baseline_min_age_hours * 60 * 60
+
+
+async def _fetch_view_counts(video_ids: List[str]) -> Dict[str, int]:
+    views: Dict[str, int] = {}
+    for start in range(0, len(video_ids), VIDEOS_PER_REQUEST):
+        chunk = video_ids[start:start + VIDEOS_PER_REQUEST]
+        logger.info(f"API Call: youtube.videos().list (statistics) for {len(chunk)} IDs (channel baselines)")
+        response = await api_key_manager.execute(
+            lambda youtube: youtube.videos().list(
+                part='statistics', id=','.join(chunk), maxResults=len(chunk), **partial_response(VIDEO_STATISTICS_FIELDS),
+            )
+        )
+        video_catalog.submit_many(response.get('items', []))
+        for video in response.get('items', []):
+            if 'viewCount' in video.get('statistics', {}):
+                views[video['id']] = int(video['statistics']['viewCount'])
+    return views
+
+
+async def refresh_channel_baselines(channel_ids: List[str], redis_client: Optional[redis.Redis]) -> Dict[str, Dict]:
+    """
+    Считает базовый уровень просмотров по последним channel_baseline_sample_size загрузкам каждого канала.
+    Загрузки берутся из кэша плейлистов, статистика всех каналов пачки - общими вызовами videos.list по 50 ID.
+    Результат (в том числе для каналов с недостаточной выборкой) кэшируется на channel_baseline_cache_ttl_seconds.
+    """
+    youtube = api_key_manager.get_client()
+    if youtube is None:
+        return {}
+    now = datetime.now(timezone.utc)
+    sample_size = min(settings.channel_baseline_sample_size, settings.uploads_cache_max_items)
+
+    uploads_by_channel = await asyncio.gather(
+        *(get_channel_uploads(youtube, channel_id, redis_client) for channel_id in channel_ids),
+        return_exceptions=True,
+    )
+    samples: Dict[str, List[str]] = {}
+    for channel_id, uploads in zip(channel_ids, uploads_by_channel):
+        if isinstance(uploads, Exception):
+            logger.warning(f"Could not read uploads for channel baseline {channel_id}: {uploads}")
+            continue
+        samples[channel_id] = [upload['video_id'] for upload in uploads if _is_mature(upload, now)][:sample_size]
+
+    views = await _fetch_view_counts([vid for video_ids in samples.values() for vid in video_ids])
+    baselines = {
+        channel_id: compute_baseline([views[vid] for vid in video_ids if vid in views], settings.channel_baseline_trim)
+        for channel_id, video_ids in samples.items()
+    }
+
+    if baselines and redis_client is not None:
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for channel_id, baseline in baselines.items():
+                    pipe.set(_cache_key(channel_id), json.dumps(baseline), ex=settings.channel_baseline_cache_ttl_seconds)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not write channel baselines: {e}")
+    return baselines
+
+
+async def _drain_pending() -> None:
+    set_upstream_priority(Priority.BACKGROUND)
+    redis_client = get_redis()
+    while _pending:
+        batch = [_pending.pop() for _ in range(min(len(_pending), settings.channel_baseline_refresh_batch))]
+        _inflight.update(batch)
+        try:
+            baselines = await refresh_channel_baselines(batch, redis_client)
+            logger.info(f"Computed baselines for {len(baselines)}/{len(batch)} channels.")
+        except ApiKeysExhaustedError:
+            logger.warning("Channel baselines skipped: no API keys available.")
+            _pending.clear()
+        except HttpError as e:
+            logger.error(f"HttpError computing channel baselines: {e.status_code} - {e.reason}")
+        except Exception as e:
+            logger.exception(f"Unexpected error computing channel baselines: {e}")
+        finally:
+            _inflight.difference_update(batch)
+
+
+def schedule_baseline_refresh(channel_ids: Iterable[str]) -> None:
+    """Ставит каналы в очередь фонового расчета; ответ на запрос его не ждет."""
+    global _refresh_task
+    new_ids = set(channel_ids) - _inflight
+    if not new_ids:
+        return
+    _pending.update(new_ids)
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_drain_pending())
+
+
+async def get_cached_baselines(redis_client: Optional[redis.Redis], channel_ids: Iterable[str]) -> Dict[str, Dict]:
+    """Базовые уровни каналов из кэша одним MGET; отсутствующих в кэше каналов в результате нет."""
+    channel_ids = list(dict.fromkeys(channel_ids))
+    if redis_client is None or not channel_ids:
+        return {}
+    try:
+        raw_entries = await redis_client.mget([_cache_key(cid) for cid in channel_ids])
+    except redis.RedisError as e:
+        logger.warning(f"Could not read channel baselines: {e}")
+        return {}
+    baselines = {}
+    for channel_id, raw in zip(channel_ids, raw_entries):
+        if not raw:
+            continue
+        try:
+            baselines[channel_id] = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Corrupted channel baseline for {channel_id}, ignoring it.")
+    return baselines
+
+
+def _field(item, name: str):
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+async def apply_channel_baseline(redis_client: Optional[redis.Redis], items: Iterable, method: str) -> None:
+    """
+    Пересчитывает combined_metric элементов (Item или dict) относительно базового уровня канала
+    по последним загрузкам (method - median или trimmed_mean) и отмечает его в metric_baseline.
+    Базовый уровень берется только из кэша; каналы без него ставятся в очередь фонового расчета,
+    а их элементы сохраняют метрику по среднему за все время (lifetime).
+    """
+    items = list(items)
+    if method == 'lifetime' or redis_client is None or not items:
+        return
+    channel_ids = [channel_id_from_url(_field(item, 'channel_url')) for item in items]
+    baselines = await get_cached_baselines(redis_client, channel_ids)
+    missing = {cid for cid in channel_ids if cid not in baselines}
+    if missing:
+        schedule_baseline_refresh(missing)
+
+    for item, channel_id in zip(items, channel_ids):
+        baseline = baselines.get(channel_id)
+        if not baseline or baseline['sample_size'] < settings.channel_baseline_min_samples or not baseline[method]:
+            continue
+        metric = round(_field(item, 'views') / baseline[method], 4)
+        if isinstance(item, dict):
+            item.update(combined_metric=metric, metric_baseline=method)
+        else:
+            item.combined_metric = metric
+            item.metric_baseline = method
@@ -0,0 +1,141 @@
+# app/services/channel_stats_refresher.py
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import redis.asyncio as redis
+from sqlalchemy import bindparam, func, update
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.database import engine
+from app.core.list_versions import FAVORITES_LIST, GLOBAL_SCOPE, bump_list_version
+from app.core.redis_client import get_redis
+from app.core.youtube import partial_response
+from app.core.youtube_client_manager import api_key_manager
+from app.models.channel import Channel
+from app.models.favorite import FavoriteChannel
+from app.services.uploads import get_cached_latest_published
+
+logger = logging.getLogger(__name__)
+
+# ZSET: channel_id -> время последнего просмотра канала любым пользователем (Unix timestamp)
+CHANNEL_VIEWS_KEY = "favorites:channel_views"
+CHANNELS_PER_REQUEST = 50 # Максимум id в одном channels.list (1 unit за запрос)
+
+
+async def record_channel_views(redis_client: Optional[redis.Redis], channel_ids: Iterable[str]) -> None:
+    """Отмечает, что каналы только что просматривали (влияет на очередность обновления)."""
+    channel_ids = list(channel_ids)
+    if redis_client is None or not channel_ids:
+        return
+    now = time.time()
+    try:
+        await redis_client.zadd(CHANNEL_VIEWS_KEY, {channel_id: now for channel_id in channel_ids})
+    except redis.RedisError as e:
+        logger.warning(f"Redis error recording channel views: {e}")
+
+
+def _load_favorited_channel_ids() -> List[str]:
+    with Session(engine) as session:
+        return list(session.exec(select(FavoriteChannel.channel_id).distinct()).all())
+
+
+async def _prioritize(redis_client: Optional[redis.Redis], channel_ids: List[str]) -> List[str]:
+    """Сортирует каналы: сначала недавно просмотренные, затем никем не открывавшиеся."""
+    if redis_client is None:
+        return channel_ids
+    try:
+        scores = await redis_client.zmscore(CHANNEL_VIEWS_KEY, channel_ids) if channel_ids else []
+    except redis.RedisError as e:
+        logger.warning(f"Redis error reading channel views, refreshing in DB order: {e}")
+        return channel_ids
+    viewed_at = {cid: score or 0.0 for cid, score in zip(channel_ids, scores)}
+    return sorted(channel_ids, key=lambda cid: viewed_at[cid], reverse=True)
+
+
+def _parse_published_at(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+# Поля channels.list, которые читает _build_update_rows
+CHANNEL_STATS_FIELDS = "items(id,snippet(title,thumbnails/high/url),statistics(subscriberCount,videoCount))"
+
+
+def _build_update_rows(response: Dict, latest_published: Dict[str, str]) -> List[Dict]:
+    rows = []
+    for channel in response.get('items', []):
+        snippet = channel.get('snippet', {})
+        statistics = channel.get('statistics', {})
+        rows.append({
+            'b_channel_id': channel['id'],
+            'b_title': snippet.get('title', 'Unknown Title'),
+            'b_thumbnail': snippet.get('thumbnails', {}).get('high', {}).get('url', ''),
+            'b_subscribers': int(statistics['subscriberCount']) if 'subscriberCount' in statistics else 0,
+            'b_video_count': int(statistics['videoCount']) if 'videoCount' in statistics else 0,
+            'b_last_published_at': _parse_published_at(latest_published.get(channel['id'])),
+            'b_updated_at': datetime.now(),
+        })
+    return rows
+
+
+def _bulk_update(rows: List[Dict]) -> None:
+    """Обновляет общую строку Channel каждого канала (одну на канал, сколько бы пользователей его ни добавили) одним executemany."""
+    table = Channel.__table__
+    stmt = (
+        update(table)
+        .where(table.c.channel_id == bindparam('b_channel_id'))
+        .values(
+            title=bindparam('b_title'),
+            thumbnail=bindparam('b_thumbnail'),
+            subscribers=bindparam('b_subscribers'),
+            video_count=bindparam('b_video_count'),
+            # Дата последней загрузки известна только из кэша загрузок - иначе оставляем прежнюю
+            last_published_at=func.coalesce(
+                bindparam('b_last_published_at', type_=table.c.last_published_at.type),
+                table.c.last_published_at,
+            ),
+            updated_at=bindparam('b_updated_at'),
+        )
+    )
+    with engine.begin() as connection:
+        connection.execute(stmt, rows)
+
+
+async def refresh_favorite_channel_stats() -> int:
+    """
+    Один проход обновления статистики избранных каналов.
+    Каналы запрашиваются пачками по 50 через channels.list с ключами пула.
+    Возвращает количество обновленных каналов.
+    """
+    started = time.monotonic()
+    redis_client = get_redis()
+    channel_ids = await asyncio.to_thread(_load_favorited_channel_ids)
+    channel_ids = (await _prioritize(redis_client, channel_ids))[:settings.channel_stats_refresh_max_channels]
+    logger.info(f"Refreshing stats for {len(channel_ids)} favorited channels.")
+
+    updated = 0
+    for start in range(0, len(channel_ids), CHANNELS_PER_REQUEST):
+        batch = channel_ids[start:start + CHANNELS_PER_REQUEST]
+        response = await api_key_manager.execute(lambda youtube: youtube.channels().list(
+            part='snippet,statistics', id=','.join(batch), maxResults=CHANNELS_PER_REQUEST,
+            **partial_response(CHANNEL_STATS_FIELDS),
+        ))
+        latest_published = await get_cached_latest_published(redis_client, batch)
+        rows = _build_update_rows(response, latest_published)
+        if rows:
+            await asyncio.to_thread(_bulk_update, rows)
+            updated += len(rows)
+
+    if updated:
+        # Статистика входит в ответ GET /favorites/ у всех пользователей - сбрасываем их ETag
+        await bump_list_version(redis_client, FAVORITES_LIST, GLOBAL_SCOPE)
+    logger.info(f"Channel stats refresh finished: {updated}/{len(channel_ids)} channels updated in {time.monotonic() - started:.1f}s.")
+    return updated
@@ -0,0 +1,129 @@
+# app/services/channels.py
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import redis.asyncio as redis
+from googleapiclient.discovery import build
+
+from app.core.batch_loader import BatchLoader
+from app.core.config import settings
+from app.core.youtube import CHANNEL_INFO_FIELDS, execute_async, parse_channel_info, partial_response
+from app.core.youtube_client_manager import ApiKeysExhaustedError, api_key_manager
+
+logger = logging.getLogger(__name__)
+
+# Информация о канале публичная - кэш общий для всех пользователей
+CHANNEL_INFO_CACHE_KEY_PREFIX = "channel:info"
+CHANNELS_PER_REQUEST = 50 # channels.list принимает до 50 ID за вызов (1 unit)
+
+
+def _cache_key(channel_id: str) -> str:
+    return f"{CHANNEL_INFO_CACHE_KEY_PREFIX}:{channel_id}"
+
+
+async def get_channel_info_cached(youtube: build, channel_id: str, redis_client: Optional[redis.Redis]) -> Optional[Dict]:
+    """
+    То же, что get_channel_info, но с кэшем в Redis на channel_info_cache_ttl_seconds.
+    Без Redis работает как обычный запрос к API.
+    """
+    if redis_client is not None:
+        try:
+            cached = await redis_client.get(_cache_key(channel_id))
+            if cached:
+                logger.debug(f"Channel info cache hit for {channel_id}.")
+                return json.loads(cached)
+        except (redis.RedisError, ValueError) as e:
+            logger.warning(f"Could not read channel info cache for {channel_id}: {e}")
+
+    channel_info = (await load_channel_infos(youtube, [channel_id])).get(channel_id)
+
+    if channel_info and redis_client is not None:
+        try:
+            await redis_client.set(_cache_key(channel_id), json.dumps(channel_info), ex=settings.channel_info_cache_ttl_seconds)
+        except redis.RedisError as e:
+            logger.warning(f"Could not write channel info cache for {channel_id}: {e}")
+    return channel_info
+
+
+async def _fetch_channel_infos(youtube: build, channel_ids: List[str]) -> Dict[str, Dict]:
+    logger.info(f"API Call: youtube.channels().list for {len(channel_ids)} IDs")
+    response = await execute_async(youtube.channels().list(
+        part="snippet,statistics",
+        id=','.join(channel_ids),
+        maxResults=len(channel_ids),
+        **partial_response(CHANNEL_INFO_FIELDS),
+    ))
+    return {item['id']: parse_channel_info(item) for item in response.get('items', [])}
+
+
+async def _fetch_channel_infos_pooled(channel_ids: List[str]) -> Dict[str, Dict]:
+    logger.info(f"API Call: youtube.channels().list for {len(channel_ids)} IDs (batched across requests)")
+    response = await api_key_manager.execute(lambda youtube: youtube.channels().list(
+        part="snippet,statistics",
+        id=','.join(channel_ids),
+        maxResults=len(channel_ids),
+        **partial_response(CHANNEL_INFO_FIELDS),
+    ))
+    return {item['id']: parse_channel_info(item) for item in response.get('items', [])}
+
+
+# Промахи кэша каналов из всех запросов воркера объединяются в общие вызовы channels.list по ключам пула
+channel_loader = BatchLoader(
+    'channels', _fetch_channel_infos_pooled,
+    max_batch_size=CHANNELS_PER_REQUEST, window_seconds=settings.upstream_batch_window_ms / 1000,
+)
+
+
+async def load_channel_infos(youtube: build, channel_ids: List[str]) -> Dict[str, Dict]:
+    """
+    Информация о каналах из API через channel_loader (одновременные запросы делят вызовы channels.list).
+    Если ключи пула не настроены или исчерпаны - пачками по 50 ID через переданный клиент youtube.
+    """
+    try:
+        if api_key_manager.keys:
+            return await channel_loader.load_many(channel_ids)
+    except ApiKeysExhaustedError:
+        pass
+    chunks = [channel_ids[start:start + CHANNELS_PER_REQUEST] for start in range(0, len(channel_ids), CHANNELS_PER_REQUEST)]
+    infos: Dict[str, Dict] = {}
+    for chunk_result in await asyncio.gather(*(_fetch_channel_infos(youtube, chunk) for chunk in chunks)):
+        infos.update(chunk_result)
+    return infos
+
+
+async def get_channel_infos_cached(youtube: build, channel_ids: Iterable[str], redis_client: Optional[redis.Redis]) -> Dict[str, Dict]:
+    """
+    Пакетный вариант get_channel_info_cached: кэш читается одним MGET,
+    промахи запрашиваются через channel_loader пачками по 50 ID.
+    Каналы, которые не найдены, в результат не попадают.
+    """
+    channel_ids = list(dict.fromkeys(cid for cid in channel_ids if cid))
+    infos: Dict[str, Dict] = {}
+
+    if redis_client is not None and channel_ids:
+        try:
+            cached_entries = await redis_client.mget([_cache_key(cid) for cid in channel_ids])
+            for channel_id, cached in zip(channel_ids, cached_entries):
+                if cached:
+                    infos[channel_id] = json.loads(cached)
+        except (redis.RedisError, ValueError) as e:
+            logger.warning(f"Could not read channel info cache in bulk: {e}")
+
+    missing = [cid for cid in channel_ids if cid not in infos]
+    if not missing:
+        return infos
+
+    fetched = await load_channel_infos(youtube, missing)
+    infos.update(fetched)
+
+    if fetched and redis_client is not None:
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for channel_id, channel_info in fetched.items():
+                    pipe.set(_cache_key(channel_id), json.dumps(channel_info), ex=settings.channel_info_cache_ttl_seconds)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not write channel info cache in bulk: {e}")
+    return infos
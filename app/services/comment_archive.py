@@ -0,0 +1,105 @@
+# app/services/comment_archive.py
+import asyncio
+import gzip
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE_PREFIX = "comments-"
+ARCHIVE_FILE_SUFFIX = ".jsonl.gz"
+# Сколько записей максимум пишется одним gzip-членом
+WRITE_BATCH_SIZE = 500
+
+
+class CommentArchiveWriter:
+    """
+    Фоновая запись собранных комментариев в сжатый JSONL (comms/comments-*.jsonl.gz).
+    Запросы только кладут записи в очередь; файл пишется пачками в отдельном потоке.
+    Каждая пачка дописывается отдельным gzip-членом (файл остается валидным gzip),
+    при превышении comment_archive_max_bytes начинается новый файл, старые сверх
+    comment_archive_max_files удаляются.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_files: int, queue_size: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._current_file: Optional[Path] = None
+
+    def archive(self, record: Dict) -> None:
+        """Ставит запись в очередь архивации. Не блокирует: при переполнении запись отбрасывается."""
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Comment archive queue is full, {self.dropped} records dropped so far.")
+
+    def _target_file(self) -> Path:
+        current = self._current_file
+        if current is None or not current.exists() or current.stat().st_size >= self.max_bytes:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            current = self.directory / f"{ARCHIVE_FILE_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 1_000_000:06d}{ARCHIVE_FILE_SUFFIX}"
+            self._current_file = current
+            self._prune()
+        return current
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob(f"{ARCHIVE_FILE_PREFIX}*{ARCHIVE_FILE_SUFFIX}"))
+        for old_file in files[:max(0, len(files) - self.max_files)]:
+            try:
+                old_file.unlink()
+                logger.info(f"Removed old comment archive {old_file.name}.")
+            except OSError as e:
+                logger.warning(f"Could not remove old comment archive {old_file}: {e}")
+
+    def _write_batch(self, records: List[Dict]) -> None:
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        with open(self._target_file(), "ab") as archive_file:
+            archive_file.write(gzip.compress(payload))
+
+    async def _flush(self, records: List[Dict]) -> None:
+        try:
+            await asyncio.to_thread(self._write_batch, records)
+        except OSError as e:
+            logger.error(f"Failed to write {len(records)} comments to archive: {e}")
+
+    def _drain(self, records: List[Dict]) -> None:
+        while len(records) < WRITE_BATCH_SIZE:
+            try:
+                records.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def run(self) -> None:
+        """Цикл записи; при отмене дописывает то, что осталось в очереди."""
+        logger.info(f"Comment archive writer started (directory={self.directory}).")
+        try:
+            while True:
+                records = [await self.queue.get()]
+                self._drain(records)
+                await self._flush(records)
+        except asyncio.CancelledError:
+            records: List[Dict] = []
+            self._drain(records)
+            while records:
+                await self._flush(records)
+                records = []
+                self._drain(records)
+            raise
+
+
+comment_archive = CommentArchiveWriter(
+    directory=settings.comment_archive_dir,
+    max_bytes=settings.comment_archive_max_bytes,
+    max_files=settings.comment_archive_max_files,
+    queue_size=settings.comment_archive_queue_size,
+)
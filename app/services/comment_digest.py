@@ -0,0 +1,204 @@
+# app/services/comment_digest.py
+import hashlib
+import json
+import logging
+import math
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+COMMENT_DIGEST_CACHE_KEY_PREFIX = "comments:digest"
+# Грубая оценка для бюджета в токенах (без токенизатора): ~4 символа на токен
+CHARS_PER_TOKEN = 4
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 4 # Символьные 4-граммы: устойчивее словных для коротких комментариев
+# Комментарии, simhash которых отличается не более чем на столько бит, считаются почти одинаковыми
+NEAR_DUPLICATE_MAX_DISTANCE = 6
+# 8 полос по 8 бит: при расстоянии <= 7 хотя бы одна полоса совпадает целиком,
+# поэтому сравнивать simhash нужно только с комментариями, у которых совпала полоса
+SIMHASH_BANDS = 8
+# Счетчики битов simhash упакованы в одно большое целое: по LANE_BITS бит на каждый бит хэша
+LANE_BITS = 16
+_SPREAD_BYTE = [sum((byte >> bit & 1) << (bit * LANE_BITS) for bit in range(8)) for byte in range(256)]
+
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+_TIMESTAMP_RE = re.compile(r'\b\d{1,2}:\d{2}(?::\d{2})?\b')
+_REPEATED_CHAR_RE = re.compile(r'(.)\1{2,}')
+_NON_WORD_RE = re.compile(r'[^\w\s]+')
+_SPACES_RE = re.compile(r'\s+')
+
+
+def _cache_key(video_id: str, budget_chars: int, max_comments: int, include_replies: bool, order: str) -> str:
+    # Выжимка зависит не только от бюджета, но и от того, какие комментарии были собраны
+    return f"{COMMENT_DIGEST_CACHE_KEY_PREFIX}:{video_id}:{budget_chars}:{max_comments}:{int(include_replies)}:{order}"
+
+
+def normalize_comment(text: str) -> str:
+    """Приводит комментарий к виду для сравнения: регистр, ссылки, таймкоды, повторы символов, пунктуация."""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = _URL_RE.sub(' ', text)
+    text = _TIMESTAMP_RE.sub(' ', text)
+    text = _REPEATED_CHAR_RE.sub(r'\1\1', text)
+    text = _NON_WORD_RE.sub(' ', text)
+    return _SPACES_RE.sub(' ', text).strip()
+
+
+def simhash(normalized: str) -> int:
+    """
+    64-битный simhash по символьным шинглам.
+    Вместо 64 счетчиков на каждый шингл биты каждого байта хэша "раздвигаются" по 16-битным полосам
+    одного целого (таблица на байт), и шинглы суммируются одним sum() - в несколько раз быстрее.
+    """
+    shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(max(1, len(normalized) - SHINGLE_SIZE + 1))}
+    digests = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+    # digests[index::8] - index-й байт всех хэшей; по одному упакованному счетчику на байт хэша
+    counters = [sum(map(_SPREAD_BYTE.__getitem__, digests[index::8])) for index in range(8)]
+
+    lane_mask = (1 << LANE_BITS) - 1
+    fingerprint = 0
+    for index, packed in enumerate(counters):
+        for bit in range(8):
+            if 2 * (packed >> (bit * LANE_BITS) & lane_mask) > len(shingles):
+                fingerprint |= 1 << (index * 8 + bit)
+    return fingerprint
+
+
+def _bands(fingerprint: int) -> List[tuple]:
+    band_bits = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << band_bits) - 1
+    return [(band, fingerprint >> (band * band_bits) & mask) for band in range(SIMHASH_BANDS)]
+
+
+def deduplicate_comments(comments: List[Dict]) -> List[Dict]:
+    """
+    Схлопывает точные (после нормализации) и почти одинаковые (simhash) комментарии.
+    Из группы остается комментарий с наибольшим числом лайков; лайки и ответы группы суммируются,
+    duplicates - сколько комментариев в группе.
+    """
+    groups: List[Dict] = []
+    by_text: Dict[str, int] = {}
+    by_band: Dict[tuple, List[int]] = {}
+
+    for comment in comments:
+        normalized = normalize_comment(comment.get('text', ''))
+        if not normalized:
+            continue
+
+        group_index = by_text.get(normalized)
+        fingerprint = None
+        if group_index is None:
+            fingerprint = simhash(normalized)
+            candidates = {index for band in _bands(fingerprint) for index in by_band.get(band, ())}
+            matches = [index for index in candidates if (groups[index]['fingerprint'] ^ fingerprint).bit_count() <= NEAR_DUPLICATE_MAX_DISTANCE]
+            group_index = min(matches) if matches else None
+
+        if group_index is None:
+            group_index = len(groups)
+            groups.append({
+                'text': comment['text'],
+                'fingerprint': fingerprint,
+                'top_likes': comment.get('like_count', 0),
+                'like_count': 0,
+                'reply_count': 0,
+                'duplicates': 0,
+            })
+            for band in _bands(fingerprint):
+                by_band.setdefault(band, []).append(group_index)
+        by_text[normalized] = group_index
+
+        group = groups[group_index]
+        group['like_count'] += comment.get('like_count', 0)
+        group['reply_count'] += comment.get('reply_count', 0)
+        group['duplicates'] += 1
+        if comment.get('like_count', 0) > group['top_likes']:
+            group['text'] = comment['text']
+            group['top_likes'] = comment['like_count']
+
+    return [
+        {'text': g['text'], 'like_count': g['like_count'], 'reply_count': g['reply_count'], 'duplicates': g['duplicates']}
+        for g in groups
+    ]
+
+
+def rank_score(comment: Dict) -> float:
+    """Вес комментария: лайки, ответы (обсуждаемость) и число повторов (массовость мнения)."""
+    return math.log1p(comment['like_count']) + 1.5 * math.log1p(comment['reply_count']) + math.log1p(comment['duplicates'] - 1)
+
+
+def pack_comments(comments: List[Dict], budget_chars: int) -> List[Dict]:
+    """
+    Жадно набирает комментарии по убыванию веса, пока суммарная длина текстов не достигнет budget_chars.
+    Слишком длинные тексты обрезаются до comment_digest_max_comment_chars; не влезающий комментарий
+    пропускается, но более короткие после него еще могут войти.
+    """
+    packed: List[Dict] = []
+    used = 0
+    max_chars = settings.comment_digest_max_comment_chars
+    for comment in sorted(comments, key=rank_score, reverse=True):
+        text = comment['text'].strip()
+        if len(text) > max_chars:
+            text = text[:max_chars - 1].rstrip() + '…'
+        if used + len(text) > budget_chars:
+            continue
+        packed.append({**comment, 'text': text})
+        used += len(text)
+        if budget_chars - used < settings.comment_digest_min_comment_chars:
+            break
+    return packed
+
+
+def build_digest(video_id: str, comments: List[Dict], budget_chars: int) -> Dict:
+    unique = deduplicate_comments(comments)
+    items = pack_comments(unique, budget_chars)
+    return {
+        'video_id': video_id,
+        'budget_chars': budget_chars,
+        'used_chars': sum(len(item['text']) for item in items),
+        'comments_considered': len(comments),
+        'unique_comments': len(unique),
+        'item_count': len(items),
+        'items': items,
+    }
+
+
+def budget_to_chars(budget_chars: Optional[int], budget_tokens: Optional[int]) -> int:
+    if budget_chars is not None:
+        return budget_chars
+    if budget_tokens is not None:
+        return budget_tokens * CHARS_PER_TOKEN
+    return settings.comment_digest_default_budget_chars
+
+
+async def get_cached_digest(
+    redis_client: Optional[redis.Redis], video_id: str, budget_chars: int,
+    max_comments: int, include_replies: bool, order: str,
+) -> Optional[Dict]:
+    if redis_client is None:
+        return None
+    try:
+        cached = await redis_client.get(_cache_key(video_id, budget_chars, max_comments, include_replies, order))
+        return json.loads(cached) if cached else None
+    except (redis.RedisError, ValueError) as e:
+        logger.warning(f"Could not read comment digest cache for {video_id}: {e}")
+        return None
+
+
+async def store_digest(
+    redis_client: Optional[redis.Redis], digest: Dict, max_comments: int, include_replies: bool, order: str,
+) -> None:
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(
+            _cache_key(digest['video_id'], digest['budget_chars'], max_comments, include_replies, order),
+            json.dumps(digest, ensure_ascii=False),
+            ex=settings.comment_digest_cache_ttl_seconds,
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Could not write comment digest cache for {digest['video_id']}: {e}")
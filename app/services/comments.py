@@ -0,0 +1,119 @@
+# app/services/comments.py
+import logging
+from typing import AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.core.upstream_scheduler import Priority, upstream_priority
+from app.core.youtube import partial_response
+from app.core.youtube_client_manager import api_key_manager
+
+logger = logging.getLogger(__name__)
+
+COMMENTS_PER_PAGE = 100 # Максимум commentThreads.list и comments.list (1 unit за страницу)
+
+# Поля ресурса comment, которые читает parse_comment
+COMMENT_FIELDS = "id,snippet(authorDisplayName,textOriginal,textDisplay,likeCount,publishedAt)"
+# Страница commentThreads.list для harvest_comments и _iter_replies
+COMMENT_THREADS_PAGE_FIELDS = (
+    f"nextPageToken,items(id,snippet(totalReplyCount,topLevelComment({COMMENT_FIELDS})),replies/comments({COMMENT_FIELDS}))"
+)
+COMMENTS_PAGE_FIELDS = f"nextPageToken,items({COMMENT_FIELDS})"
+
+
+def parse_comment(raw_comment: Dict, parent_id: Optional[str] = None, reply_count: int = 0) -> Dict:
+    """Преобразует ресурс comment YouTube в компактную запись."""
+    snippet = raw_comment.get('snippet', {})
+    return {
+        'comment_id': raw_comment.get('id'),
+        'parent_id': parent_id,
+        'author': snippet.get('authorDisplayName'),
+        'text': snippet.get('textOriginal') or snippet.get('textDisplay', ''),
+        'like_count': int(snippet.get('likeCount', 0)),
+        'reply_count': reply_count,
+        'published_at': snippet.get('publishedAt'),
+    }
+
+
+async def fetch_comment_threads_page(video_id: str, order: str, page_token: Optional[str] = None) -> Dict:
+    """Одна страница commentThreads.list через пул ключей."""
+    logger.info(f"API Call: youtube.commentThreads().list (video={video_id}, page_token={page_token is not None})")
+    return await api_key_manager.execute(lambda youtube: youtube.commentThreads().list(
+        part='snippet,replies',
+        videoId=video_id,
+        maxResults=COMMENTS_PER_PAGE,
+        order=order,
+        pageToken=page_token,
+        textFormat='plainText',
+        **partial_response(COMMENT_THREADS_PAGE_FIELDS),
+    ))
+
+
+async def _iter_replies(thread: Dict, limit: int) -> AsyncIterator[Dict]:
+    """Ответы ветки: встроенные в ответ commentThreads.list или, если их больше, все через comments.list."""
+    thread_id = thread['id']
+    total_replies = thread['snippet'].get('totalReplyCount', 0)
+    inline_replies = thread.get('replies', {}).get('comments', [])
+
+    if total_replies <= len(inline_replies):
+        for reply in inline_replies[:limit]:
+            yield parse_comment(reply, parent_id=thread_id)
+        return
+
+    page_token = None
+    yielded = 0
+    while yielded < limit:
+        logger.info(f"API Call: youtube.comments().list (parent={thread_id}, page_token={page_token is not None})")
+        with upstream_priority(Priority.BULK):
+            response = await api_key_manager.execute(lambda youtube: youtube.comments().list(
+                part='snippet',
+                parentId=thread_id,
+                maxResults=COMMENTS_PER_PAGE,
+                pageToken=page_token,
+                textFormat='plainText',
+                **partial_response(COMMENTS_PAGE_FIELDS),
+            ))
+        for reply in response.get('items', []):
+            yield parse_comment(reply, parent_id=thread_id)
+            yielded += 1
+            if yielded >= limit:
+                return
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+
+async def harvest_comments(
+    video_id: str,
+    first_page: Dict,
+    max_comments: int,
+    order: str = 'relevance',
+    include_replies: bool = True,
+) -> AsyncIterator[Dict]:
+    """
+    Лениво обходит комментарии видео: страницы commentThreads.list по pageToken, начиная с first_page,
+    и (если include_replies) ответы каждой ветки. Останавливается, набрав max_comments записей
+    (ответы входят в лимит) или когда страницы закончились.
+    """
+    page = first_page
+    harvested = 0
+    while True:
+        for thread in page.get('items', []):
+            top_comment = thread['snippet']['topLevelComment']
+            yield parse_comment(top_comment, reply_count=thread['snippet'].get('totalReplyCount', 0))
+            harvested += 1
+            if harvested >= max_comments:
+                return
+            if include_replies and thread['snippet'].get('totalReplyCount', 0):
+                reply_limit = min(settings.comment_replies_max_per_thread, max_comments - harvested)
+                async for reply in _iter_replies(thread, reply_limit):
+                    yield reply
+                    harvested += 1
+                if harvested >= max_comments:
+                    return
+
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return
+        # Первая страница - интерактивная, остальной обход - массовая операция
+        with upstream_priority(Priority.BULK):
+            page = await fetch_comment_threads_page(video_id, order, page_token)
@@ -0,0 +1,104 @@
+# app/services/favorites_search.py
+import bisect
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Вес совпадения слова запроса в поле загрузки
+TITLE_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+# Индексы каналов, которые держим в памяти процесса (построение - токенизация описаний - дороже поиска)
+CHANNEL_INDEX_CACHE_SIZE = 2000
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall((text or '').lower()) if len(token) > 1 or token.isdigit()]
+
+
+class ChannelIndex:
+    """
+    Инвертированный индекс загрузок одного канала: слово -> {номер загрузки: вес}.
+    Словарь хранится отсортированным для поиска по префиксу.
+    """
+
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for position, item in enumerate(items):
+            for field, weight in (('title', TITLE_WEIGHT), ('description', DESCRIPTION_WEIGHT)):
+                for token in set(tokenize(item.get(field, ''))):
+                    postings[token][position] = postings[token].get(position, 0.0) + weight
+        self.postings = dict(postings)
+        self.vocabulary = sorted(self.postings)
+
+    def _term_postings(self, term: str, prefix: bool) -> Dict[int, float]:
+        if not prefix:
+            return self.postings.get(term, {})
+        merged: Dict[int, float] = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            for position, weight in self.postings[token].items():
+                merged[position] = max(merged.get(position, 0.0), weight)
+        return merged
+
+    def search(self, terms: List[str]) -> List[Tuple[Dict, float]]:
+        """Загрузки, содержащие все слова запроса (последнее - по префиксу), с суммарным весом совпадений."""
+        scores: Optional[Dict[int, float]] = None
+        for index, term in enumerate(terms):
+            postings = self._term_postings(term, prefix=index == len(terms) - 1)
+            if scores is None:
+                scores = dict(postings)
+            else:
+                scores = {position: score + postings[position] for position, score in scores.items() if position in postings}
+            if not scores:
+                return []
+        return [(self.items[position], score) for position, score in (scores or {}).items()]
+
+
+_channel_indexes: "OrderedDict[str, Tuple[Tuple, ChannelIndex]]" = OrderedDict()
+_channel_indexes_lock = threading.Lock() # Поиск выполняется в потоках
+
+
+def _signature(items: List[Dict]) -> Tuple:
+    # Список загрузок меняется только добавлением новых видео в начало и обрезкой хвоста
+    return (len(items), items[0]['video_id'], items[-1]['video_id']) if items else (0,)
+
+
+def get_channel_index(channel_id: str, items: List[Dict]) -> ChannelIndex:
+    """Индекс загрузок канала из кэша процесса; перестраивается, только когда список загрузок изменился."""
+    signature = _signature(items)
+    with _channel_indexes_lock:
+        cached = _channel_indexes.get(channel_id)
+        if cached is not None and cached[0] == signature:
+            _channel_indexes.move_to_end(channel_id)
+            return cached[1]
+    index = ChannelIndex(items)
+    with _channel_indexes_lock:
+        _channel_indexes[channel_id] = (signature, index)
+        _channel_indexes.move_to_end(channel_id)
+        while len(_channel_indexes) > CHANNEL_INDEX_CACHE_SIZE:
+            _channel_indexes.popitem(last=False)
+    return index
+
+
+def search_uploads(uploads: Dict[str, List[Dict]], query: str, limit: int, published_after: Optional[str] = None) -> List[Dict]:
+    """
+    Ищет query в названиях и описаниях загрузок каналов (uploads: channel_id -> загрузки).
+    Сортировка - по весу совпадений, затем по дате публикации. Выполняется в потоке (CPU).
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    matches = []
+    for channel_id, items in uploads.items():
+        for item, score in get_channel_index(channel_id, items).search(terms):
+            if published_after and item['published_at'] <= published_after:
+                continue
+            matches.append({**item, 'score': score})
+    matches.sort(key=lambda item: (item['score'], item['published_at']), reverse=True)
+    return matches[:limit]
@@ -0,0 +1,203 @@
+# app/services/local_index.py
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Сколько видео максимум записывается одной транзакцией
+WRITE_BATCH_SIZE = 500
+# Веса колонок BM25: title, description, channel_title
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    published_ts REAL NOT NULL,
+    item TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_videos_kind_published ON videos (kind, published_ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+    title, description, channel_title,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_UPSERT = """
+INSERT INTO videos (video_id, kind, published_ts, item, description, indexed_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (video_id) DO UPDATE SET
+    kind = excluded.kind,
+    published_ts = excluded.published_ts,
+    item = excluded.item,
+    description = CASE WHEN excluded.description != '' THEN excluded.description ELSE videos.description END,
+    indexed_at = excluded.indexed_at
+RETURNING id, description
+"""
+
+
+def _published_ts(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Превращает пользовательский запрос в выражение FTS5: каждое слово - отдельная фраза в кавычках
+    (синтаксис FTS5 в запросе не интерпретируется), слова объединяются через AND, последнее - по префиксу.
+    """
+    terms = [term.replace('"', '""') for term in query.split()]
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+class LocalSearchIndex:
+    """
+    Локальный полнотекстовый индекс (SQLite FTS5, ранжирование BM25) по всем видео,
+    которые сервис собирал для ответов: название, описание, канал.
+    Пайплайн поиска только кладет записи в очередь; в базу они пишутся пачками в отдельном потоке.
+    Индекс обслуживает /search/local и подменяет поиск через API, когда все ключи исчерпаны.
+    """
+
+    def __init__(self, path: str, queue_size: int, enabled: bool):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL") # Чтение не блокируется записью
+            connection.executescript(_SCHEMA)
+            self._initialized = True
+        return connection
+
+    def submit(self, kind: str, item: Dict, description: str = '') -> None:
+        """Ставит видео в очередь индексации. Не блокирует: при переполнении запись отбрасывается."""
+        if not self.enabled:
+            return
+        try:
+            self.queue.put_nowait((kind, item, description or ''))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Local index queue is full, {self.dropped} videos dropped so far.")
+
+    def _write_batch(self, records: List) -> None:
+        # Повторы одного видео в пачке - остается последний, но с последним непустым описанием
+        # (get_items_for_video_ids кладет видео без описания)
+        latest: Dict[str, tuple] = {}
+        for kind, item, description in records:
+            previous = latest.get(item['video_id'])
+            if not description and previous is not None:
+                description = previous[2]
+            latest[item['video_id']] = (kind, item, description)
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                for video_id, (kind, item, description) in latest.items():
+                    rowid, stored_description = connection.execute(_UPSERT, (
+                        video_id, kind, _published_ts(item.get('published_at')),
+                        json.dumps(item, default=str), description, now,
+                    )).fetchone()
+                    connection.execute("DELETE FROM videos_fts WHERE rowid = ?", (rowid,))
+                    connection.execute(
+                        "INSERT INTO videos_fts (rowid, title, description, channel_title) VALUES (?, ?, ?, ?)",
+                        (rowid, item.get('title', ''), stored_description, item.get('channel_title', '')),
+                    )
+        finally:
+            connection.close()
+
+    async def _flush(self, records: List) -> None:
+        try:
+            await asyncio.to_thread(self._write_batch, records)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(records)} videos to local index: {e}")
+
+    def _drain(self, records: List) -> None:
+        while len(records) < WRITE_BATCH_SIZE:
+            try:
+                records.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def run(self) -> None:
+        """Цикл записи; при отмене дописывает то, что осталось в очереди."""
+        logger.info(f"Local search index writer started (path={self.path}).")
+        try:
+            while True:
+                records = [await self.queue.get()]
+                self._drain(records)
+                await self._flush(records)
+        except asyncio.CancelledError:
+            records: List = []
+            self._drain(records)
+            while records:
+                await self._flush(records)
+                records = []
+                self._drain(records)
+            raise
+
+    def _search(self, query: str, kind: Optional[str], limit: int, published_after: Optional[str]) -> List[Dict]:
+        match = build_match_query(query)
+        if match is None:
+            return []
+        sql = (
+            "SELECT v.item FROM videos_fts JOIN videos v ON v.id = videos_fts.rowid "
+            "WHERE videos_fts MATCH ?"
+        )
+        params: list = [match]
+        if kind:
+            sql += " AND v.kind = ?"
+            params.append(kind)
+        if published_after:
+            sql += " AND v.published_ts >= ?"
+            params.append(_published_ts(published_after))
+        sql += f" ORDER BY bm25(videos_fts, {', '.join(map(str, BM25_WEIGHTS))}) LIMIT ?"
+        params.append(limit)
+
+        if not self.path.exists():
+            return []
+        connection = self._connect()
+        try:
+            return [json.loads(row[0]) for row in connection.execute(sql, params)]
+        finally:
+            connection.close()
+
+    async def search(self, query: str, kind: Optional[str], limit: int, published_after: Optional[str] = None) -> List[Dict]:
+        """Видео из индекса по релевантности (BM25). published_after - RFC 3339."""
+        try:
+            return await asyncio.to_thread(self._search, query, kind, limit, published_after)
+        except sqlite3.Error as e:
+            logger.error(f"Local index search failed: {e}")
+            return []
+
+
+local_index = LocalSearchIndex(
+    path=settings.local_index_path,
+    queue_size=settings.local_index_queue_size,
+    enabled=settings.local_index_enabled,
+)
@@ -0,0 +1,163 @@
+# app/services/saved_searches.py
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.youtube import get_rfc3339_date, partial_response
+from app.core.youtube_client_manager import api_key_manager
+from app.models.saved_search import SavedSearch
+from app.models.search_models import Item
+from app.services.search import fetch_search_results, run_search
+from app.services.search_history import SNAPSHOT_ENCODING, pack_snapshot, unpack_snapshot
+from app.services.video_catalog import VIDEO_STATISTICS_FIELDS, video_catalog
+from app.services.video_snapshots import apply_view_velocity
+
+logger = logging.getLogger(__name__)
+
+VIDEOS_PER_REQUEST = 50 # videos.list принимает до 50 ID за вызов (1 unit)
+
+# Почему видео больше не отслеживается сохраненным поиском
+REMOVED_UNAVAILABLE = 'unavailable'     # Удалено или стало приватным (нет в ответе videos.list)
+REMOVED_OUT_OF_WINDOW = 'out_of_window' # Опубликовано раньше границы date_published
+REMOVED_EVICTED = 'evicted'             # Вытеснено более новыми сверх saved_search_max_items
+
+
+def _parse_published_at(value) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+def _rfc3339(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _normalize(items: Iterable[Dict]) -> List[Dict]:
+    # Элементы хранятся в снимке как JSON: даты - строки RFC 3339, ссылки - строки
+    return [Item.model_validate(item).model_dump(mode='json') for item in items]
+
+
+async def fetch_video_statistics(video_ids: List[str]) -> Dict[str, Dict]:
+    """statistics видео пачками по 50 ID (1 unit за пачку) через пул ключей. Удаленных и приватных видео в ответе нет."""
+    statistics: Dict[str, Dict] = {}
+    for start in range(0, len(video_ids), VIDEOS_PER_REQUEST):
+        chunk = video_ids[start:start + VIDEOS_PER_REQUEST]
+        logger.info(f"API Call: youtube.videos().list (statistics) for {len(chunk)} IDs (saved search)")
+        response = await api_key_manager.execute(
+            lambda youtube: youtube.videos().list(
+                part='statistics', id=','.join(chunk), maxResults=len(chunk), **partial_response(VIDEO_STATISTICS_FIELDS),
+            )
+        )
+        video_catalog.submit_many(response.get('items', []))
+        for video in response.get('items', []):
+            statistics[video['id']] = video.get('statistics', {})
+    return statistics
+
+
+def _apply_statistics(item: Dict, stats: Dict) -> None:
+    previous_views = item.get('views') or 0
+    item['views'] = int(stats.get('viewCount', previous_views))
+    item['likes_hidden'] = 'likeCount' not in stats
+    item['likes'] = int(stats['likeCount']) if 'likeCount' in stats else 0
+    item['comments_hidden'] = 'commentCount' not in stats
+    item['comments'] = int(stats['commentCount']) if 'commentCount' in stats else 0
+    # Делитель combined_metric (средние просмотры канала) не меняется - метрика растет вместе с просмотрами
+    if item.get('combined_metric') is not None and previous_views > 0:
+        item['combined_metric'] = item['combined_metric'] * item['views'] / previous_views
+
+
+def build_diff(
+    previous: List[Dict],
+    statistics: Dict[str, Dict],
+    found: List[Dict],
+    window_start: Optional[datetime],
+) -> Dict:
+    """
+    Сводит отслеживаемые видео, их свежую статистику и результаты поиска новых видео.
+    Возвращает {'items', 'new', 'rising', 'removed'}: items - новый список отслеживаемых (новые сначала),
+    rising - известные видео с приростом просмотров не меньше saved_search_rising_min_growth.
+    """
+    known_ids = {item['video_id'] for item in previous}
+    new = [item for item in found if item['video_id'] not in known_ids]
+    removed: List[Dict] = []
+    rising: List[Dict] = []
+    kept: List[Dict] = []
+
+    for item in previous:
+        if item['video_id'] not in statistics:
+            removed.append({'video_id': item['video_id'], 'title': item['title'], 'reason': REMOVED_UNAVAILABLE})
+            continue
+        if window_start is not None and _parse_published_at(item['published_at']) < window_start:
+            removed.append({'video_id': item['video_id'], 'title': item['title'], 'reason': REMOVED_OUT_OF_WINDOW})
+            continue
+        previous_views = item.get('views') or 0
+        _apply_statistics(item, statistics[item['video_id']])
+        views_delta = item['views'] - previous_views
+        if views_delta > 0 and views_delta >= previous_views * settings.saved_search_rising_min_growth:
+            rising.append({**item, 'previous_views': previous_views, 'views_delta': views_delta})
+        kept.append(item)
+
+    items = sorted(new + kept, key=lambda item: _parse_published_at(item['published_at']), reverse=True)
+    for item in items[settings.saved_search_max_items:]:
+        removed.append({'video_id': item['video_id'], 'title': item['title'], 'reason': REMOVED_EVICTED})
+    items = items[:settings.saved_search_max_items]
+    evicted_ids = {entry['video_id'] for entry in removed if entry['reason'] == REMOVED_EVICTED}
+
+    rising.sort(key=lambda item: item['views_delta'], reverse=True)
+    return {
+        'items': items,
+        'new': [item for item in new if item['video_id'] not in evicted_ids],
+        'rising': [item for item in rising if item['video_id'] not in evicted_ids][:settings.saved_search_rising_limit],
+        'removed': removed,
+    }
+
+
+async def refresh_saved_search(entry: SavedSearch, redis_client: Optional[redis.Redis]) -> Dict:
+    """
+    Обновляет сохраненный поиск и возвращает разницу с прошлым запуском ({'new', 'rising', 'removed', ...}).
+    Первый запуск - обычный поиск (через общий кэш). Следующие ищут только видео новее прошлого запуска
+    (publishedAfter = last_run_at - saved_search_overlap_seconds), а статистику известных видео
+    обновляют пачками videos.list по 50 ID - 1 unit вместо повторного полного поиска.
+    Запись entry меняется на месте; сохранение - на вызывающем.
+    HTTPException поиска и ApiKeysExhaustedError пробрасываются.
+    """
+    started_at = datetime.now(timezone.utc)
+    incremental = entry.last_run_at is not None
+    window_start = None
+    if entry.date_published_filter != 'all_time':
+        window_start = _parse_published_at(get_rfc3339_date(entry.date_published_filter))
+
+    if not incremental:
+        found, _ = await run_search(entry.kind, entry.query, entry.max_results, entry.date_published_filter, redis_client)
+        previous: List[Dict] = []
+        statistics: Dict[str, Dict] = {}
+        complete = True
+    else:
+        published_after = entry.last_run_at.replace(tzinfo=timezone.utc) - timedelta(seconds=settings.saved_search_overlap_seconds)
+        if window_start is not None:
+            published_after = max(published_after, window_start)
+        found, complete = await fetch_search_results(
+            entry.kind, entry.query, entry.max_results, entry.date_published_filter, published_after=_rfc3339(published_after),
+        )
+        previous = unpack_snapshot(entry)
+        statistics = await fetch_video_statistics([item['video_id'] for item in previous])
+        # Пока выдача не исчерпана, часть новых видео может не попасть в этот запуск
+        complete = complete or len(found) < entry.max_results
+
+    diff = build_diff(previous, statistics, _normalize(found), window_start)
+    # После инкрементального запуска статистика всех отслеживаемых видео свежая - дописываем снимки
+    fresh_ids = {item['video_id'] for item in diff['items']} if incremental else None
+    await apply_view_velocity(redis_client, diff['items'] + diff['rising'], fresh_ids)
+
+    entry.snapshot = pack_snapshot(diff['items'])
+    entry.snapshot_encoding = SNAPSHOT_ENCODING
+    entry.item_count = len(diff['items'])
+    entry.last_run_at = started_at.replace(tzinfo=None)
+    logger.info(
+        f"Saved search {entry.id} refreshed: {len(diff['new'])} new, {len(diff['rising'])} rising, "
+        f"{len(diff['removed'])} removed, {len(statistics)} stats refreshed."
+    )
+    return {**diff, 'new_complete': complete, 'incremental': incremental}
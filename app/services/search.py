@@ -0,0 +1,453 @@
+# app/services/search.py
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.core.youtube import execute_async, get_channel_info, get_rfc3339_date, parse_duration, partial_response
+from app.core.youtube_client_manager import api_key_manager, is_quota_error
+from app.models.search_models import Item
+from app.core.redis_client import get_redis
+from app.services.channels import get_channel_infos_cached
+from app.services.local_index import local_index
+from app.services.video_metadata import load_videos
+
+logger = logging.getLogger(__name__)
+
+SEARCH_KINDS = ('videos', 'shorts')
+DATE_PUBLISHED_FILTERS = ('all_time', 'last_week', 'last_month', 'last_3_month', 'last_6_month', 'last_year')
+
+# Результаты поиска по ключам приложения не зависят от пользователя - кэш общий
+SEARCH_CACHE_KEY_PREFIX = "search:results"
+# Популярность запросов: ZSET, член - JSON [kind, query, date_published], вес - число запросов (с затуханием)
+SEARCH_POPULARITY_KEY = "search:popularity"
+# Поля search.list, которые читают get_videos_page и get_shorts_page (остальное берется из videos.list)
+SEARCH_PAGE_FIELDS = "nextPageToken,pageInfo/totalResults,items(id/videoId,snippet/channelId)"
+
+
+def is_shorts_v(video_r):
+    title = video_r["snippet"].get("title", "").lower()
+    description = video_r["snippet"].get("description", "").lower()
+    duration = parse_duration(video_r.get('contentDetails', {}).get('duration'))
+    return "#shorts" in title or "#shorts" in description or duration <= 60
+
+
+# --- Функция для сборки объекта Item ---
+async def build_search_item_obj(youtube: build, search_r, video_r, channel_id, item_type='video', channel_info: Optional[Dict] = None):
+    """
+    Строит объект Item из данных поиска, видео и канала.
+    channel_info - заранее полученная информация о канале (иначе запрашивается здесь).
+    Обрабатывает возможные HttpError при запросе информации о канале.
+    """
+    try:
+        if channel_info is None:
+            channel_info = await get_channel_info(youtube, channel_id)
+        if not channel_info:
+            return None
+
+        stats = video_r.get('statistics', {})
+        snippet = video_r.get('snippet', {})
+        content_details = video_r.get('contentDetails', {})
+
+        likes = int(stats['likeCount']) if 'likeCount' in stats else 0
+        likes_hidden = 'likeCount' not in stats
+
+        comments = int(stats['commentCount']) if 'commentCount' in stats else 0
+        comments_hidden = 'commentCount' not in stats
+
+        channel_views = channel_info.get('viewCount', 0)
+        channel_video_count = channel_info.get('videoCount', 0)
+
+        avg_views_per_video = float(channel_views) / float(channel_video_count) if channel_video_count > 0 else 0
+        video_views = float(stats.get('viewCount', 0))
+
+        if avg_views_per_video <= 0 and video_views > 0:
+             avg_views_per_video = video_views
+
+        combined_metric = video_views / avg_views_per_video if avg_views_per_video > 0 else None
+
+        video_url = f'https://www.youtube.com/watch?v={video_r["id"]}'
+        if item_type == 'shorts':
+            video_url = f'https://www.youtube.com/shorts/{video_r["id"]}'
+
+        # Используем .get() для большей устойчивости к отсутствующим полям
+        search_item = Item.model_validate({
+            'video_id': video_r.get('id'),
+            'title': snippet.get('title', 'No Title'),
+            'thumbnail': snippet.get('thumbnails', {}).get('high', {}).get('url'),
+            'published_at': snippet.get('publishedAt'),
+            'views': int(stats.get('viewCount', 0)),
+            'channel_title': channel_info.get('channel_title', 'Unknown Channel'),
+            'channel_url': channel_info.get('channel_url', f'https://www.youtube.com/channel/{channel_id}'),
+            'channel_subscribers': channel_info.get('channel_subscribers', 0),
+            'video_count': channel_info.get('videoCount', 0),
+            'likes': likes,
+            'likes_hidden': likes_hidden,
+            'comments': comments,
+            'comments_hidden': comments_hidden,
+            'combined_metric': combined_metric,
+            'duration': parse_duration(content_details.get('duration')),
+            'video_url': video_url,
+            'channel_thumbnail': channel_info.get('channel_thumbnail'),
+        })
+        item = search_item.model_dump()
+        local_index.submit('shorts' if item_type == 'shorts' else 'videos', item, snippet.get('description', ''))
+        return item
+
+    except HttpError as e:
+         logger.error(f"HttpError in build_search_item_obj (channel_id: {channel_id}, video_id: {video_r.get('id', 'N/A')}): {e.status_code} - {e.reason}")
+         raise e
+    except KeyError as e:
+        logger.error(f"KeyError building item for video ID {video_r.get('id', 'N/A')}: Missing key {e}")
+        return None
+    except Exception as e:
+        logger.exception(f"Unexpected error building item for video ID {video_r.get('id', 'N/A')}: {e}")
+        return None
+
+
+# --- Функция для получения пачки видео ---
+async def get_videos_page(youtube: build, encoded_query, max_results_target, date_published, current_results, page_token=None):
+    """
+    Получает одну страницу результатов поиска видео и их детали.
+    Фильтрует shorts.
+    Пробрасывает HttpError при ошибках API.
+    Возвращает: (list_of_items_on_page, next_page_token, total_results_estimate)
+    """
+    try:
+        logger.info(f"API Call: youtube.search().list (videos, query='{encoded_query}', page_token={page_token is not None})")
+        search_response_dict = await execute_async(youtube.search().list(
+            q=encoded_query, part='snippet', type='video',
+            pageToken=page_token, publishedAfter=date_published, maxResults=50,
+            **partial_response(SEARCH_PAGE_FIELDS),
+        ))
+    except HttpError as e:
+        logger.error(f"HttpError during youtube.search().list: {e.status_code} - {e.reason}")
+        raise e
+    except Exception as e:
+        logger.exception(f"Unexpected error during youtube.search().list: {e}")
+        raise HTTPException(status_code=500, detail=f"YouTube API search unexpected error: {e}")
+
+    total_results = search_response_dict.get('pageInfo', {}).get('totalResults', 0)
+    next_page_token_from_api = search_response_dict.get('nextPageToken')
+    search_items = search_response_dict.get('items', [])
+    logger.debug(f"Search page results: {len(search_items)} items found. Next page: {'Yes' if next_page_token_from_api else 'No'}")
+
+    if not search_items:
+        return [], None, total_results
+
+    video_ids = [item["id"]["videoId"] for item in search_items if item.get("id", {}).get("videoId")]
+    if not video_ids:
+        return [], next_page_token_from_api, total_results
+
+    try:
+        # Видео и каналы страницы - общими для одновременных поисков вызовами videos.list / channels.list
+        video_details_map = await load_videos(youtube, video_ids)
+        channel_infos = await get_channel_infos_cached(
+            youtube, (video.get('snippet', {}).get('channelId') for video in video_details_map.values()), get_redis(),
+        )
+    except HttpError as e:
+        logger.error(f"HttpError during youtube.videos().list: {e.status_code} - {e.reason}")
+        raise e
+    except Exception as e:
+        logger.exception(f"Unexpected error during youtube.videos().list: {e}")
+        raise HTTPException(status_code=500, detail=f"YouTube API videos.list unexpected error: {e}")
+
+    page_results = []
+    processed_count = 0
+
+    for search_item in search_items:
+        video_id = search_item.get("id", {}).get("videoId")
+        channel_id = search_item.get("snippet", {}).get("channelId")
+        video_detail = video_details_map.get(video_id)
+
+        if not video_id or not channel_id or not video_detail: continue
+
+        # Фильтруем shorts
+        if is_shorts_v(video_detail):
+            logger.debug(f"Skipping video {video_id} in /videos search as it's shorts.")
+            continue
+
+        try:
+            built_item = await build_search_item_obj(youtube, search_item, video_detail, channel_id, 'video', channel_infos.get(channel_id, {}))
+        except HttpError as e:
+            logger.error(f"HttpError from build_search_item_obj for video {video_id}: {e.status_code}")
+            raise e # Пробрасываем для ротации
+
+        if built_item:
+            page_results.append(built_item)
+            processed_count += 1
+            # Проверяем общее количество с учетом уже имеющихся результатов
+            if len(current_results) + len(page_results) >= max_results_target:
+                 logger.debug(f"Reached max_results_target ({max_results_target}) within get_videos_page. Stopping processing.")
+                 break # Прерываем обработку этой страницы
+
+    logger.info(f"Processed {processed_count} valid videos from this API page.")
+    return page_results, next_page_token_from_api, total_results
+
+
+# --- Функция для получения пачки Shorts ---
+async def get_shorts_page(youtube: build, encoded_query, max_results_target, date_published, current_results, page_token=None):
+    """
+    Получает одну страницу результатов поиска shorts и их детали.
+    Фильтрует не-shorts.
+    Пробрасывает HttpError при ошибках API.
+    Возвращает: (list_of_items_on_page, next_page_token, total_results_estimate)
+    """
+    try:
+        logger.info(f"API Call: youtube.search().list (shorts, query='{encoded_query}', page_token={page_token is not None})")
+        search_response_dict = await execute_async(youtube.search().list(
+            q=encoded_query, part='snippet', type='video', videoDuration='short', # videoDuration может быть неточным
+            pageToken=page_token, publishedAfter=date_published, maxResults=50,
+            **partial_response(SEARCH_PAGE_FIELDS),
+        ))
+    except HttpError as e:
+        logger.error(f"HttpError during youtube.search().list (shorts): {e.status_code} - {e.reason}")
+        raise e
+    except Exception as e:
+        logger.exception(f"Unexpected error during youtube.search().list (shorts): {e}")
+        raise HTTPException(status_code=500, detail=f"YouTube API search unexpected error: {e}")
+
+    total_results = search_response_dict.get('pageInfo', {}).get('totalResults', 0)
+    next_page_token_from_api = search_response_dict.get('nextPageToken')
+    search_items = search_response_dict.get('items', [])
+    logger.debug(f"Search page results (shorts): {len(search_items)} items found. Next page: {'Yes' if next_page_token_from_api else 'No'}")
+
+    if not search_items:
+        return [], None, total_results
+
+    video_ids = [item["id"]["videoId"] for item in search_items if item.get("id", {}).get("videoId")]
+    if not video_ids:
+        return [], next_page_token_from_api, total_results
+
+    try:
+        # Видео и каналы страницы - общими для одновременных поисков вызовами videos.list / channels.list
+        video_details_map = await load_videos(youtube, video_ids)
+        channel_infos = await get_channel_infos_cached(
+            youtube, (video.get('snippet', {}).get('channelId') for video in video_details_map.values()), get_redis(),
+        )
+    except HttpError as e:
+        logger.error(f"HttpError during youtube.videos().list (shorts): {e.status_code} - {e.reason}")
+        raise e
+    except Exception as e:
+        logger.exception(f"Unexpected error during youtube.videos().list (shorts): {e}")
+        raise HTTPException(status_code=500, detail=f"YouTube API videos.list unexpected error: {e}")
+
+    page_results = []
+    processed_count = 0
+
+    for search_item in search_items:
+        video_id = search_item.get("id", {}).get("videoId")
+        channel_id = search_item.get("snippet", {}).get("channelId")
+        video_detail = video_details_map.get(video_id)
+
+        if not video_id or not channel_id or not video_detail: continue
+
+        # Используем is_shorts_v для строгой проверки
+        if not is_shorts_v(video_detail):
+            logger.debug(f"Skipping video {video_id} in /shorts search as it fails duration/tags check.")
+            continue
+
+        try:
+            built_item = await build_search_item_obj(youtube, search_item, video_detail, channel_id, 'shorts', channel_infos.get(channel_id, {}))
+        except HttpError as e:
+            logger.error(f"HttpError from build_search_item_obj for short {video_id}: {e.status_code}")
+            raise e # Пробрасываем
+
+        if built_item:
+            page_results.append(built_item)
+            processed_count += 1
+            if len(current_results) + len(page_results) >= max_results_target:
+                 logger.debug(f"Reached max_results_target ({max_results_target}) within get_shorts_page. Stopping processing.")
+                 break
+
+    logger.info(f"Processed {processed_count} valid shorts from this API page.")
+    return page_results, next_page_token_from_api, total_results
+
+
+
+
+def normalize_query(query: str) -> str:
+    """Запросы, отличающиеся только регистром и пробелами, считаются одинаковыми (для кэша и популярности)."""
+    return ' '.join(query.split()).casefold()
+
+
+def _cache_key(kind: str, query: str, date_published_filter: str) -> str:
+    query_hash = hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()[:32]
+    return f"{SEARCH_CACHE_KEY_PREFIX}:{kind}:{date_published_filter}:{query_hash}"
+
+
+async def get_cached_search(redis_client: Optional[redis.Redis], kind: str, query: str, date_published_filter: str) -> Optional[Dict]:
+    """Закэшированный результат поиска: {'refreshed_at', 'complete', 'items'} или None."""
+    if redis_client is None:
+        return None
+    try:
+        cached = await redis_client.get(_cache_key(kind, query, date_published_filter))
+        return json.loads(cached) if cached else None
+    except (redis.RedisError, ValueError) as e:
+        logger.warning(f"Could not read search cache: {e}")
+        return None
+
+
+async def store_cached_search(redis_client: Optional[redis.Redis], kind: str, query: str, date_published_filter: str, items: List[Dict], complete: bool) -> None:
+    if redis_client is None:
+        return
+    payload = json.dumps({'refreshed_at': time.time(), 'complete': complete, 'items': items}, default=str)
+    try:
+        await redis_client.set(_cache_key(kind, query, date_published_filter), payload, ex=settings.search_cache_ttl_seconds)
+    except redis.RedisError as e:
+        logger.warning(f"Could not write search cache: {e}")
+
+
+async def record_search_popularity(redis_client: Optional[redis.Redis], kind: str, query: str, date_published_filter: str) -> None:
+    """Учитывает запрос в рейтинге популярности (используется прогревом кэша)."""
+    if redis_client is None:
+        return
+    member = json.dumps([kind, normalize_query(query), date_published_filter], ensure_ascii=False)
+    try:
+        await redis_client.zincrby(SEARCH_POPULARITY_KEY, 1, member)
+    except redis.RedisError as e:
+        logger.warning(f"Could not record search popularity: {e}")
+
+
+async def fetch_search_results(
+    kind: str,
+    query: str,
+    max_results: int,
+    date_published_filter: str,
+    published_after: Optional[str] = None,
+) -> Tuple[List[Dict], bool]:
+    """
+    Выполняет поиск через пул API-ключей приложения с ротацией при ошибках квоты.
+    published_after (RFC 3339) заменяет границу date_published_filter (инкрементальное обновление сохраненных поисков).
+    Возвращает (items, complete): complete=True, если выдача закончилась раньше max_results.
+    """
+    page_fetcher = get_videos_page if kind == 'videos' else get_shorts_page
+    encoded_query = quote(query, safe="")
+    rfc3339_date = get_rfc3339_date(date_published_filter) if date_published_filter != 'all_time' else None
+    if published_after is not None:
+        rfc3339_date = published_after
+    all_results = []
+    complete = False
+    # Ограничение страниц API для одного запроса
+    max_pages_to_fetch = 1 # Можно вынести в конфиг
+    attempts = 0
+    max_attempts = (len(api_key_manager.keys) if api_key_manager.keys else 0) + 1
+
+    while attempts < max_attempts:
+        youtube = api_key_manager.get_client()
+        if youtube is None:
+            logger.error(f"Failed to get YouTube client for {kind} (attempt {attempts + 1}). Keys exhausted or not configured.")
+            if attempts == 0 and not api_key_manager.keys:
+                 raise HTTPException(status_code=500, detail="YouTube API keys are not configured.")
+            raise HTTPException(status_code=503, detail="Service temporarily unavailable due to API quota limits.")
+
+        current_key_index = api_key_manager._last_used_index
+        logger.info(f"Attempt {attempts + 1}/{max_attempts} for {kind} using API key index {current_key_index}")
+
+        try:
+            # Начинаем сбор результатов для ЭТОЙ попытки
+            attempt_results = []
+            next_page_token = None # Сбрасываем пагинацию для новой попытки
+
+            for page_num in range(max_pages_to_fetch):
+                logger.debug(f"Fetching {kind} page {page_num + 1} (attempt {attempts + 1})")
+
+                page_items, page_next_token, _ = await page_fetcher(
+                    youtube=youtube,
+                    encoded_query=encoded_query,
+                    max_results_target=max_results,
+                    date_published=rfc3339_date,
+                    current_results=attempt_results, # Передаем текущие результаты этой попытки
+                    page_token=next_page_token
+                )
+
+                attempt_results.extend(page_items)
+                next_page_token = page_next_token # Токен для следующей страницы этой попытки
+
+                logger.debug(f"Page {page_num + 1} completed. Results this attempt: {len(attempt_results)}. Next page: {'Yes' if next_page_token else 'No'}")
+
+                if len(attempt_results) >= max_results or not next_page_token:
+                    logger.info(f"Stopping pagination for attempt {attempts + 1}: reached max results ({len(attempt_results)}) or no more pages.")
+                    complete = not next_page_token and len(attempt_results) < max_results
+                    break # Выходим из цикла пагинации (for page_num...)
+            # --- КОНЕЦ ЦИКЛА ПАГИНАЦИИ ---
+
+            logger.info(f"Successfully completed {kind} API calls with key index {current_key_index} (attempt {attempts + 1}). Found {len(attempt_results)} items.")
+            all_results = attempt_results # Сохраняем результаты успешной попытки
+            break # Выходим из цикла попыток (while attempts...)
+
+        except HttpError as e:
+            logger.warning(f"HttpError with key index {current_key_index} ({kind} attempt {attempts + 1}): {e.status_code} - {e.reason}")
+            if is_quota_error(e):
+                logger.warning(f"Quota exceeded for API key index {current_key_index}.")
+                api_key_manager.mark_last_used_key_exhausted()
+                attempts += 1
+                logger.info(f"Switching key. Starting attempt {attempts + 1}.")
+                continue # К следующей попытке
+            elif e.status_code in [400, 404]:
+                 logger.error(f"Client/Not Found Error (key {current_key_index}): {e.status_code} - {e.reason}. Content: {e.content.decode('utf-8')}")
+                 raise HTTPException(status_code=e.status_code, detail=f"YouTube API request error: {e.reason}")
+            elif e.status_code in [401, 403]:
+                 logger.error(f"Auth/Permission Error (key {current_key_index}, not quota): {e.status_code}. Content: {e.content.decode('utf-8')}")
+                 raise HTTPException(status_code=500, detail="YouTube API authorization error with backend key.")
+            else:
+                logger.error(f"Unhandled HttpError (key {current_key_index}): {e.status_code}. Content: {e.content.decode('utf-8')}")
+                raise HTTPException(status_code=502, detail=f"YouTube API upstream error: {e.reason}")
+        except HTTPException:
+            raise
+        except Exception as e:
+             logger.exception(f"Unexpected error during {kind} search (attempt {attempts + 1})")
+             raise HTTPException(status_code=500, detail=f"Internal server error during {kind} search: {str(e)}")
+    # --- КОНЕЦ ЦИКЛА ПОПЫТОК ---
+
+    if attempts >= max_attempts:
+         logger.error(f"Failed to complete {kind} search after {attempts} attempts. All keys exhausted?")
+         if not all_results: # Если совсем ничего не нашли
+             raise HTTPException(status_code=503, detail="Service temporarily unavailable due to API quota limits.")
+         else: # Если нашли что-то, но не смогли завершить (редко)
+              logger.warning(f"Returning potentially incomplete {kind} results ({len(all_results)})")
+
+    return all_results[:max_results], complete
+
+
+async def run_search(
+    kind: str,
+    query: str,
+    max_results: int,
+    date_published_filter: str,
+    redis_client: Optional[redis.Redis],
+    use_cache: bool = True,
+) -> Tuple[List[Dict], bool]:
+    """
+    Общая точка входа поиска (эндпоинты /search/* и прогрев кэша).
+    Отдает результат из общего кэша, если в нем не меньше max_results элементов (или выдача в кэше полная),
+    иначе ищет через API и обновляет кэш. Если квота всех ключей исчерпана - ищет в локальном индексе.
+    Возвращает (items, from_cache).
+    """
+    if use_cache:
+        cached = await get_cached_search(redis_client, kind, query, date_published_filter)
+        if cached and (len(cached['items']) >= max_results or cached.get('complete')):
+            logger.info(f"Search cache hit for {kind} query (date={date_published_filter}).")
+            return cached['items'][:max_results], True
+
+    try:
+        items, complete = await fetch_search_results(kind, query, max_results, date_published_filter)
+    except HTTPException as e:
+        if e.status_code != 503 or not settings.local_index_fallback_enabled:
+            raise
+        # Все ключи исчерпаны - отвечаем из локального индекса ранее виденных видео
+        items = await local_index.search(query, kind, max_results, get_rfc3339_date(date_published_filter))
+        if not items:
+            raise
+        logger.warning(f"API quota exhausted, {kind} search served from local index ({len(items)} items).")
+        return items, True
+    await store_cached_search(redis_client, kind, query, date_published_filter, items, complete)
+    return items, False
@@ -0,0 +1,88 @@
+# app/services/search_history.py
+import hashlib
+import json
+import logging
+import secrets
+import uuid
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from app.core.compression import SUPPORTED_ENCODINGS, compress, decompress
+from app.core.config import settings
+from app.core.database import engine
+from app.models.search_history import SearchHistory
+from app.services.search import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# zstd сжимает однотипный JSON выдачи в разы лучше gzip; без zstandard - gzip
+SNAPSHOT_ENCODING = "zstd" if "zstd" in SUPPORTED_ENCODINGS else "gzip"
+
+
+def search_params_hash(kind: str, query: str, date_published_filter: str) -> str:
+    """Ключ параметров поиска: повтор того же поиска обновляет запись истории, а не добавляет новую."""
+    raw = json.dumps([kind, normalize_query(query), date_published_filter], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def pack_snapshot(items: List[Dict]) -> bytes:
+    return compress(json.dumps(items, default=str, separators=(',', ':')).encode('utf-8'), SNAPSHOT_ENCODING)
+
+
+def unpack_snapshot(entry: SearchHistory) -> List[Dict]:
+    return json.loads(decompress(entry.snapshot, entry.snapshot_encoding))
+
+
+def new_share_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def save_search_snapshot(
+    user_id: uuid.UUID,
+    kind: str,
+    query: str,
+    date_published_filter: str,
+    max_results: int,
+    items: List[Dict],
+) -> int:
+    """
+    Сохраняет результат поиска в историю пользователя (синхронно, вызывать через asyncio.to_thread).
+    Записи сверх search_history_max_entries (самые старые) удаляются. Возвращает id записи.
+    """
+    params_hash = search_params_hash(kind, query, date_published_filter)
+    with Session(engine) as session:
+        entry = session.exec(
+            select(SearchHistory)
+            .where(SearchHistory.user_id == user_id)
+            .where(SearchHistory.params_hash == params_hash)
+        ).first()
+        if entry is None:
+            entry = SearchHistory(
+                user_id=user_id, kind=kind, params_hash=params_hash,
+                date_published_filter=date_published_filter,
+                query=query, max_results=max_results, item_count=0,
+                snapshot=b'', snapshot_encoding=SNAPSHOT_ENCODING,
+            )
+        entry.query = query
+        entry.max_results = max_results
+        entry.item_count = len(items)
+        entry.snapshot = pack_snapshot(items)
+        entry.snapshot_encoding = SNAPSHOT_ENCODING
+        entry.added_at = datetime.now()
+        session.add(entry)
+        session.commit()
+        session.refresh(entry)
+
+        stale_ids = session.exec(
+            select(SearchHistory.id)
+            .where(SearchHistory.user_id == user_id)
+            .order_by(SearchHistory.added_at.desc(), SearchHistory.id.desc())
+            .offset(settings.search_history_max_entries)
+        ).all()
+        if stale_ids:
+            session.exec(delete(SearchHistory).where(SearchHistory.id.in_(stale_ids)))
+            session.commit()
+        return entry.id
@@ -0,0 +1,77 @@
+# app/services/search_prewarmer.py
+import json
+import logging
+import time
+from typing import List, Optional, Tuple
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.quota_ledger import get_spare_units
+from app.core.redis_client import get_redis
+from app.core.youtube_client_manager import api_key_manager
+from app.services.search import SEARCH_POPULARITY_KEY, get_cached_search, run_search
+from app.services.video_snapshots import apply_view_velocity
+
+logger = logging.getLogger(__name__)
+
+# Примерная стоимость одного прогрева: search.list (100) + videos.list (1) + channels.list по каналам выдачи
+SEARCH_PREWARM_COST_UNITS = 100 + 1 + 50
+# Запросы, чья популярность после затухания упала ниже порога, забываются
+SEARCH_POPULARITY_MIN_SCORE = 0.1
+
+
+async def _top_queries(redis_client: redis.Redis, limit: int) -> List[Tuple[str, str, str]]:
+    members = await redis_client.zrevrange(SEARCH_POPULARITY_KEY, 0, limit - 1)
+    queries = []
+    for member in members:
+        try:
+            kind, query, date_published_filter = json.loads(member)
+        except ValueError:
+            continue
+        queries.append((kind, query, date_published_filter))
+    return queries
+
+
+async def _decay_popularity(redis_client: redis.Redis) -> None:
+    """Затухание популярности: старые запросы постепенно уступают место новым; нулевые удаляются."""
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.zunionstore(SEARCH_POPULARITY_KEY, {SEARCH_POPULARITY_KEY: settings.search_popularity_decay})
+        pipe.zremrangebyscore(SEARCH_POPULARITY_KEY, "-inf", SEARCH_POPULARITY_MIN_SCORE)
+        await pipe.execute()
+
+
+async def prewarm_popular_searches(redis_client: Optional[redis.Redis] = None) -> int:
+    """
+    Обновляет кэш результатов для top-N популярных запросов, пока по учету квоты
+    остается больше search_prewarm_reserve_units. Возвращает число обновленных запросов.
+    """
+    redis_client = redis_client or get_redis()
+    if redis_client is None:
+        return 0
+
+    refreshed = 0
+    min_age = settings.search_prewarm_min_age_seconds
+    for kind, query, date_published_filter in await _top_queries(redis_client, settings.search_prewarm_top_n):
+        spare = await get_spare_units(redis_client, api_key_manager.available_keys())
+        if spare - SEARCH_PREWARM_COST_UNITS < settings.search_prewarm_reserve_units:
+            logger.info(f"Search prewarm stopped: {spare} spare units left (reserve {settings.search_prewarm_reserve_units}).")
+            break
+
+        cached = await get_cached_search(redis_client, kind, query, date_published_filter)
+        if cached and time.time() - cached.get('refreshed_at', 0) < min_age:
+            continue # Уже свежий (прогрет ранее или недавно запрошен пользователем)
+
+        try:
+            items, _ = await run_search(kind, query, settings.search_prewarm_max_results, date_published_filter, redis_client, use_cache=False)
+            # Свежая статистика популярных видео пополняет ряды снимков
+            await apply_view_velocity(redis_client, items, {item['video_id'] for item in items})
+            refreshed += 1
+        except HTTPException as e:
+            logger.warning(f"Search prewarm failed for {kind} query (date={date_published_filter}): {e.status_code} {e.detail}")
+            if e.status_code == 503: # Ключи исчерпаны
+                break
+
+    await _decay_popularity(redis_client)
+    return refreshed
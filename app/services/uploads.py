@@ -0,0 +1,305 @@
+# app/services/uploads.py
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+import redis.asyncio as redis
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.core.youtube import execute_async, get_uploads_playlist_id, partial_response
+from app.core.youtube_client_manager import api_key_manager
+
+logger = logging.getLogger(__name__)
+
+# Кэш общий для всех пользователей: загрузки канала не зависят от того, кто их запросил
+UPLOADS_CACHE_KEY_PREFIX = "uploads:channel"
+# Ключ живет дольше, чем считается свежим: устаревший список - база для инкрементального обновления
+UPLOADS_CACHE_KEY_TTL_SECONDS = 7 * 24 * 60 * 60
+# При наличии кэша сначала запрашиваем маленькую страницу - обычно новых видео единицы
+UPLOADS_INCREMENTAL_PAGE_SIZE = 10
+UPLOADS_FULL_PAGE_SIZE = 50
+# Описание хранится для поиска по избранному (/favorites/search); длиннее - обрезается, чтобы кэш оставался компактным
+UPLOADS_DESCRIPTION_MAX_CHARS = 1000
+
+# Обновления одного канала, уже выполняющиеся в этом процессе (защита от одновременных одинаковых запросов)
+_inflight_refreshes: Dict[str, asyncio.Task] = {}
+
+
+def _cache_key(channel_id: str) -> str:
+    return f"{UPLOADS_CACHE_KEY_PREFIX}:{channel_id}"
+
+
+# Поля playlistItems.list, которые читают parse_playlist_item и постраничный обход
+PLAYLIST_PAGE_FIELDS = (
+    "nextPageToken,items(contentDetails(videoId,videoPublishedAt),snippet(resourceId/videoId,"
+    "thumbnails(high/url,medium/url,default/url),videoOwnerChannelId,videoOwnerChannelTitle,channelId,channelTitle,title,description))"
+)
+
+
+def parse_playlist_item(raw_item: Dict) -> Optional[Dict]:
+    """
+    Преобразует элемент playlistItems.list в компактную запись загрузки.
+    Возвращает None для приватных/удаленных видео (у них нет videoPublishedAt).
+    """
+    snippet = raw_item.get('snippet', {})
+    content_details = raw_item.get('contentDetails', {})
+    video_id = content_details.get('videoId') or snippet.get('resourceId', {}).get('videoId')
+    published_at = content_details.get('videoPublishedAt')
+    if not video_id or not published_at:
+        return None
+
+    thumbnails = snippet.get('thumbnails', {})
+    thumbnail = next(
+        (thumbnails[size]['url'] for size in ('high', 'medium', 'default') if size in thumbnails),
+        f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',
+    )
+    channel_id = snippet.get('videoOwnerChannelId') or snippet.get('channelId')
+    return {
+        'video_id': video_id,
+        'title': snippet.get('title', 'No Title'),
+        'thumbnail': thumbnail,
+        'published_at': published_at,
+        'channel_id': channel_id,
+        'channel_title': snippet.get('videoOwnerChannelTitle') or snippet.get('channelTitle', ''),
+        'video_url': f'https://www.youtube.com/watch?v={video_id}',
+        'description': snippet.get('description', '')[:UPLOADS_DESCRIPTION_MAX_CHARS],
+    }
+
+
+async def _load_cached(redis_client: Optional[redis.Redis], channel_id: str) -> Optional[Dict]:
+    if redis_client is None:
+        return None
+    try:
+        raw = await redis_client.get(_cache_key(channel_id))
+    except redis.RedisError as e:
+        logger.warning(f"Redis error reading uploads cache for {channel_id}: {e}")
+        return None
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        logger.warning(f"Corrupted uploads cache entry for {channel_id}, ignoring it.")
+        return None
+
+
+async def _store_cached(redis_client: Optional[redis.Redis], channel_id: str, items: List[Dict]) -> None:
+    if redis_client is None:
+        return
+    payload = json.dumps({'refreshed_at': time.time(), 'items': items})
+    try:
+        await redis_client.set(_cache_key(channel_id), payload, ex=UPLOADS_CACHE_KEY_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning(f"Redis error writing uploads cache for {channel_id}: {e}")
+
+
+async def _execute(youtube: Optional[build], make_request):
+    # youtube=None - ключи пула с переключением при исчерпании квоты (ApiKeysExhaustedError пробрасывается)
+    if youtube is None:
+        return await api_key_manager.execute(make_request)
+    return await execute_async(make_request(youtube))
+
+
+async def _fetch_new_uploads(youtube: Optional[build], channel_id: str, known_ids: Set[str], max_items: int) -> List[Dict]:
+    """
+    Читает плейлист загрузок от новых к старым, пока не встретит уже закэшированное видео.
+    Каждая страница стоит 1 unit квоты.
+    """
+    playlist_id = get_uploads_playlist_id(channel_id)
+    page_size = UPLOADS_INCREMENTAL_PAGE_SIZE if known_ids else UPLOADS_FULL_PAGE_SIZE
+    page_token = None
+    new_items: List[Dict] = []
+
+    while len(new_items) < max_items:
+        logger.info(f"API Call: youtube.playlistItems().list (playlist={playlist_id}, page_size={page_size}, page_token={page_token is not None})")
+        response = await _execute(youtube, lambda youtube: youtube.playlistItems().list(
+            part='snippet,contentDetails', playlistId=playlist_id,
+            maxResults=page_size, pageToken=page_token, **partial_response(PLAYLIST_PAGE_FIELDS),
+        ))
+
+        reached_known = False
+        for raw_item in response.get('items', []):
+            video_id = raw_item.get('contentDetails', {}).get('videoId')
+            if video_id in known_ids:
+                reached_known = True
+                break
+            parsed = parse_playlist_item(raw_item)
+            if parsed:
+                new_items.append(parsed)
+
+        page_token = response.get('nextPageToken')
+        if reached_known or not page_token:
+            break
+        page_size = UPLOADS_FULL_PAGE_SIZE
+
+    return new_items[:max_items]
+
+
+def _merge_uploads(new_items: Iterable[Dict], cached_items: Iterable[Dict], max_items: int) -> List[Dict]:
+    merged: Dict[str, Dict] = {}
+    for item in list(new_items) + list(cached_items):
+        merged.setdefault(item['video_id'], item)
+    ordered = sorted(merged.values(), key=lambda i: (i['published_at'], i['video_id']), reverse=True)
+    return ordered[:max_items]
+
+
+async def _refresh_channel_uploads(youtube: Optional[build], channel_id: str, redis_client: Optional[redis.Redis], cached: Optional[Dict]) -> List[Dict]:
+    max_items = settings.uploads_cache_max_items
+    cached_items = cached['items'] if cached else []
+    known_ids = {item['video_id'] for item in cached_items}
+
+    try:
+        new_items = await _fetch_new_uploads(youtube, channel_id, known_ids, max_items)
+    except HttpError as e:
+        if cached:
+            logger.warning(f"HttpError refreshing uploads for {channel_id}: {e.status_code}. Serving stale cache.")
+            return cached_items
+        if e.status_code == 404:
+            # У канала нет плейлиста загрузок (нет видео) - кэшируем пустой список
+            logger.info(f"Uploads playlist not found for channel {channel_id}.")
+            new_items = []
+        else:
+            raise
+
+    items = _merge_uploads(new_items, cached_items, max_items)
+    logger.debug(f"Uploads for {channel_id}: {len(new_items)} new, {len(items)} total in cache.")
+    await _store_cached(redis_client, channel_id, items)
+    return items
+
+
+async def get_channel_uploads(youtube: Optional[build], channel_id: str, redis_client: Optional[redis.Redis]) -> List[Dict]:
+    """
+    Возвращает последние загрузки канала (новые сначала).
+    Свежий кэш отдается без обращения к API, устаревший дополняется только новыми видео.
+    youtube=None - запросы идут ключами пула через api_key_manager.execute.
+    """
+    cached = await _load_cached(redis_client, channel_id)
+    if cached and time.time() - cached.get('refreshed_at', 0) < settings.uploads_cache_ttl_seconds:
+        return cached['items']
+
+    task = _inflight_refreshes.get(channel_id)
+    if task is None:
+        task = asyncio.ensure_future(_refresh_channel_uploads(youtube, channel_id, redis_client, cached))
+        _inflight_refreshes[channel_id] = task
+        task.add_done_callback(lambda _: _inflight_refreshes.pop(channel_id, None))
+    return await asyncio.shield(task)
+
+
+async def _iter_cached(items: List[Dict]) -> AsyncIterator[Dict]:
+    for item in items:
+        yield item
+
+
+async def _iter_playlist_uploads(youtube: build, channel_id: str, first_page_size: int) -> AsyncIterator[Dict]:
+    """Лениво читает плейлист загрузок постранично (1 unit за страницу), от новых к старым."""
+    playlist_id = get_uploads_playlist_id(channel_id)
+    page_size = min(first_page_size, UPLOADS_FULL_PAGE_SIZE)
+    page_token = None
+    while True:
+        logger.info(f"API Call: youtube.playlistItems().list (playlist={playlist_id}, page_size={page_size}, page_token={page_token is not None})")
+        try:
+            response = await execute_async(youtube.playlistItems().list(
+                part='snippet,contentDetails', playlistId=playlist_id,
+                maxResults=page_size, pageToken=page_token, **partial_response(PLAYLIST_PAGE_FIELDS),
+            ))
+        except HttpError as e:
+            if e.status_code == 404:
+                logger.info(f"Uploads playlist not found for channel {channel_id}.")
+                return
+            raise
+        for raw_item in response.get('items', []):
+            parsed = parse_playlist_item(raw_item)
+            if parsed:
+                yield parsed
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+        page_size = UPLOADS_FULL_PAGE_SIZE
+
+
+async def get_latest_uploads(
+    youtube: build,
+    channel_id: str,
+    redis_client: Optional[redis.Redis],
+    count: int,
+    published_after: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Возвращает до count последних загрузок канала, опубликованных позже published_after (RFC 3339, UTC).
+    Если запрос покрывается общим кэшем загрузок - API не вызывается (или одна страница при обновлении),
+    иначе плейлист читается постранично и чтение прекращается, как только набрано count видео
+    или встретилось видео старше published_after.
+    """
+    cached_items = await get_channel_uploads(youtube, channel_id, redis_client)
+    # Кэш короче максимума - значит на канале меньше загрузок, и кэш содержит их все
+    cache_is_complete = len(cached_items) < settings.uploads_cache_max_items
+    reaches_bound = bool(published_after and cached_items and cached_items[-1]['published_at'] < published_after)
+
+    if len(cached_items) >= count or cache_is_complete or reaches_bound:
+        logger.debug(f"Latest uploads for {channel_id} served from cache.")
+        source = _iter_cached(cached_items)
+    else:
+        source = _iter_playlist_uploads(youtube, channel_id, count)
+
+    results: List[Dict] = []
+    async for item in source:
+        if published_after and item['published_at'] <= published_after:
+            break
+        results.append(item)
+        if len(results) >= count:
+            break
+    await source.aclose()
+    return results
+
+
+async def get_cached_latest_published(redis_client: Optional[redis.Redis], channel_ids: List[str]) -> Dict[str, str]:
+    """
+    Возвращает дату последней загрузки по данным кэша (без обращения к API).
+    Каналы без кэша или без видео в результат не попадают.
+    """
+    if redis_client is None or not channel_ids:
+        return {}
+    try:
+        raw_entries = await redis_client.mget([_cache_key(cid) for cid in channel_ids])
+    except redis.RedisError as e:
+        logger.warning(f"Redis error reading uploads cache in bulk: {e}")
+        return {}
+
+    latest: Dict[str, str] = {}
+    for channel_id, raw in zip(channel_ids, raw_entries):
+        if not raw:
+            continue
+        try:
+            items = json.loads(raw).get('items', [])
+        except ValueError:
+            continue
+        if items:
+            latest[channel_id] = items[0]['published_at']
+    return latest
+
+
+async def get_uploads_for_channels(youtube: build, channel_ids: Iterable[str], redis_client: Optional[redis.Redis]) -> Dict[str, List[Dict]]:
+    """
+    Параллельно получает загрузки нескольких каналов.
+    Каналы, для которых запрос не удался, пропускаются (ошибка логируется).
+    """
+    semaphore = asyncio.Semaphore(settings.favorites_feed_concurrency)
+
+    async def fetch(channel_id: str) -> List[Dict]:
+        async with semaphore:
+            return await get_channel_uploads(youtube, channel_id, redis_client)
+
+    channel_ids = list(dict.fromkeys(channel_ids))
+    results = await asyncio.gather(*(fetch(cid) for cid in channel_ids), return_exceptions=True)
+
+    uploads: Dict[str, List[Dict]] = {}
+    for channel_id, result in zip(channel_ids, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to get uploads for channel {channel_id}: {result}")
+            continue
+        uploads[channel_id] = result
+    return uploads
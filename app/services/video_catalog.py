@@ -0,0 +1,227 @@
+# app/services/video_catalog.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.database import DIALECT_INSERTS, engine
+from app.models.video import Video, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Сколько видео максимум записывается одной транзакцией
+WRITE_BATCH_SIZE = 500
+# Сколько ID в одном IN (...) при чтении
+READ_BATCH_SIZE = 500
+
+_STATS_COLUMNS = ('views', 'likes', 'comments', 'stats_updated_at')
+_METADATA_COLUMNS = ('channel_id', 'channel_title', 'title', 'thumbnail', 'published_at', 'duration', 'metadata_updated_at')
+
+_video_table = Video.__table__
+_UPDATE_STATS = (
+    update(_video_table)
+    .where(_video_table.c.video_id == bindparam('b_video_id'))
+    .where(_video_table.c.stats_updated_at <= bindparam('b_stats_updated_at'))
+    .values(
+        views=bindparam('b_views'), likes=bindparam('b_likes'), comments=bindparam('b_comments'),
+        stats_updated_at=bindparam('b_stats_updated_at'),
+    )
+)
+
+
+def _parse_published_at(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+# Поля videos.list (part=statistics), которые читают _stats_row и остальные потребители статистики видео
+VIDEO_STATISTICS_FIELDS = "items(id,statistics(viewCount,likeCount,commentCount))"
+
+
+def _stats_row(statistics: Dict, fetched_at: datetime) -> Dict:
+    return {
+        'views': int(statistics.get('viewCount', 0)),
+        'likes': int(statistics['likeCount']) if 'likeCount' in statistics else None,
+        'comments': int(statistics['commentCount']) if 'commentCount' in statistics else None,
+        'stats_updated_at': fetched_at,
+    }
+
+
+def _metadata_row(video_detail: Dict, fetched_at: datetime) -> Optional[Dict]:
+    snippet = video_detail.get('snippet', {})
+    if not (snippet.get('title') and snippet.get('publishedAt') and snippet.get('channelId')):
+        return None
+    return {
+        'channel_id': snippet['channelId'],
+        'channel_title': snippet.get('channelTitle') or '',
+        'title': snippet['title'],
+        'thumbnail': snippet.get('thumbnails', {}).get('high', {}).get('url', ''),
+        'published_at': _parse_published_at(snippet['publishedAt']),
+        'duration': video_detail.get('contentDetails', {}).get('duration') or '',
+        'metadata_updated_at': fetched_at,
+    }
+
+
+def video_to_details(video: Video) -> Tuple[Dict, Dict]:
+    """Строка каталога в формате кэша video_metadata: (метаданные как у элемента videos.list, statistics)."""
+    metadata = {
+        'id': video.video_id,
+        'snippet': {
+            'title': video.title,
+            'publishedAt': video.published_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'channelId': video.channel_id,
+            'channelTitle': video.channel_title,
+            'thumbnails': {'high': {'url': video.thumbnail}},
+        },
+        'contentDetails': {'duration': video.duration},
+    }
+    statistics = {'viewCount': str(video.views)}
+    if video.likes is not None:
+        statistics['likeCount'] = str(video.likes)
+    if video.comments is not None:
+        statistics['commentCount'] = str(video.comments)
+    return metadata, statistics
+
+
+class VideoCatalog:
+    """
+    Каталог видео в основной БД (таблица video).
+    Пайплайны поиска и видео только кладут в очередь элементы ответов videos.list;
+    в базу они пишутся пачками INSERT ... ON CONFLICT DO UPDATE в отдельном потоке.
+    Ответ только с statistics обновляет статистику уже известного видео.
+    Более старые данные не перезаписывают более новые (сравнение *_updated_at).
+    """
+
+    def __init__(self, queue_size: int, enabled: bool):
+        # Без INSERT ... ON CONFLICT (не PostgreSQL и не SQLite) каталог отключается
+        self.enabled = enabled and engine.dialect.name in DIALECT_INSERTS
+        if enabled and not self.enabled:
+            logger.warning(f"Video catalog is disabled: upserts are not supported for '{engine.dialect.name}'.")
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def submit(self, video_detail: Dict) -> None:
+        """Ставит элемент ответа videos.list в очередь записи. Не блокирует: при переполнении запись отбрасывается."""
+        if not self.enabled or 'id' not in video_detail:
+            return
+        try:
+            self.queue.put_nowait((video_detail, utcnow()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Video catalog queue is full, {self.dropped} videos dropped so far.")
+
+    def submit_many(self, video_details: Iterable[Dict]) -> None:
+        for video_detail in video_details:
+            self.submit(video_detail)
+
+    @staticmethod
+    def _split(records: List) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """Полные строки для upsert и обновления только статистики; повторы видео в пачке сливаются, побеждает последний."""
+        full_rows: Dict[str, Dict] = {}
+        stats_rows: Dict[str, Dict] = {}
+        for video_detail, fetched_at in records:
+            video_id = video_detail['id']
+            stats = _stats_row(video_detail['statistics'], fetched_at) if 'statistics' in video_detail else None
+            metadata = _metadata_row(video_detail, fetched_at) if 'snippet' in video_detail else None
+            if metadata is not None and stats is not None:
+                full_rows[video_id] = {'video_id': video_id, **metadata, **stats}
+                stats_rows.pop(video_id, None)
+            elif stats is not None:
+                if video_id in full_rows:
+                    full_rows[video_id].update(stats)
+                else:
+                    stats_rows[video_id] = stats
+        return full_rows, stats_rows
+
+    def _write_batch(self, records: List) -> None:
+        full_rows, stats_rows = self._split(records)
+        with engine.begin() as connection:
+            if full_rows:
+                statement = DIALECT_INSERTS[engine.dialect.name](_video_table).values(list(full_rows.values()))
+                excluded = statement.excluded
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=['video_id'],
+                    set_={column: excluded[column] for column in _METADATA_COLUMNS + _STATS_COLUMNS},
+                    where=_video_table.c.stats_updated_at <= excluded.stats_updated_at,
+                ))
+            if stats_rows:
+                # Видео, которых нет в каталоге, пропускаются: без snippet строку не создать
+                connection.execute(_UPDATE_STATS, [
+                    {f'b_{key}': value for key, value in {'video_id': video_id, **stats}.items()}
+                    for video_id, stats in stats_rows.items()
+                ])
+
+    async def _flush(self, records: List) -> None:
+        try:
+            await asyncio.to_thread(self._write_batch, records)
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to write {len(records)} videos to video catalog: {e}")
+
+    def _drain(self, records: List) -> None:
+        while len(records) < WRITE_BATCH_SIZE:
+            try:
+                records.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def run(self) -> None:
+        """Цикл записи; при отмене дописывает то, что осталось в очереди."""
+        logger.info("Video catalog writer started.")
+        try:
+            while True:
+                records = [await self.queue.get()]
+                self._drain(records)
+                await self._flush(records)
+        except asyncio.CancelledError:
+            records: List = []
+            self._drain(records)
+            while records:
+                await self._flush(records)
+                records = []
+                self._drain(records)
+            raise
+
+    @staticmethod
+    def _read(video_ids: List[str]) -> List[Video]:
+        videos: List[Video] = []
+        with Session(engine) as session:
+            for start in range(0, len(video_ids), READ_BATCH_SIZE):
+                chunk = video_ids[start:start + READ_BATCH_SIZE]
+                videos.extend(session.exec(select(Video).where(Video.video_id.in_(chunk))).all())
+        return videos
+
+    async def get_details(self, video_ids: List[str]) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """
+        Метаданные и статистика видео из каталога в формате кэша video_metadata.
+        Метаданные старше video_metadata_cache_ttl_seconds и статистика старше video_stats_cache_ttl_seconds
+        не возвращаются - их нужно запросить из API.
+        """
+        metadata: Dict[str, Dict] = {}
+        statistics: Dict[str, Dict] = {}
+        if not self.enabled or not video_ids:
+            return metadata, statistics
+        try:
+            videos = await asyncio.to_thread(self._read, video_ids)
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not read video catalog: {e}")
+            return metadata, statistics
+
+        now = utcnow()
+        metadata_fresh_after = now - timedelta(seconds=settings.video_metadata_cache_ttl_seconds)
+        stats_fresh_after = now - timedelta(seconds=settings.video_stats_cache_ttl_seconds)
+        for video in videos:
+            if video.metadata_updated_at < metadata_fresh_after:
+                continue
+            video_metadata, video_statistics = video_to_details(video)
+            metadata[video.video_id] = video_metadata
+            if video.stats_updated_at >= stats_fresh_after:
+                statistics[video.video_id] = video_statistics
+        return metadata, statistics
+
+
+video_catalog = VideoCatalog(queue_size=settings.video_catalog_queue_size, enabled=settings.video_catalog_enabled)
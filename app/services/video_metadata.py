@@ -0,0 +1,313 @@
+# app/services/video_metadata.py
+import asyncio
+import json
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+from googleapiclient.discovery import build
+
+from app.core.batch_loader import BatchLoader
+from app.core.config import settings
+from app.core.youtube import execute_async, parse_duration, partial_response
+from app.core.youtube_client_manager import ApiKeysExhaustedError, api_key_manager
+from app.models.search_models import Item
+from app.services.channels import get_channel_infos_cached
+from app.services.local_index import local_index
+from app.services.video_catalog import VIDEO_STATISTICS_FIELDS, video_catalog
+from app.services.video_snapshots import apply_view_velocity
+
+logger = logging.getLogger(__name__)
+
+# Метаданные видео публичные - кэш общий для всех пользователей.
+# Неизменяемая часть (название, длительность, канал) и статистика хранятся раздельно с разными TTL:
+# устаревшая статистика обновляется запросом part=statistics без повторной загрузки snippet.
+VIDEO_METADATA_CACHE_KEY_PREFIX = "video:meta"
+VIDEO_STATS_CACHE_KEY_PREFIX = "video:stats"
+# Маркер "видео не найдено" (удалено / приватное) - хранится с TTL статистики
+MISSING_VIDEO_MARKER = "null"
+VIDEOS_PER_REQUEST = 50 # videos.list принимает до 50 ID за вызов (1 unit)
+FULL_VIDEO_PARTS = "snippet,contentDetails,statistics"
+# Поля полного элемента videos.list, которые читают _trim_video_metadata, build_item, каталог видео
+# и поиск (description - для is_shorts_v и локального индекса)
+FULL_VIDEO_FIELDS = (
+    "items(id,snippet(title,description,publishedAt,channelId,channelTitle,thumbnails/high/url),"
+    "contentDetails/duration,statistics(viewCount,likeCount,commentCount))"
+)
+_VIDEO_FIELDS = {FULL_VIDEO_PARTS: FULL_VIDEO_FIELDS, 'statistics': VIDEO_STATISTICS_FIELDS}
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_VIDEO_URL_RE = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})')
+
+
+def _meta_key(video_id: str) -> str:
+    return f"{VIDEO_METADATA_CACHE_KEY_PREFIX}:{video_id}"
+
+
+def _stats_key(video_id: str) -> str:
+    return f"{VIDEO_STATS_CACHE_KEY_PREFIX}:{video_id}"
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """
+    Извлекает ID видео из ссылки YouTube (watch?v=, youtu.be/, shorts/, embed/, live/)
+    или возвращает саму строку, если это уже ID. None, если ID не найден.
+    """
+    url = (url or '').strip()
+    if _VIDEO_ID_RE.match(url):
+        return url
+    match = _VIDEO_URL_RE.search(url)
+    return match.group(1) if match else None
+
+
+def _trim_video_metadata(video_detail: Dict) -> Dict:
+    """Оставляет от элемента videos.list только неизменяемые поля, нужные для построения Item."""
+    snippet = video_detail.get('snippet', {})
+    return {
+        'id': video_detail['id'],
+        'snippet': {
+            'title': snippet.get('title'),
+            'publishedAt': snippet.get('publishedAt'),
+            'channelId': snippet.get('channelId'),
+            'channelTitle': snippet.get('channelTitle'),
+            'thumbnails': {size: thumb for size, thumb in snippet.get('thumbnails', {}).items() if size == 'high'},
+        },
+        'contentDetails': {'duration': video_detail.get('contentDetails', {}).get('duration')},
+    }
+
+
+async def _fetch_videos(youtube: build, video_ids: List[str], part: str, semaphore: asyncio.Semaphore) -> List[Dict]:
+    async with semaphore:
+        logger.info(f"API Call: youtube.videos().list (part={part}) for {len(video_ids)} IDs")
+        response = await execute_async(youtube.videos().list(
+            part=part,
+            id=','.join(video_ids),
+            maxResults=len(video_ids),
+            **partial_response(_VIDEO_FIELDS[part]),
+        ))
+    return response.get('items', [])
+
+
+def _chunks(ids: List[str]) -> List[List[str]]:
+    return [ids[start:start + VIDEOS_PER_REQUEST] for start in range(0, len(ids), VIDEOS_PER_REQUEST)]
+
+
+async def _fetch_videos_pooled(part: str, video_ids: List[str]) -> Dict[str, Dict]:
+    logger.info(f"API Call: youtube.videos().list (part={part}) for {len(video_ids)} IDs (batched across requests)")
+    response = await api_key_manager.execute(
+        lambda youtube: youtube.videos().list(
+            part=part, id=','.join(video_ids), maxResults=len(video_ids), **partial_response(_VIDEO_FIELDS[part]),
+        )
+    )
+    items = response.get('items', [])
+    video_catalog.submit_many(items)
+    return {item['id']: item for item in items}
+
+
+# Промахи кэша видео из всех запросов воркера объединяются в общие вызовы videos.list по ключам пула
+_video_loaders = {
+    part: BatchLoader(
+        name, lambda video_ids, part=part: _fetch_videos_pooled(part, video_ids),
+        max_batch_size=VIDEOS_PER_REQUEST, window_seconds=settings.upstream_batch_window_ms / 1000,
+    )
+    for name, part in (('videos', FULL_VIDEO_PARTS), ('video_statistics', 'statistics'))
+}
+
+
+async def load_videos(youtube: build, video_ids: List[str], part: str = FULL_VIDEO_PARTS) -> Dict[str, Dict]:
+    """
+    Элементы videos.list по ID (part - FULL_VIDEO_PARTS или statistics) через общий загрузчик:
+    одновременные запросы делят вызовы API. Если ключи пула не настроены или исчерпаны -
+    пачками по 50 ID через переданный клиент youtube. Ответы попадают в каталог видео.
+    Несуществующие и приватные видео в результат не попадают.
+    """
+    if not video_ids:
+        return {}
+    try:
+        if api_key_manager.keys:
+            return await _video_loaders[part].load_many(video_ids)
+    except ApiKeysExhaustedError:
+        pass
+    semaphore = asyncio.Semaphore(settings.video_metadata_concurrency)
+    videos: Dict[str, Dict] = {}
+    for chunk_items in await asyncio.gather(*(_fetch_videos(youtube, chunk, part, semaphore) for chunk in _chunks(video_ids))):
+        video_catalog.submit_many(chunk_items)
+        videos.update({item['id']: item for item in chunk_items})
+    return videos
+
+
+async def _read_cache(redis_client: Optional[redis.Redis], video_ids: List[str]) -> Tuple[Dict[str, Optional[Dict]], Dict[str, Dict]]:
+    """Читает обе части кэша одним MGET. Возвращает (метаданные или None для ненайденных, статистика)."""
+    metadata: Dict[str, Optional[Dict]] = {}
+    statistics: Dict[str, Dict] = {}
+    if redis_client is None or not video_ids:
+        return metadata, statistics
+    try:
+        entries = await redis_client.mget([_meta_key(vid) for vid in video_ids] + [_stats_key(vid) for vid in video_ids])
+    except redis.RedisError as e:
+        logger.warning(f"Could not read video metadata cache: {e}")
+        return metadata, statistics
+
+    for video_id, meta_raw, stats_raw in zip(video_ids, entries[:len(video_ids)], entries[len(video_ids):]):
+        try:
+            if meta_raw:
+                metadata[video_id] = json.loads(meta_raw)
+            if stats_raw:
+                statistics[video_id] = json.loads(stats_raw)
+        except ValueError:
+            logger.warning(f"Corrupted video metadata cache entry for {video_id}, ignoring it.")
+    return metadata, statistics
+
+
+async def _write_cache(redis_client: Optional[redis.Redis], metadata: Dict[str, Dict], statistics: Dict[str, Dict], missing: Set[str]) -> None:
+    if redis_client is None or not (metadata or statistics or missing):
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for video_id, meta in metadata.items():
+                pipe.set(_meta_key(video_id), json.dumps(meta), ex=settings.video_metadata_cache_ttl_seconds)
+            for video_id, stats in statistics.items():
+                pipe.set(_stats_key(video_id), json.dumps(stats), ex=settings.video_stats_cache_ttl_seconds)
+            for video_id in missing:
+                pipe.set(_meta_key(video_id), MISSING_VIDEO_MARKER, ex=settings.video_stats_cache_ttl_seconds)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not write video metadata cache: {e}")
+
+
+async def get_video_details(youtube: build, video_ids: Iterable[str], redis_client: Optional[redis.Redis]) -> Tuple[Dict[str, Dict], Set[str]]:
+    """
+    Возвращает детали видео (формат элемента videos.list: snippet, contentDetails, statistics) по ID
+    и множество ID, полностью взятых из кэша или каталога видео в БД.
+    Промахи Redis ищутся в каталоге; оставшиеся видео запрашиваются целиком, видео с устаревшей
+    статистикой - только part=statistics; обе группы запрашиваются параллельно через load_videos.
+    Несуществующие и приватные видео в результат не попадают.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    metadata, statistics = await _read_cache(redis_client, video_ids)
+
+    catalog_ids = [vid for vid in video_ids if vid not in metadata or (metadata[vid] and vid not in statistics)]
+    if catalog_ids:
+        catalog_metadata, catalog_statistics = await video_catalog.get_details(catalog_ids)
+        restored = {vid: meta for vid, meta in catalog_metadata.items() if vid not in metadata}
+        metadata.update(restored)
+        statistics.update({vid: stats for vid, stats in catalog_statistics.items() if vid not in statistics})
+        # Статистику из каталога в Redis не возвращаем: ее TTL считается от времени получения из API
+        await _write_cache(redis_client, restored, {}, set())
+
+    full_misses = [vid for vid in video_ids if vid not in metadata]
+    stats_misses = [vid for vid in video_ids if metadata.get(vid) and vid not in statistics]
+    cached_ids = {vid for vid in video_ids if metadata.get(vid) and vid in statistics}
+    logger.debug(f"Video metadata: {len(cached_ids)} cached, {len(stats_misses)} stale stats, {len(full_misses)} to fetch.")
+
+    fetched_metadata: Dict[str, Dict] = {}
+    fetched_statistics: Dict[str, Dict] = {}
+    if full_misses or stats_misses:
+        for fetched in await asyncio.gather(load_videos(youtube, full_misses), load_videos(youtube, stats_misses, 'statistics')):
+            for item in fetched.values():
+                if 'snippet' in item:
+                    fetched_metadata[item['id']] = _trim_video_metadata(item)
+                fetched_statistics[item['id']] = item.get('statistics', {})
+
+    # Видео, которые API не вернул, удалены или стали приватными
+    missing = {vid for vid in full_misses + stats_misses if vid not in fetched_statistics}
+    await _write_cache(redis_client, fetched_metadata, fetched_statistics, missing)
+
+    metadata.update(fetched_metadata)
+    statistics.update(fetched_statistics)
+    details: Dict[str, Dict] = {}
+    for video_id in video_ids:
+        if video_id in missing or not metadata.get(video_id) or video_id not in statistics:
+            continue
+        details[video_id] = {**metadata[video_id], 'statistics': statistics[video_id]}
+    return details, cached_ids
+
+
+def build_item(video_detail: Dict, channel_info: Dict) -> Item:
+    """Строит Item из деталей видео (videos.list) и информации о его канале."""
+    video_id = video_detail['id']
+    snippet = video_detail.get('snippet', {})
+    statistics = video_detail.get('statistics', {})
+    content_details = video_detail.get('contentDetails', {})
+    channel_id = snippet.get('channelId')
+
+    # --- Video Stats ---
+    likes = int(statistics['likeCount']) if 'likeCount' in statistics else 0
+    likes_hidden = 'likeCount' not in statistics
+    views = int(statistics.get('viewCount', 0))
+    comments = int(statistics['commentCount']) if 'commentCount' in statistics else 0
+    comments_hidden = 'commentCount' not in statistics
+    duration_str = content_details.get('duration')
+    duration_seconds = parse_duration(duration_str) if duration_str else 0
+
+    # --- Channel Stats ---
+    channel_views = channel_info.get('viewCount', 0)
+    channel_video_count = channel_info.get('videoCount', 0)
+
+    # --- Combined Metric ---
+    avg_views_per_video = float(channel_views) / float(channel_video_count) if channel_video_count > 0 else 0
+    # Fallback if avg is zero (e.g., new channel) but video has views
+    if avg_views_per_video <= 0 and views > 0:
+        avg_views_per_video = float(views) # Use current video views as a rough estimate
+
+    combined_metric = float(views) / avg_views_per_video if avg_views_per_video > 0 else None
+
+    # --- Determine URL (basic video vs shorts - simple duration check) ---
+    if duration_seconds <= 60:
+        video_url = f'https://www.youtube.com/shorts/{video_id}'
+    else:
+        video_url = f'https://www.youtube.com/watch?v={video_id}'
+
+    return Item.model_validate({
+        'video_id': video_id,
+        'title': snippet.get('title', 'No Title'),
+        'thumbnail': snippet.get('thumbnails', {}).get('high', {}).get('url', ''),
+        'published_at': snippet.get('publishedAt'), # Pydantic handles parsing
+        'views': views,
+        'channel_title': channel_info.get('channel_title', 'Unknown Channel'),
+        'channel_url': channel_info.get('channel_url', f'https://www.youtube.com/channel/{channel_id}'),
+        'channel_subscribers': channel_info.get('channel_subscribers', 0),
+        'video_count': channel_video_count, # Total videos on channel
+        'likes': likes,
+        'likes_hidden': likes_hidden,
+        'comments': comments,
+        'comments_hidden': comments_hidden,
+        'combined_metric': combined_metric,
+        'duration': duration_seconds,
+        'video_url': video_url,
+        'channel_thumbnail': channel_info.get('channel_thumbnail', ''),
+    })
+
+
+async def get_items_for_video_ids(youtube: build, video_ids: List[str], redis_client: Optional[redis.Redis]) -> Tuple[List[Item], Set[str]]:
+    """
+    Возвращает Item для каждого найденного видео в порядке video_ids
+    и множество ID видео, детали которых взяты из кэша без обращения к API.
+    Детали видео и информация о каналах берутся из кэша, промахи запрашиваются пачками.
+    """
+    details, cached_ids = await get_video_details(youtube, video_ids, redis_client)
+    channel_infos = await get_channel_infos_cached(
+        youtube, (detail['snippet'].get('channelId') for detail in details.values()), redis_client,
+    )
+
+    items: List[Item] = []
+    for video_id in dict.fromkeys(video_ids):
+        detail = details.get(video_id)
+        if detail is None:
+            continue
+        channel_info = channel_infos.get(detail['snippet'].get('channelId'))
+        if channel_info is None:
+            logger.warning(f"Could not get channel info for video {video_id}. Skipping item.")
+            continue
+        try:
+            item = build_item(detail, channel_info)
+        except (KeyError, ValueError) as e:
+            logger.error(f"Error building item for video ID {video_id}: {e}")
+            continue
+        items.append(item)
+        if video_id not in cached_ids: # Видео из кэша уже проиндексированы
+            local_index.submit('shorts' if item.duration <= 60 else 'videos', item.model_dump())
+    # Статистика видео не из кэша только что получена из API - она же попадает в ряд снимков
+    await apply_view_velocity(redis_client, items, fresh_ids={item.video_id for item in items} - cached_ids)
+    return items, cached_ids
@@ -0,0 +1,189 @@
+# app/services/video_snapshots.py
+import base64
+import logging
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ряд снимков статистики видео: одна строка на видео, записи фиксированной длины дописываются APPEND.
+# Запись: время (uint32, Unix), просмотры (uint64), лайки (uint32), комментарии (uint32) - 20 байт,
+# в base64 (клиент Redis работает со строками) - 28 символов.
+VIDEO_SNAPSHOTS_KEY_PREFIX = "video:snapshots"
+SNAPSHOT_STRUCT = struct.Struct("<IQII")
+SNAPSHOT_RECORD_CHARS = 28
+
+# Прореживание: (возраст снимка в секундах, минимальный интервал между сохраняемыми снимками)
+DOWNSAMPLE_TIERS = (
+    (24 * 60 * 60, 0),                  # Последние сутки - все снимки
+    (14 * 24 * 60 * 60, 6 * 60 * 60),   # До 2 недель - один снимок на 6 часов
+    (None, 24 * 60 * 60),               # Старше - один в сутки
+)
+
+Snapshot = Tuple[int, int, int, int] # (timestamp, views, likes, comments)
+
+
+def _snapshots_key(video_id: str) -> str:
+    return f"{VIDEO_SNAPSHOTS_KEY_PREFIX}:{video_id}"
+
+
+def pack_snapshot(snapshot: Snapshot) -> str:
+    return base64.b64encode(SNAPSHOT_STRUCT.pack(*snapshot)).decode('ascii')
+
+
+def unpack_snapshots(raw: Optional[str]) -> List[Snapshot]:
+    if not raw:
+        return []
+    snapshots = []
+    for start in range(0, len(raw) - SNAPSHOT_RECORD_CHARS + 1, SNAPSHOT_RECORD_CHARS):
+        try:
+            snapshots.append(SNAPSHOT_STRUCT.unpack(base64.b64decode(raw[start:start + SNAPSHOT_RECORD_CHARS])))
+        except (ValueError, struct.error):
+            continue # Поврежденная запись - пропускаем
+    return snapshots
+
+
+def downsample(snapshots: List[Snapshot], now: float, max_points: int) -> List[Snapshot]:
+    """
+    Прореживает старую часть ряда по DOWNSAMPLE_TIERS (внутри интервала остается более ранний снимок)
+    и ограничивает ряд max_points последними снимками.
+    """
+    kept: List[Snapshot] = []
+    last_kept_ts: Optional[int] = None
+    for snapshot in snapshots:
+        age = now - snapshot[0]
+        interval = next(interval for max_age, interval in DOWNSAMPLE_TIERS if max_age is None or age <= max_age)
+        if last_kept_ts is not None and interval and snapshot[0] - last_kept_ts < interval:
+            continue
+        kept.append(snapshot)
+        last_kept_ts = snapshot[0]
+    return kept[-max_points:]
+
+
+def _views_per_hour(newer: Snapshot, older: Snapshot) -> float:
+    return (newer[1] - older[1]) / ((newer[0] - older[0]) / 3600)
+
+
+def _latest_before(snapshots: List[Snapshot], moment: float) -> Optional[Snapshot]:
+    return next((snapshot for snapshot in reversed(snapshots) if snapshot[0] <= moment), None)
+
+
+def compute_view_velocity(snapshots: List[Snapshot], window_seconds: int) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Скорость (просмотров в час) по последнему снимку и снимку не менее window_seconds раньше,
+    и ускорение (просмотров в час за час) - разница со скоростью на предыдущем таком же отрезке.
+    None, если истории недостаточно.
+    """
+    if len(snapshots) < 2:
+        return None, None
+    latest = snapshots[-1]
+    previous = _latest_before(snapshots, latest[0] - window_seconds)
+    if previous is None:
+        return None, None
+    velocity = _views_per_hour(latest, previous)
+
+    earlier = _latest_before(snapshots, previous[0] - window_seconds)
+    if earlier is None:
+        return round(velocity, 2), None
+    previous_velocity = _views_per_hour(previous, earlier)
+    # Скорости относятся к серединам своих отрезков
+    hours_between = ((latest[0] + previous[0]) - (previous[0] + earlier[0])) / 2 / 3600
+    return round(velocity, 2), round((velocity - previous_velocity) / hours_between, 2)
+
+
+def _field(item, name: str):
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+def _set_fields(item, **values) -> None:
+    for name, value in values.items():
+        if isinstance(item, dict):
+            item[name] = value
+        else:
+            setattr(item, name, value)
+
+
+async def apply_view_velocity(
+    redis_client: Optional[redis.Redis],
+    items: Iterable,
+    fresh_ids: Optional[Set[str]] = None,
+) -> None:
+    """
+    Заполняет views_per_hour и views_acceleration у элементов (Item или dict) по ряду снимков.
+    Для видео из fresh_ids (статистика только что получена из API) текущая статистика
+    дописывается в ряд, если последний снимок старше video_snapshot_min_interval_seconds.
+    Один MGET на чтение и один pipeline на запись; API не вызывается.
+    """
+    items = list(items)
+    if redis_client is None or not items:
+        return
+    fresh_ids = fresh_ids or set()
+    video_ids = list(dict.fromkeys(_field(item, 'video_id') for item in items))
+    try:
+        raw_series = await redis_client.mget([_snapshots_key(vid) for vid in video_ids])
+    except redis.RedisError as e:
+        logger.warning(f"Could not read video snapshots: {e}")
+        return
+
+    now = int(time.time())
+    items_by_id: Dict[str, List] = {}
+    for item in items:
+        items_by_id.setdefault(_field(item, 'video_id'), []).append(item)
+
+    appends: Dict[str, str] = {}
+    rewrites: Dict[str, str] = {}
+    velocity: Dict[str, Tuple[Optional[float], Optional[float]]] = {}
+    for video_id, raw in zip(video_ids, raw_series):
+        snapshots = unpack_snapshots(raw)
+        if video_id in fresh_ids:
+            item = items_by_id[video_id][0]
+            if not snapshots or now - snapshots[-1][0] >= settings.video_snapshot_min_interval_seconds:
+                snapshot = (now, _field(item, 'views') or 0, _field(item, 'likes') or 0, _field(item, 'comments') or 0)
+                snapshots.append(snapshot)
+                if len(snapshots) > settings.video_snapshot_max_points:
+                    snapshots = downsample(snapshots, now, settings.video_snapshot_max_points)
+                    rewrites[video_id] = ''.join(pack_snapshot(s) for s in snapshots)
+                else:
+                    appends[video_id] = pack_snapshot(snapshot)
+        velocity[video_id] = compute_view_velocity(snapshots, settings.view_velocity_window_seconds)
+
+    for video_id, (views_per_hour, views_acceleration) in velocity.items():
+        for item in items_by_id[video_id]:
+            _set_fields(item, views_per_hour=views_per_hour, views_acceleration=views_acceleration)
+
+    if not (appends or rewrites):
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for video_id, record in appends.items():
+                pipe.append(_snapshots_key(video_id), record)
+                pipe.expire(_snapshots_key(video_id), settings.video_snapshot_ttl_seconds)
+            for video_id, series in rewrites.items():
+                pipe.set(_snapshots_key(video_id), series, ex=settings.video_snapshot_ttl_seconds)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not write video snapshots: {e}")
+
+
+async def get_recent_views(redis_client: Optional[redis.Redis], video_id: str, days: int = 7) -> Optional[int]:
+    """
+    Прирост просмотров видео за последние days дней по ряду снимков (без Analytics API).
+    Отсчет - от последнего снимка не позже начала периода (или от самого раннего, если ряд короче).
+    None, если снимков меньше двух.
+    """
+    if redis_client is None:
+        return None
+    try:
+        snapshots = unpack_snapshots(await redis_client.get(_snapshots_key(video_id)))
+    except redis.RedisError as e:
+        logger.warning(f"Could not read video snapshots for {video_id}: {e}")
+        return None
+    if len(snapshots) < 2:
+        return None
+    start = _latest_before(snapshots, snapshots[-1][0] - days * 24 * 60 * 60) or snapshots[0]
+    return snapshots[-1][1] - start[1]
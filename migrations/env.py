@@ -13,15 +13,23 @@ sys.path.append(os.getcwd())
 
 from sqlmodel import SQLModel
 from app.models.user import User  # Импортируем *все* модели
+from app.models.channel import Channel
 from app.models.favorite import FavoriteChannel
+from app.models.search_history import SearchHistory
+from app.models.saved_search import SavedSearch
+from app.models.video import Video
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
+# Соединение передается, когда миграции запускает приложение (app/core/database.py: migrate_db)
+app_connection = config.attributes.get('connection')
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-if config.config_file_name is not None:
+# При запуске из приложения логирование уже настроено - fileConfig отключил бы его логгеры
+if config.config_file_name is not None and app_connection is None:
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
@@ -67,6 +75,15 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    if app_connection is not None:
+        context.configure(
+            connection=app_connection, target_metadata=target_metadata
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
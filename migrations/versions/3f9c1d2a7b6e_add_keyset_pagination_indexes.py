@@ -0,0 +1,29 @@
+"""Add keyset pagination indexes
+
+Revision ID: 3f9c1d2a7b6e
+Revises: 96d550bc8f0f, a0c3e7b52d18
+Create Date: 2026-10-19 10:12:40.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1d2a7b6e'
+down_revision: Union[str, Sequence[str], None] = ('96d550bc8f0f', 'a0c3e7b52d18')
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сливает две базы истории: 96d550bc8f0f (уже применена на развернутых базах) и a0c3e7b52d18 (базовые таблицы).
+
+
+def upgrade() -> None:
+    op.create_index('ix_favoritechannel_user_added_at_id', 'favoritechannel', ['user_id', 'added_at', 'id'], unique=False)
+    op.create_index('ix_collection_user_added_at_id', 'collection', ['user_id', 'added_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_collection_user_added_at_id', table_name='collection')
+    op.drop_index('ix_favoritechannel_user_added_at_id', table_name='favoritechannel')
@@ -0,0 +1,48 @@
+"""Add search history
+
+Revision ID: 7c2e5a9d4f10
+Revises: 3f9c1d2a7b6e
+Create Date: 2026-10-19 14:05:12.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e5a9d4f10'
+down_revision: Union[str, None] = '3f9c1d2a7b6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'searchhistory',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('query', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('date_published_filter', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('max_results', sa.Integer(), nullable=False),
+        sa.Column('params_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('item_count', sa.Integer(), nullable=False),
+        sa.Column('snapshot', sa.LargeBinary(), nullable=False),
+        sa.Column('snapshot_encoding', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('share_token', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('added_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('share_token'),
+    )
+    op.create_index('ix_searchhistory_user_params_hash', 'searchhistory', ['user_id', 'params_hash'], unique=False)
+    op.create_index('ix_searchhistory_user_added_at_id', 'searchhistory', ['user_id', 'added_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_searchhistory_user_added_at_id', table_name='searchhistory')
+    op.drop_index('ix_searchhistory_user_params_hash', table_name='searchhistory')
+    op.drop_table('searchhistory')
@@ -0,0 +1,84 @@
+"""Create base tables
+
+Revision ID: a0c3e7b52d18
+Revises:
+Create Date: 2025-03-01 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a0c3e7b52d18'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Схема, которую до появления миграций создавал create_all (favoritechannel - еще без added_at).
+# Отдельная база истории: 96d550bc8f0f (down_revision = None) уже записана в развернутых базах и не меняется,
+# ветки сливаются в 3f9c1d2a7b6e. На пустой базе эта ревизия должна идти первой:
+#     alembic upgrade a0c3e7b52d18 && alembic upgrade head
+# migrate_db (app/core/database.py) делает это сам, а существующие базы не пересоздает, а помечает stamp.
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('username', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('email', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('hashed_password', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('is_superuser', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_user_id', 'user', ['id'], unique=False)
+    op.create_index('ix_user_username', 'user', ['username'], unique=True)
+    op.create_index('ix_user_email', 'user', ['email'], unique=True)
+
+    op.create_table(
+        'favoritechannel',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('channel_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('channel_title', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('channel_thumbnail', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('channel_subscribers', sa.Integer(), nullable=False),
+        sa.Column('channel_video_count', sa.Integer(), nullable=False),
+        sa.Column('channel_last_published_at', sa.DateTime(), nullable=False),
+        sa.Column('channel_url', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'channel_id'),
+    )
+    op.create_index('ix_favoritechannel_channel_id', 'favoritechannel', ['channel_id'], unique=False)
+
+    op.create_table(
+        'collection',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('collection_title', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('videos_urls', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('added_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'collection_title'),
+    )
+    op.create_index('ix_collection_id', 'collection', ['id'], unique=False)
+    op.create_index('ix_collection_collection_title', 'collection', ['collection_title'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_collection_collection_title', table_name='collection')
+    op.drop_index('ix_collection_id', table_name='collection')
+    op.drop_table('collection')
+    op.drop_index('ix_favoritechannel_channel_id', table_name='favoritechannel')
+    op.drop_table('favoritechannel')
+    op.drop_index('ix_user_email', table_name='user')
+    op.drop_index('ix_user_username', table_name='user')
+    op.drop_index('ix_user_id', table_name='user')
+    op.drop_table('user')
@@ -0,0 +1,75 @@
+"""Add shared channel table and slim favorites
+
+Revision ID: b41d8e2c6a53
+Revises: 7c2e5a9d4f10
+Create Date: 2026-10-19 16:31:47.905213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41d8e2c6a53'
+down_revision: Union[str, None] = '7c2e5a9d4f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Колонки данных канала, которые переезжают из favoritechannel в channel
+CHANNEL_COLUMNS = (
+    ('channel_title', 'title'),
+    ('channel_thumbnail', 'thumbnail'),
+    ('channel_subscribers', 'subscribers'),
+    ('channel_video_count', 'video_count'),
+    ('channel_last_published_at', 'last_published_at'),
+    ('channel_url', 'channel_url'),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'channel',
+        sa.Column('channel_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('title', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('thumbnail', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('subscribers', sa.Integer(), nullable=False),
+        sa.Column('video_count', sa.Integer(), nullable=False),
+        sa.Column('last_published_at', sa.DateTime(), nullable=False),
+        sa.Column('channel_url', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('channel_id'),
+    )
+    # Одна строка на канал - из самой свежей записи избранного
+    op.execute(
+        "INSERT INTO channel (channel_id, title, thumbnail, subscribers, video_count, last_published_at, channel_url, updated_at) "
+        "SELECT channel_id, channel_title, channel_thumbnail, channel_subscribers, channel_video_count, "
+        "channel_last_published_at, channel_url, CURRENT_TIMESTAMP "
+        "FROM favoritechannel WHERE id IN (SELECT MAX(id) FROM favoritechannel GROUP BY channel_id)"
+    )
+    with op.batch_alter_table('favoritechannel') as batch_op:
+        batch_op.create_foreign_key('fk_favoritechannel_channel_id_channel', 'channel', ['channel_id'], ['channel_id'])
+        for old_name, _ in CHANNEL_COLUMNS:
+            batch_op.drop_column(old_name)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('favoritechannel') as batch_op:
+        batch_op.drop_constraint('fk_favoritechannel_channel_id_channel', type_='foreignkey')
+        batch_op.add_column(sa.Column('channel_title', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+        batch_op.add_column(sa.Column('channel_thumbnail', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+        batch_op.add_column(sa.Column('channel_subscribers', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('channel_video_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('channel_last_published_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('channel_url', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    for old_name, new_name in CHANNEL_COLUMNS:
+        op.execute(
+            f"UPDATE favoritechannel SET {old_name} = "
+            f"(SELECT channel.{new_name} FROM channel WHERE channel.channel_id = favoritechannel.channel_id)"
+        )
+    with op.batch_alter_table('favoritechannel') as batch_op:
+        for old_name, _ in CHANNEL_COLUMNS:
+            batch_op.alter_column(old_name, nullable=False)
+    op.drop_table('channel')
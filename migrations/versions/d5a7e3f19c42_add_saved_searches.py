@@ -0,0 +1,46 @@
+"""Add saved searches
+
+Revision ID: d5a7e3f19c42
+Revises: b41d8e2c6a53
+Create Date: 2026-10-19 18:20:41.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a7e3f19c42'
+down_revision: Union[str, None] = 'b41d8e2c6a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'savedsearch',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('query', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('date_published_filter', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('max_results', sa.Integer(), nullable=False),
+        sa.Column('params_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('item_count', sa.Integer(), nullable=False),
+        sa.Column('snapshot', sa.LargeBinary(), nullable=False),
+        sa.Column('snapshot_encoding', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('added_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'params_hash'),
+    )
+    op.create_index('ix_savedsearch_user_added_at_id', 'savedsearch', ['user_id', 'added_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_savedsearch_user_added_at_id', table_name='savedsearch')
+    op.drop_table('savedsearch')
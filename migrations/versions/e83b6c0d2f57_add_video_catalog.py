@@ -0,0 +1,44 @@
+"""Add video catalog
+
+Revision ID: e83b6c0d2f57
+Revises: d5a7e3f19c42
+Create Date: 2026-10-19 20:02:37.561904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e83b6c0d2f57'
+down_revision: Union[str, None] = 'd5a7e3f19c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'video',
+        sa.Column('video_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('channel_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('channel_title', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('title', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('thumbnail', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('published_at', sa.DateTime(), nullable=False),
+        sa.Column('duration', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('views', sa.BigInteger(), nullable=False),
+        sa.Column('likes', sa.Integer(), nullable=True),
+        sa.Column('comments', sa.Integer(), nullable=True),
+        sa.Column('metadata_updated_at', sa.DateTime(), nullable=False),
+        sa.Column('stats_updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('video_id'),
+    )
+    op.create_index('ix_video_channel_published_at', 'video', ['channel_id', 'published_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_video_channel_published_at', table_name='video')
+    op.drop_table('video')